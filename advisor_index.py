@@ -0,0 +1,216 @@
+"""
+Inverted index over advisor specialties and keywords.
+
+Every term maps to a posting list of advisors kept in descending rating order.
+Advisors are ranked on three criteria in turn: the weight of the query terms
+they match (specialty terms count more than keywords), then rating, then the
+earliest availability. Posting lists are ordered the same way (rating, then
+availability), so search walks the lists in parallel and stops as soon as no
+advisor further down any list can beat the current top results (Fagin's
+threshold algorithm). The most an unseen advisor can match is bounded per
+specialty, since every advisor has exactly one. The cost therefore depends on
+how deep the top results sit, not on the number of advisors.
+
+Advisors are also indexed by name: their ID, full name, first and last name
+map to their IDs, so finding the advisor a query names looks up the query's
+words and word pairs rather than trying every advisor's names in turn.
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime
+from heapq import nsmallest
+
+from similarity_cache import normalize
+
+SPECIALTY_WEIGHT = 2.0
+KEYWORD_WEIGHT = 1.0
+NOT_AVAILABLE = datetime.max.toordinal()
+WORD = re.compile(r"\w+")
+
+
+def advisor_names(advisor):
+    """Lowercased word tuples an advisor can be named by: ID, full name and each part longer than two letters"""
+    full = advisor["name"].lower()
+    names = [advisor["id"].lower(), full] + full.split()
+    return {tuple(WORD.findall(name)) for name in names if len(name) > 2} - {()}
+
+
+def advisor_terms(advisor):
+    """Index terms for an advisor with their match weights"""
+    terms = {}
+    for keyword in advisor.get("keywords", []):
+        for term in normalize(keyword):
+            terms[term] = KEYWORD_WEIGHT
+    for term in normalize(advisor["specialty"]):
+        terms[term] = SPECIALTY_WEIGHT
+    return terms
+
+
+class AdvisorIndex:
+    """Advisors indexed by term, with rating-ordered posting lists and incremental updates"""
+
+    def __init__(self, advisors=()):
+        self.lock = threading.Lock()
+        self.advisors = {}
+        self.terms = {}
+        self.entries = {}
+        # How many advisors carry each term as a keyword, and each specialty, for the search bound
+        self.keyword_counts = defaultdict(int)
+        self.specialty_counts = defaultdict(int)
+        self.by_rating = []
+        self.postings = defaultdict(list)
+        # Name word tuple -> IDs of the advisors it names, in the order they were added
+        self.names = defaultdict(dict)
+        self.longest_name = 1
+        for advisor in advisors:
+            self.add(advisor)
+
+    def add(self, advisor):
+        """Index a new advisor, or re-index one whose details changed"""
+        with self.lock:
+            if advisor["id"] in self.advisors:
+                self._remove(advisor["id"])
+            next_available = advisor.get("next_available")
+            available_from = (
+                datetime.strptime(next_available, "%Y-%m-%d").toordinal() if next_available else NOT_AVAILABLE
+            )
+            entry = (-advisor["rating"], available_from, advisor["id"])
+            terms = advisor_terms(advisor)
+
+            self.advisors[advisor["id"]] = advisor
+            self.terms[advisor["id"]] = terms
+            self.entries[advisor["id"]] = entry
+            self.specialty_counts[self._specialty_key(terms)] += 1
+            insort(self.by_rating, entry)
+            for term, weight in terms.items():
+                insort(self.postings[term], entry)
+                if weight == KEYWORD_WEIGHT:
+                    self.keyword_counts[term] += 1
+            for name in advisor_names(advisor):
+                self.names[name][advisor["id"]] = None
+                self.longest_name = max(self.longest_name, len(name))
+
+    def remove(self, advisor_id):
+        """Drop an advisor from the index"""
+        with self.lock:
+            self._remove(advisor_id)
+
+    @staticmethod
+    def _specialty_key(terms):
+        return frozenset(t for t, weight in terms.items() if weight == SPECIALTY_WEIGHT)
+
+    def _remove(self, advisor_id):
+        advisor = self.advisors.pop(advisor_id, None)
+        if advisor is None:
+            return
+        for name in advisor_names(advisor):
+            self.names[name].pop(advisor_id, None)
+            if not self.names[name]:
+                del self.names[name]
+        entry = self.entries.pop(advisor_id)
+        terms = self.terms.pop(advisor_id)
+        specialty = self._specialty_key(terms)
+        self.specialty_counts[specialty] -= 1
+        if not self.specialty_counts[specialty]:
+            del self.specialty_counts[specialty]
+        for term, weight in terms.items():
+            if weight == KEYWORD_WEIGHT:
+                self.keyword_counts[term] -= 1
+                if not self.keyword_counts[term]:
+                    del self.keyword_counts[term]
+        for posting in [self.by_rating] + [self.postings[t] for t in terms]:
+            i = bisect_left(posting, entry)
+            if i < len(posting) and posting[i] == entry:
+                del posting[i]
+
+    def named(self, text):
+        """
+        ID of the advisor a query names by ID, full, first or last name, or None.
+        Longer names win; among advisors sharing a name, the first added does.
+        """
+        words = WORD.findall(text.lower())
+        with self.lock:
+            for n in range(min(self.longest_name, len(words)), 0, -1):
+                for i in range(len(words) - n + 1):
+                    advisor_ids = self.names.get(tuple(words[i:i + n]))
+                    if advisor_ids:
+                        return next(iter(advisor_ids))
+        return None
+
+    def query_terms(self, text):
+        """Normalized terms of free text that appear in the index"""
+        return [t for t in dict.fromkeys(normalize(text)) if self.postings.get(t)]
+
+    def matching_ids(self, terms):
+        """IDs of every advisor that matches any of the terms"""
+        with self.lock:
+            return {entry[2] for t in terms for entry in self.postings.get(t, ())}
+
+    def best_among(self, advisor_ids, terms=()):
+        """The best-ranked advisor of a set for the query terms"""
+        if len(advisor_ids) <= 64:
+            with self.lock:
+                return self.advisors[min(advisor_ids, key=lambda a: self.rank_key(a, terms))]
+        # A large set almost surely holds some of the top of the ranking, so walk it instead
+        return self.search(terms, limit=1, allowed=advisor_ids)[0][1]
+
+    def rank_key(self, advisor_id, terms):
+        """Ascending sort key of one advisor for a query: most matched weight, then its posting entry"""
+        advisor_terms = self.terms[advisor_id]
+        return (-sum(advisor_terms.get(t, 0.0) for t in terms),) + self.entries[advisor_id]
+
+    def _best_match(self, terms):
+        """The most any advisor could match: its specialty's terms plus the rest as keywords"""
+        keyword_terms = {t for t in terms if self.keyword_counts.get(t)}
+        return max(
+            (
+                SPECIALTY_WEIGHT * len(specialty.intersection(terms))
+                + KEYWORD_WEIGHT * len(keyword_terms - specialty)
+                for specialty in self.specialty_counts
+            ),
+            default=0.0
+        )
+
+    def search(self, terms, limit=3, require_all=False, available_by=None, allowed=None):
+        """
+        Top advisors for the given index terms, best first, as (matched weight, advisor) pairs.
+        With no terms, advisors are ranked on rating and availability alone. `allowed`
+        restricts results to a set of advisor IDs.
+        """
+        available_by = datetime.strptime(available_by, "%Y-%m-%d").toordinal() if available_by else None
+        with self.lock:
+            lists = [self.postings.get(t, []) for t in terms] or [self.by_rating]
+            if require_all:
+                # Every result is in every list, so walking the shortest one is enough
+                lists = [min(lists, key=len)]
+            best_match = self._best_match(terms)
+            seen = set()
+            results = []
+            depth = 0
+
+            while True:
+                frontier = [posting[depth] for posting in lists if depth < len(posting)]
+                if not frontier:
+                    break
+                for _, available_from, advisor_id in frontier:
+                    if advisor_id in seen:
+                        continue
+                    seen.add(advisor_id)
+                    if require_all and not all(t in self.terms[advisor_id] for t in terms):
+                        continue
+                    if available_by and available_from > available_by:
+                        continue
+                    if allowed is not None and advisor_id not in allowed:
+                        continue
+                    results.append(self.rank_key(advisor_id, terms))
+
+                # Advisors further down any list rank below the best frontier entry at full match
+                if len(results) >= limit:
+                    results = nsmallest(limit, results)
+                    if results[-1] <= (-best_match,) + min(frontier):
+                        break
+                depth += 1
+
+            return [(-key[0], self.advisors[key[-1]]) for key in nsmallest(limit, results)]
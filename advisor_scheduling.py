@@ -0,0 +1,274 @@
+"""
+Advisor appointment calendar.
+
+Advisors publish availability windows that are split into fixed-length
+appointment slots. Free slots are kept in sorted structures:
+- per advisor, a sorted list of free slot starts, so an advisor's next free
+  slot is a binary search
+- across advisors, a sorted list of slot starts that anyone is free at, each
+  with the set of advisors free then, so the earliest slot among any group of
+  matching advisors is found by walking forward from the requested time and
+  intersecting sets, never by scanning every advisor's calendar
+
+Times are whole minutes since 1970-01-01 (naive local time). Booking and
+cancelling happen under one lock, so two users racing for the same slot can
+never both get it.
+
+Without a backend, bookings live in this process only: the orchestrator and
+the advisors server each hold their own, and a restart loses them. Set
+ADVISOR_BOOKINGS_PATH to keep them in SQLite, shared by every process that
+opens the same file. Each booking is an insert that the (advisor, start)
+primary key lets only one process win, and before every read or change a
+calendar checks whether another process has committed since its last look
+(PRAGMA data_version, one query) and applies the bookings and cancellations
+it missed.
+"""
+import sqlite3
+import threading
+import uuid
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is not free (already booked or never offered)"""
+
+
+def to_minutes(value):
+    """Minutes since the epoch for a datetime or an ISO date/time string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH) // timedelta(minutes=1)
+
+
+def to_iso(minutes):
+    """ISO string (to the minute) for minutes since the epoch"""
+    return (EPOCH + timedelta(minutes=minutes)).isoformat(timespec="minutes")
+
+
+class SqliteBookingBackend:
+    """Optional bookings table shared by every process that opens the same file"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS advisor_bookings ("
+            "advisor_id TEXT NOT NULL, start TEXT NOT NULL, booking_id TEXT NOT NULL UNIQUE, "
+            "user_id TEXT NOT NULL, end TEXT NOT NULL, PRIMARY KEY (advisor_id, start))"
+        )
+        self._conn.commit()
+        self._data_version = None
+
+    def changed(self):
+        """Whether another connection has committed since the last call"""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            changed, self._data_version = data_version != self._data_version, data_version
+        return changed
+
+    def load_all(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT booking_id, advisor_id, user_id, start, end FROM advisor_bookings").fetchall()
+        keys = ["booking_id", "advisor_id", "user_id", "start", "end"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def insert(self, booking):
+        """Store a booking; False if another process already holds its slot"""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO advisor_bookings VALUES (?, ?, ?, ?, ?)",
+                    (booking["advisor_id"], booking["start"], booking["booking_id"], booking["user_id"], booking["end"])
+                )
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                return False
+            self._conn.commit()
+        return True
+
+    def delete(self, booking_id):
+        """Drop a booking; False if it was already gone"""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM advisor_bookings WHERE booking_id = ?", (booking_id,)).rowcount
+            self._conn.commit()
+        return deleted > 0
+
+
+class AdvisorCalendar:
+    """Free appointment slots of every advisor, plus bookings"""
+
+    def __init__(self, slot_minutes, backend=None):
+        self.slot_minutes = slot_minutes
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.free = defaultdict(list)
+        self.free_at = {}
+        self.times = []
+        self.bookings = {}
+        self.user_booking_ids = defaultdict(set)
+        # (advisor_id, slot) -> booking_id, so availability never frees a booked slot
+        self.booked = {}
+        # Bumped on every booking or cancellation, including those made by other processes
+        self.changes = 0
+        with self.lock:
+            self._sync()
+
+    @property
+    def version(self):
+        with self.lock:
+            self._sync()
+            return self.changes
+
+    def _sync(self):
+        """Apply bookings and cancellations other processes have committed to the backend"""
+        if self.backend is None or not self.backend.changed():
+            return
+        stored = {booking["booking_id"]: booking for booking in self.backend.load_all()}
+        for booking_id in [b for b in self.bookings if b not in stored]:
+            self._forget(booking_id)
+        for booking_id, booking in stored.items():
+            if booking_id not in self.bookings:
+                self._record(booking)
+
+    def _record(self, booking):
+        slot = to_minutes(booking["start"])
+        try:
+            self._take(booking["advisor_id"], slot)
+        except SlotUnavailable:
+            # Not offered (yet): add_availability skips it while it is booked
+            pass
+        self.bookings[booking["booking_id"]] = booking
+        self.user_booking_ids[booking["user_id"]].add(booking["booking_id"])
+        self.booked[(booking["advisor_id"], slot)] = booking["booking_id"]
+        self.changes += 1
+
+    def _forget(self, booking_id):
+        booking = self.bookings.pop(booking_id)
+        self.user_booking_ids[booking["user_id"]].discard(booking_id)
+        slot = to_minutes(booking["start"])
+        del self.booked[(booking["advisor_id"], slot)]
+        self._release(booking["advisor_id"], slot)
+        self.changes += 1
+
+    def add_availability(self, advisor_id, start, end):
+        """Offer every whole slot between two times"""
+        start, end = to_minutes(start), to_minutes(end)
+        with self.lock:
+            for slot in range(start, end - self.slot_minutes + 1, self.slot_minutes):
+                if (advisor_id, slot) not in self.booked:
+                    self._release(advisor_id, slot)
+
+    def _release(self, advisor_id, slot):
+        slots = self.free[advisor_id]
+        i = bisect_left(slots, slot)
+        if i < len(slots) and slots[i] == slot:
+            return
+        slots.insert(i, slot)
+        if slot not in self.free_at:
+            self.free_at[slot] = set()
+            insort(self.times, slot)
+        self.free_at[slot].add(advisor_id)
+
+    def _take(self, advisor_id, slot):
+        slots = self.free.get(advisor_id, [])
+        i = bisect_left(slots, slot)
+        if i == len(slots) or slots[i] != slot:
+            raise SlotUnavailable(f"{advisor_id} is not free at {to_iso(slot)}")
+        del slots[i]
+        advisors = self.free_at[slot]
+        advisors.discard(advisor_id)
+        if not advisors:
+            del self.free_at[slot]
+            del self.times[bisect_left(self.times, slot)]
+
+    def next_free(self, advisor_id, after=None):
+        """Start of an advisor's first free slot at or after a time, or None"""
+        after = to_minutes(after or datetime.now())
+        with self.lock:
+            self._sync()
+            slots = self.free.get(advisor_id, [])
+            i = bisect_left(slots, after)
+            return to_iso(slots[i]) if i < len(slots) else None
+
+    def free_slots(self, advisor_id, after=None, until=None):
+        """An advisor's free slot starts between two times"""
+        after = to_minutes(after or datetime.now())
+        with self.lock:
+            self._sync()
+            slots = self.free.get(advisor_id, [])
+            end = bisect_left(slots, to_minutes(until)) if until else len(slots)
+            return [to_iso(s) for s in slots[bisect_left(slots, after):end]]
+
+    def earliest(self, advisor_ids=None, after=None, limit=1):
+        """
+        The earliest free slots among a set of advisors (None means everyone),
+        as (slot start, advisors free then) pairs in time order.
+        """
+        after = to_minutes(after or datetime.now())
+        found = []
+        with self.lock:
+            self._sync()
+            for i in range(bisect_left(self.times, after), len(self.times)):
+                slot = self.times[i]
+                advisors = self.free_at[slot] if advisor_ids is None else self.free_at[slot] & advisor_ids
+                if advisors:
+                    found.append((to_iso(slot), advisors))
+                    if len(found) == limit:
+                        break
+        return found
+
+    def book(self, advisor_id, start, user_id):
+        """
+        Book a free slot; raises SlotUnavailable if someone else got it first.
+        Booking a slot the user already holds returns that booking, so a retried
+        request never books twice.
+        """
+        slot = to_minutes(start)
+        with self.lock:
+            self._sync()
+            booking_id = self.booked.get((advisor_id, slot))
+            if booking_id and self.bookings[booking_id]["user_id"] == user_id:
+                return self.bookings[booking_id]
+            self._take(advisor_id, slot)
+            booking = {
+                "booking_id": uuid.uuid4().hex[:12],
+                "advisor_id": advisor_id,
+                "user_id": user_id,
+                "start": to_iso(slot),
+                "end": to_iso(slot + self.slot_minutes)
+            }
+            if self.backend and not self.backend.insert(booking):
+                # Another process booked it since the last sync
+                self._release(advisor_id, slot)
+                self._sync()
+                booking_id = self.booked.get((advisor_id, slot))
+                if booking_id and self.bookings[booking_id]["user_id"] == user_id:
+                    return self.bookings[booking_id]
+                raise SlotUnavailable(f"{advisor_id} is not free at {to_iso(slot)}")
+            self._record(booking)
+        return booking
+
+    def cancel(self, booking_id, user_id=None):
+        """Cancel a booking and free its slot; returns the booking, or None if there is no such booking"""
+        with self.lock:
+            self._sync()
+            booking = self.bookings.get(booking_id)
+            if booking is None or (user_id and booking["user_id"] != user_id):
+                return None
+            if self.backend and not self.backend.delete(booking_id):
+                # Another process cancelled it since the last sync
+                self._sync()
+                return None
+            self._forget(booking_id)
+        return booking
+
+    def user_bookings(self, user_id):
+        """A user's upcoming bookings, soonest first"""
+        with self.lock:
+            self._sync()
+            bookings = [self.bookings[b] for b in self.user_booking_ids.get(user_id, ())]
+        return sorted(bookings, key=lambda b: b["start"])
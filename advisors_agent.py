@@ -1,59 +1,335 @@
 import google.generativeai as genai
 from config import Config
+from degraded_mode import generate_or_degrade
+from llm_gateway import AdmissionRejected
+from model_tiers import TieredModel
+from similarity_cache import answer_cache
 from bank_wrapper import bank_data
+from advisor_index import AdvisorIndex
+from advisor_scheduling import AdvisorCalendar, SlotUnavailable, SqliteBookingBackend
+from datetime import date, datetime, time, timedelta
+import calendar
 import json
+import re
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
 
+# Built once; kept current as advisors are added and appointments booked
+advisor_index = AdvisorIndex(bank_data.get_advisors())
+advisor_calendar = AdvisorCalendar(
+    Config.ADVISOR_SLOT_MINUTES,
+    backend=SqliteBookingBackend(Config.ADVISOR_BOOKINGS_PATH) if Config.ADVISOR_BOOKINGS_PATH else None
+)
+for advisor_id, windows in bank_data.get_advisor_availability().items():
+    for window in windows:
+        advisor_calendar.add_availability(advisor_id, window["start"], window["end"])
+
 def get_all_advisors():
     """Get all financial advisors"""
     advisors = bank_data.get_advisors()
     return json.dumps(advisors, indent=2)
 
-def find_advisor_by_specialty(specialty):
-    """Find advisors by their specialty"""
-    advisors = bank_data.get_advisors()
-    matches = [a for a in advisors if specialty.lower() in a["specialty"].lower()]
+def add_advisor(advisor):
+    """Add or update an advisor in the directory and the search index"""
+    bank_data.add_advisor(advisor)
+    advisor_index.add(advisor)
+    return json.dumps({"message": f"Advisor {advisor['id']} saved"})
+
+def find_advisor_by_specialty(specialty, available_by=None):
+    """Find advisors by their specialty, best rated and soonest available first"""
+    terms = advisor_index.query_terms(specialty)
+    matches = advisor_index.search(
+        terms, limit=Config.ADVISOR_SEARCH_LIMIT, require_all=True, available_by=available_by
+    ) if terms else []
     
     if not matches:
         return json.dumps({"message": f"No advisors found with specialty: {specialty}"})
     
-    return json.dumps(matches, indent=2)
+    return json.dumps([advisor for _, advisor in matches], indent=2)
 
-def recommend_advisor(user_need):
+def recommend_advisor(user_need, available_by=None):
     """Recommend an advisor based on user's financial need"""
-    advisors = bank_data.get_advisors()
+    terms = advisor_index.query_terms(user_need)
+    matches = advisor_index.search(terms, limit=Config.ADVISOR_SEARCH_LIMIT, available_by=available_by)
+    
+    if terms and matches:
+        recommendation = {
+            "recommended_advisor": matches[0][1],
+            "reason": f"Best match for your need: {user_need}",
+            "matched_terms": [t for t in terms if t in advisor_index.terms[matches[0][1]["id"]]],
+            "other_options": [advisor for _, advisor in matches[1:]]
+        }
+        return json.dumps(recommendation, indent=2)
     
-    keywords = {
-        "retirement": "Retirement Planning",
-        "invest": "Investment Strategy",
-        "debt": "Debt Management",
-        "save": "Investment Strategy",
-        "loan": "Debt Management"
-    }
+    return json.dumps({
+        "message": "Here are our top rated advisors",
+        "advisors": [advisor for _, advisor in matches]
+    }, indent=2)
+
+def _advisor_card(advisor):
+    """The advisor fields worth showing next to an appointment"""
+    return {k: advisor[k] for k in ("id", "name", "specialty", "rating")}
+
+def _refresh_availability(advisor_id):
+    """Keep an advisor's next available date in step with their calendar"""
+    advisor = advisor_index.advisors[advisor_id]
+    next_slot = advisor_calendar.next_free(advisor_id)
+    next_available = next_slot[:10] if next_slot else None
+    if next_available == advisor.get("next_available"):
+        return
+    
+    if next_available is None:
+        availability = "No open appointments"
+    elif next_available == datetime.now().strftime("%Y-%m-%d"):
+        availability = "Available for appointments"
+    else:
+        availability = f"Next available: {datetime.strptime(next_available, '%Y-%m-%d').strftime('%b %d')}"
+    add_advisor(dict(advisor, next_available=next_available, availability=availability))
+
+def find_earliest_appointment(user_need=None, after=None):
+    """Find the earliest free appointment slots with advisors matching a need (any advisor if none given)"""
+    terms = advisor_index.query_terms(user_need) if user_need else []
+    candidates = advisor_index.matching_ids(terms) if terms else None
+    slots = advisor_calendar.earliest(candidates, after, limit=Config.ADVISOR_APPOINTMENT_OPTIONS)
     
-    specialty = None
-    for keyword, spec in keywords.items():
-        if keyword in user_need.lower():
-            specialty = spec
-            break
+    if not slots:
+        return json.dumps({"message": "No open appointments found"})
     
-    if specialty:
-        matches = [a for a in advisors if specialty in a["specialty"]]
-        if matches:
-            recommendation = {
-                "recommended_advisor": matches[0],
-                "reason": f"Best match for your need: {user_need}",
-                "other_options": matches[1:] if len(matches) > 1 else []
-            }
-            return json.dumps(recommendation, indent=2)
+    options = []
+    for start, advisor_ids in slots:
+        options.append({
+            "start": start,
+            "duration_minutes": Config.ADVISOR_SLOT_MINUTES,
+            "advisor": _advisor_card(advisor_index.best_among(advisor_ids, terms)),
+            "other_matching_advisors_free": len(advisor_ids) - 1
+        })
+    return json.dumps({"earliest_appointments": options}, indent=2)
+
+# Booking and cancelling from chat: "book a meeting with Sarah tomorrow at 2pm",
+# "book the earliest appointment for retirement planning", "cancel my appointment"
+BOOK_INTENT = re.compile(r"\b(?:book|schedule|reserve|set up)\b.*\b(?:appointment|meeting|session|slot|call)\b|\bbook (?:me )?(?:in )?with\b")
+CANCEL_INTENT = re.compile(r"\bcancel\b.*\b(?:appointment|meeting|session|booking|call)\b")
+# "Can I book ...?" asks about booking; only a request changes the calendar
+QUESTION = re.compile(r"\?\s*$|^(?:can|could|may|might|how|what|when|where|which|who|why|is|are|do|does|would|should|will)\b")
+BOOKING_ID = re.compile(r"\b[0-9a-f]{12}\b")
+
+WEEKDAYS = {"monday": 0, "mon": 0, "tuesday": 1, "tues": 1, "tue": 1, "wednesday": 2, "wed": 2,
+            "thursday": 3, "thurs": 3, "thur": 3, "thu": 3, "friday": 4, "fri": 4,
+            "saturday": 5, "sat": 5, "sunday": 6, "sun": 6}
+MONTHS = {name: m + 1 for m, full in enumerate([
+    "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december"
+]) for name in (full, full[:3])}
+MONTHS["sept"] = 9
+_weekday = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_month = "|".join(sorted(MONTHS, key=len, reverse=True))
+_year = r"(?:,?\s+(?P<year>\d{4}))?"
+DAY_PATTERNS = [
+    re.compile(r"(?<!\d)(?P<iso>\d{4}-\d{2}-\d{2})(?!\d)"),
+    re.compile(r"\b(?P<relative>today|tomorrow)\b"),
+    re.compile(rf"\b(?:(?:on|this|next)\s+)?(?P<weekday>{_weekday})\b"),
+    re.compile(rf"\b(?:on\s+)?(?P<month>{_month})\.?\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\b{_year}"),
+    re.compile(rf"\b(?:on\s+)?(?:the\s+)?(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<month>{_month})\b{_year}")
+]
+CLOCK_PATTERNS = [
+    re.compile(r"\b(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)\b"),
+    re.compile(r"(?<![\d:])(?P<hour>\d{1,2}):(?P<minute>\d{2})\b(?!\s*(?:am|pm)\b)"),
+    re.compile(r"\b(?:at\s+)?(?P<noon>noon|midday)\b")
+]
+# Date or time words left over once the parts above are taken out: asking beats guessing
+VAGUE = re.compile(
+    rf"\b(?:{_month}|{_weekday}|week|weekend|month|morning|afternoon|evening|tonight|night|"
+    rf"o'?clock|before|between|until|around|later)\b|\d+/\d+|\bat\s+\d{{1,2}}\b|\b\d{{1,2}}(?:st|nd|rd|th)\b"
+)
+
+class UnclearTime(ValueError):
+    """A booking request names a date or time that can't be pinned down"""
+
+def _only_match(patterns, text):
+    """The one match of any of the patterns in the text, or None; UnclearTime if there are several"""
+    matches = [m for pattern in patterns for m in pattern.finditer(text)]
+    if len(matches) > 1:
+        raise UnclearTime("names more than one date or time")
+    return matches[0] if matches else None
+
+def _match_day(match, today):
+    """The date a DAY_PATTERNS match names; weekdays and dates without a year mean the next one"""
+    fields = match.groupdict()
+    if fields.get("iso"):
+        return date.fromisoformat(fields["iso"])
+    if fields.get("relative"):
+        return today + timedelta(days=fields["relative"] == "tomorrow")
+    if fields.get("weekday"):
+        return today + timedelta(days=(WEEKDAYS[fields["weekday"]] - today.weekday() - 1) % 7 + 1)
+    month, day = MONTHS[fields["month"]], int(fields["day"])
+    if fields.get("year"):
+        return date(int(fields["year"]), month, day)
+    named = date(today.year, month, day) if (month, day) != (2, 29) or calendar.isleap(today.year) else None
+    return named if named and named >= today else date(today.year + 1, month, day)
+
+def _requested_day(text, today):
+    """(date or None, text without it) for a lowercased query"""
+    match = _only_match(DAY_PATTERNS, text)
+    if match is None:
+        return None, text
+    return _match_day(match, today), text[:match.start()] + " " + text[match.end():]
+
+def _requested_time(text):
+    """
+    (exact start, earliest start, end of the day asked for) of a lowercased
+    booking request; all None means no date or time was given. UnclearTime
+    (a ValueError) if it names a date or time that can't be read exactly.
+    """
+    now = datetime.now()
+    day, text = _requested_day(text, now.date())
+    clock = _only_match(CLOCK_PATTERNS, text)
+    rest = text if clock is None else text[:clock.start()] + " " + text[clock.end():]
+    if VAGUE.search(rest):
+        raise UnclearTime(f"has an unclear date or time: {VAGUE.search(rest).group(0)!r}")
+    if day is not None and day < now.date():
+        raise ValueError(f"{day.isoformat()} is in the past")
+    if clock is None:
+        if day is None:
+            return None, None, None
+        return None, max(datetime.combine(day, time()), now), datetime.combine(day + timedelta(days=1), time())
+    
+    if clock.groupdict().get("noon"):
+        hour, minute = 12, 0
+    else:
+        hour, minute = int(clock.group("hour")), int(clock.group("minute") or 0)
+        if clock.groupdict().get("ampm"):
+            if not 1 <= hour <= 12:
+                raise UnclearTime(f"has an unclear time: {clock.group(0)!r}")
+            hour = hour % 12 + (12 if clock.group("ampm") == "pm" else 0)
+    start = datetime.combine(day or now.date(), time(hour, minute))
+    # A time alone means its next occurrence
+    if day is None and start <= now:
+        start += timedelta(days=1)
+    # "After 3pm tomorrow" is the earliest start that day, not an exact one
+    if text[:clock.start()].rstrip().endswith("after"):
+        return None, start, datetime.combine(start.date() + timedelta(days=1), time())
+    return start, None, None
+
+def _book_from_query(query, text, user_id):
+    advisor_id = advisor_index.named(text)
+    try:
+        start, after, until = _requested_time(text)
+    except UnclearTime as e:
+        return "rejected", (
+            f"Nothing was booked: the request {e}. Ask the user for a day "
+            "(a date like Nov 25, a weekday, today or tomorrow) and a time like 2pm"
+        )
+    except ValueError as e:
+        return "rejected", f"Nothing was booked: {e}"
+    if start is not None and start < datetime.now():
+        return "rejected", f"{start.isoformat(timespec='minutes')} is in the past"
     
+    terms = advisor_index.query_terms(query)
+    if advisor_id is None:
+        # The best-ranked matching advisor free at the requested time (or soonest)
+        candidates = advisor_index.matching_ids(terms) if terms else None
+        found = advisor_calendar.earliest(candidates, start or after)
+        if not found or (start is not None and found[0][0] != start.isoformat(timespec="minutes")):
+            return "rejected", "No matching advisor is free then; see the earliest open appointments"
+        slot, advisor_ids = found[0]
+        advisor_id = advisor_index.best_among(advisor_ids, terms)["id"]
+    else:
+        slot = start.isoformat(timespec="minutes") if start else advisor_calendar.next_free(advisor_id, after)
+    # A day without a time books that day's first free slot, never a later day's
+    if until is not None and (slot is None or slot >= until.isoformat(timespec="minutes")):
+        return "rejected", f"Nothing was booked: no free slot on {after.date().isoformat()}; see the earliest open appointments"
+    if slot is None:
+        return "rejected", f"{advisor_index.advisors[advisor_id]['name']} has no open appointments"
+    
+    result = json.loads(book_appointment(advisor_id, slot, user_id=user_id))
+    if "error" in result:
+        return "rejected", f"{result['error']}. Next free slots: {', '.join(result['next_free_slots']) or 'none'}"
+    return "booked", result
+
+def _cancel_from_query(text, user_id):
+    bookings = advisor_calendar.user_bookings(user_id or bank_data.default_user_id)
+    match = BOOKING_ID.search(text)
+    if match:
+        booking_id = match.group(0)
+    else:
+        # Narrow down by the advisor or date mentioned, if any
+        advisor_id = advisor_index.named(text)
+        try:
+            day, _ = _requested_day(text, date.today())
+        except ValueError:
+            return "rejected", "Nothing was cancelled; say which appointment by advisor, one date or booking ID"
+        bookings = [
+            b for b in bookings
+            if (advisor_id is None or b["advisor_id"] == advisor_id) and (day is None or b["start"][:10] == str(day))
+        ]
+        if len(bookings) != 1:
+            return "rejected", (
+                "No matching booked appointment" if not bookings else
+                f"{len(bookings)} booked appointments match; say which by advisor, date or booking ID"
+            )
+        booking_id = bookings[0]["booking_id"]
+    
+    result = json.loads(cancel_appointment(booking_id, user_id=user_id))
+    if "error" in result:
+        return "rejected", result["error"]
+    return "cancelled", result
+
+def appointment_from_query(query, user_id=None):
+    """
+    If a query asks to book or cancel an appointment, do it and return
+    ("booked" or "cancelled", details) or ("rejected", reason); otherwise None
+    """
+    text = " ".join(query.lower().replace("’", "'").split())
+    if QUESTION.search(text):
+        return None
+    if CANCEL_INTENT.search(text):
+        return _cancel_from_query(text, user_id)
+    if BOOK_INTENT.search(text):
+        return _book_from_query(query, text, user_id)
+    return None
+
+def get_advisor_schedule(advisor_id, days=7):
+    """Get an advisor's free appointment slots over the next few days"""
+    now = datetime.now()
+    slots = advisor_calendar.free_slots(advisor_id, now, now + timedelta(days=days))
+    return json.dumps({"advisor_id": advisor_id, "free_slots": slots}, indent=2)
+
+def book_appointment(advisor_id, start, user_id=None):
+    """Book an appointment slot with an advisor"""
+    user_id = user_id or bank_data.default_user_id
+    try:
+        booking = advisor_calendar.book(advisor_id, start, user_id)
+    except SlotUnavailable as e:
+        return json.dumps({
+            "error": str(e),
+            "next_free_slots": advisor_calendar.free_slots(advisor_id)[:Config.ADVISOR_APPOINTMENT_OPTIONS]
+        }, indent=2)
+    
+    _refresh_availability(advisor_id)
     return json.dumps({
-        "message": "Here are all available advisors",
-        "advisors": advisors
+        "message": "Appointment booked",
+        "booking": booking,
+        "advisor": _advisor_card(advisor_index.advisors[advisor_id])
     }, indent=2)
 
+def cancel_appointment(booking_id, user_id=None):
+    """Cancel one of the user's appointments"""
+    booking = advisor_calendar.cancel(booking_id, user_id or bank_data.default_user_id)
+    if booking is None:
+        return json.dumps({"error": f"No appointment found with ID: {booking_id}"})
+    
+    _refresh_availability(booking["advisor_id"])
+    return json.dumps({"message": "Appointment cancelled", "booking": booking}, indent=2)
+
+def get_my_appointments(user_id=None):
+    """Get the user's booked appointments"""
+    bookings = advisor_calendar.user_bookings(user_id or bank_data.default_user_id)
+    return json.dumps([
+        {**booking, "advisor": _advisor_card(advisor_index.advisors[booking["advisor_id"]])}
+        for booking in bookings
+    ], indent=2)
+
 class AdvisorsAgent:
     """Financial advisory services specialist agent"""
     
@@ -68,7 +344,9 @@ class AdvisorsAgent:
         - Match users with appropriate specialists
         - Provide advisor ratings and specialties
         - Explain what each advisor can help with
-        - Help schedule advisory meetings
+        - Find the earliest open appointment slots
+        - Book and cancel appointments when the user asks; the outcome is in the data, so
+          only confirm a booking or cancellation that the data shows
         
         When responding:
         1. Use the data to get accurate advisor information
@@ -81,17 +359,29 @@ class AdvisorsAgent:
         If asked about topics outside advisory services, politely redirect to your specialty.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
     
-    def process_query(self, query):
-        """Process a user query"""
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query, with the conversation so far if there is one"""
         try:
+            # "Book a meeting with Sarah tomorrow at 2pm" books (or cancels) before anything else
+            appointment_change = appointment_from_query(query, user_id)
+            
+            # Near-duplicate questions from the same user on the same directory and calendar reuse an answer
+            cache_scope = (self.name, user_id, bank_data.get_advisors_version(), advisor_calendar.version)
+            cached = answer_cache.lookup(cache_scope, query) if appointment_change is None else None
+            if cached is not None:
+                return cached
+            
             # Get all advisors data
             advisors = get_all_advisors()
             recommendation = recommend_advisor(query)
+            appointments = find_earliest_appointment(query)
+            my_appointments = get_my_appointments(user_id=user_id)
+            named_advisor = advisor_index.named(query.lower())
+            schedule = get_advisor_schedule(named_advisor) if named_advisor else None
+            sections = {"Recommended Advisor": recommendation, "Earliest Open Appointments": appointments, "Your Appointments": my_appointments}
             
             # Create context with data
             context = f"""
@@ -105,12 +395,42 @@ All Advisors:
 Recommendation Based on Query:
 {recommendation}
 
+Earliest Open Appointments for This Need:
+{appointments}
+
+User's Booked Appointments:
+{my_appointments}
+
 Please provide a helpful response based on this data. Be professional and helpful.
 """
             
-            response = self.model.generate_content(context)
-            return response.text
+            if schedule is not None:
+                context = f"\nFree Slots of the Advisor Asked About:\n{schedule}\n" + context
+            if appointment_change is not None:
+                outcome, detail = appointment_change
+                change_text = json.dumps(detail, indent=2) if outcome != "rejected" else detail
+                context = f"\nAppointment {outcome.capitalize()}:\n{change_text}\n" + context
+                sections = {f"Appointment {outcome}": change_text, **sections}
+            
+            if history:
+                context = f"\nConversation So Far:\n{history}\n" + context
+            
+            # Simple questions go to the fast model tier, multi-step analysis to the strong one
+            tier, model = self.models.select(query, history)
+            
+            # Past the deadline or with the breaker open, answer from the data alone
+            # Once the calendar has changed, a busy model degrades rather than returning a 429 to retry
+            response_text, degraded = generate_or_degrade(
+                model, context, self.name, sections, tier=tier, changed=appointment_change is not None
+            )
+            
+            # Only answers that didn't lean on earlier turns or change bookings are safe to reuse
+            if not history and not degraded and appointment_change is None:
+                answer_cache.store(cache_scope, query, response_text)
+            return response_text
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
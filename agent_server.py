@@ -0,0 +1,196 @@
+"""
+Shared FastAPI server for every agent.
+
+create_app(agent) builds the /run, /run_batch, /health and /metrics app for
+any object with a process_query(message, history, user_id) method, so each
+agent's server module is one call instead of a copy of the whole app. Every
+server also mounts the model-free /data endpoints from data_api.py and the
+streaming POST /ingest endpoint from ingest.py.
+
+Requests are validated with pydantic as before. Responses skip the second
+pass FastAPI would otherwise make over them: the handlers build plain event
+dicts in the shape of the typed models below and return them as
+FastJSONResponse, which FastAPI hands straight to the client without
+validating against the response model or running jsonable_encoder, and which
+serializes with orjson. The models still describe the responses in the
+OpenAPI schema.
+"""
+import asyncio
+import traceback
+from typing import List
+
+import orjson
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from config import Config
+from budget_rules import budget_engine, router as budgets_router
+from data_api import router as data_router
+from degraded_mode import get_degraded_stats
+from fast_path import fast_path
+from ingest import router as ingest_router
+from llm_gateway import AdmissionRejected, get_stats
+from merchant_classifier import merchant_classifier
+from model_tiers import stats as get_tier_stats
+from recurring_charges import recurring_tracker
+from spending_anomalies import anomaly_detector
+from session_memory import session_store
+from similarity_cache import answer_cache
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content):
+    """Serialize to JSON bytes with orjson"""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson; FastAPI returns it without re-validating"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+class MessagePart(BaseModel):
+    text: str
+
+
+class Message(BaseModel):
+    role: str
+    parts: List[MessagePart]
+
+
+class RunRequest(BaseModel):
+    app_name: str
+    user_id: str
+    session_id: str
+    new_message: Message
+    streaming: bool = False
+
+
+class BatchRunRequest(BaseModel):
+    requests: List[RunRequest]
+
+
+class EventPart(BaseModel):
+    text: str
+
+
+class EventContent(BaseModel):
+    parts: List[EventPart]
+
+
+class Event(BaseModel):
+    content: EventContent
+    role: str = "model"
+
+
+class RunResponse(BaseModel):
+    events: List[Event]
+
+
+def model_events(text):
+    """Events of a model reply, in the shape of List[Event]"""
+    return [{"content": {"parts": [{"text": text}]}, "role": "model"}]
+
+
+def create_app(agent, log_errors=False):
+    """Build the server app for an agent"""
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=Config.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag"],
+    )
+    app.include_router(data_router)
+    app.include_router(ingest_router)
+    app.include_router(budgets_router)
+
+    async def process(request):
+        """Run one request with its session history, in the threadpool so queued model calls don't block the loop"""
+        user_message = request.new_message.parts[0].text
+        history = session_store.render(request.user_id, request.session_id)
+        response_text = await run_in_threadpool(agent.process_query, user_message, history, request.user_id)
+        session_store.record_turn(request.user_id, request.session_id, user_message, response_text)
+        return response_text
+
+    @app.post("/run", response_model=RunResponse)
+    async def run_agent(request: RunRequest):
+        """Run the agent and return response"""
+        try:
+            return FastJSONResponse({"events": model_events(await process(request))})
+        except AdmissionRejected as e:
+            return FastJSONResponse(
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+                content={"detail": str(e), "retry_after": e.retry_after}
+            )
+        except Exception as e:
+            if log_errors:
+                print(f"Error processing request: {traceback.format_exc()}")
+            return FastJSONResponse({"events": model_events(f"Error: {str(e)}")})
+
+    async def run_batch_item(index, item):
+        """Run one batch item, backing off on admission rejections; errors stay with the item"""
+        for attempt in range(Config.BATCH_MAX_RETRIES + 1):
+            try:
+                return {"index": index, "session_id": item.session_id, "events": model_events(await process(item))}
+            except AdmissionRejected as e:
+                if attempt == Config.BATCH_MAX_RETRIES:
+                    return {"index": index, "session_id": item.session_id, "error": str(e),
+                            "status_code": e.status_code, "retry_after": e.retry_after}
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                return {"index": index, "session_id": item.session_id, "error": str(e)}
+
+    @app.post("/run_batch")
+    async def run_batch(batch: BatchRunRequest):
+        """Run many requests concurrently and stream NDJSON results in completion order"""
+        if len(batch.requests) > Config.BATCH_MAX_ITEMS:
+            return FastJSONResponse(
+                status_code=413,
+                content={"detail": f"Batch exceeds {Config.BATCH_MAX_ITEMS} requests"}
+            )
+
+        async def stream():
+            items = iter(enumerate(batch.requests))
+            results = asyncio.Queue()
+
+            # A fixed set of workers keeps the batch within its share of the LLM limit
+            async def worker():
+                for index, item in items:
+                    await results.put(await run_batch_item(index, item))
+
+            workers = [asyncio.create_task(worker()) for _ in range(Config.BATCH_CONCURRENCY)]
+            try:
+                for _ in range(len(batch.requests)):
+                    yield dumps(await results.get()) + b"\n"
+            finally:
+                for task in workers:
+                    task.cancel()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.get("/health")
+    async def health():
+        return FastJSONResponse({"status": "ok"})
+
+    @app.get("/metrics")
+    async def metrics():
+        return FastJSONResponse({
+            **get_stats(), **session_store.stats(), **answer_cache.stats(), **fast_path.stats(),
+            **get_degraded_stats(), **merchant_classifier.stats(),
+            **recurring_tracker.stats(), **anomaly_detector.stats(), **budget_engine.stats(),
+            **get_tier_stats()
+        })
+
+    return app
@@ -2,6 +2,8 @@
 const ORCHESTRATOR_URL = 'http://localhost:8090';
 const APP_NAME = 'chat_orchestrator';
 const USER_ID = 'user_123';
+// How often the summary panel revalidates; unchanged data costs a 304 and no model call
+const SUMMARY_REFRESH_MS = 60000;
 
 // Generate a session ID for this browser session
 let sessionId = localStorage.getItem('cymbal_session_id');
@@ -24,8 +26,55 @@ document.addEventListener('DOMContentLoaded', function() {
             sendMessage();
         }
     });
+    
+    loadSummary();
+    setInterval(loadSummary, SUMMARY_REFRESH_MS);
 });
 
+function formatMoney(amount) {
+    return amount.toLocaleString('en-US', { style: 'currency', currency: 'USD' });
+}
+
+async function loadSummary() {
+    try {
+        // The server sends ETag with no-cache, so the browser revalidates its copy and
+        // gets 304 Not Modified (served here as the cached 200) until the data changes
+        const response = await fetch(`${ORCHESTRATOR_URL}/data/${encodeURIComponent(USER_ID)}/summary`);
+        if (!response.ok) {
+            return;
+        }
+        renderSummary(await response.json());
+    } catch (error) {
+        console.error('Summary error:', error);
+    }
+}
+
+function renderSummary(summary) {
+    const spending = summary.spending_summary;
+    document.getElementById('summaryNetWorth').textContent = formatMoney(summary.net_worth.net_worth);
+    document.getElementById('summarySpending').textContent = formatMoney(spending.total_spending_30_days);
+    document.getElementById('summaryTopCategory').textContent =
+        spending.top_category ? `Top: ${spending.top_category}` : '';
+    document.getElementById('summaryPerks').textContent = summary.active_perks.length;
+    
+    const goalsDiv = document.getElementById('summaryGoals');
+    goalsDiv.replaceChildren();
+    for (const goal of summary.goal_progress) {
+        const row = document.createElement('div');
+        row.className = 'goal-row';
+        row.textContent = `${goal.goal_name}: ${goal.progress_percentage}% of ${formatMoney(goal.target_amount)}`;
+        const bar = document.createElement('div');
+        bar.className = 'goal-bar';
+        const fill = document.createElement('div');
+        fill.className = 'goal-bar-fill';
+        fill.style.width = `${Math.min(goal.progress_percentage, 100)}%`;
+        bar.appendChild(fill);
+        row.appendChild(bar);
+        goalsDiv.appendChild(row);
+    }
+    document.getElementById('summaryPanel').hidden = false;
+}
+
 function addMessage(text, type) {
     const messagesDiv = document.getElementById('messages');
     const messageDiv = document.createElement('div');
@@ -123,9 +172,16 @@ async function sendMessage() {
             parts: [{ text: response }]
         });
         
+        // The conversation may have changed the data; a 304 makes this nearly free if not
+        loadSummary();
+        
     } catch (error) {
         hideLoading();
-        addErrorMessage('Sorry, I encountered an error. Please make sure all agents are running and try again.');
+        if (error.retryAfter) {
+            addErrorMessage(`The assistant is busy right now. Please try again in ${error.retryAfter} seconds.`);
+        } else {
+            addErrorMessage('Sorry, I encountered an error. Please make sure all agents are running and try again.');
+        }
         console.error('Error:', error);
     } finally {
         // Re-enable input
@@ -158,6 +214,13 @@ async function callAgent(message) {
             body: JSON.stringify(payload)
         });
         
+        if (response.status === 429 || response.status === 503) {
+            // Server is shedding load; back off for the advertised time
+            const busyError = new Error(`Server busy, status: ${response.status}`);
+            busyError.retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+            throw busyError;
+        }
+        
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -1,6 +1,13 @@
 import json
+import threading
 from datetime import datetime, timedelta
-import random
+from itertools import takewhile
+
+import numpy as np
+
+from columnar_store import ColumnarStore, to_day
+from config import Config
+from synthetic_data import SyntheticBank, market_paths
 
 class BankDataWrapper:
     """
@@ -8,8 +15,22 @@ class BankDataWrapper:
     In a real implementation, this would connect to actual banking APIs.
     """
     
-    def __init__(self):
+    def __init__(self, data_path=None):
         self.mock_data = self._initialize_mock_data()
+        self.default_user_id = self.mock_data["user_profile"]["user_id"]
+        
+        # Per-user data; the advisors directory and perk catalogue are shared by all users
+        self.users = {self.default_user_id: self.mock_data}
+        self.data_versions = {self.default_user_id: 1}
+        self.write_lock = threading.Lock()
+        self.advisors = self._generate_mock_advisors()
+        self.advisors_version = 1
+        self.advisor_availability = self._generate_mock_advisor_availability()
+        self.perk_catalogue = [
+            {k: v for k, v in perk.items() if k != "status"} for perk in self._generate_mock_perks()
+        ]
+        # Other users come from memory-mapped columnar files when a data path is configured
+        self.store = ColumnarStore(data_path, Config.BANK_DATA_REFRESH_INTERVAL) if data_path else None
     
     def _initialize_mock_data(self):
         """Initialize mock banking data for demonstration"""
@@ -23,42 +44,17 @@ class BankDataWrapper:
             "transactions": self._generate_mock_transactions(),
             "goals": self._generate_mock_goals(),
             "investments": self._generate_mock_investments(),
+            "holdings_history": self._generate_mock_holdings_history(),
             "debts": self._generate_mock_debts(),
-            "perks": self._generate_mock_perks(),
-            "advisors": self._generate_mock_advisors()
+            "perks": self._generate_mock_perks()
         }
     
-    def _generate_mock_transactions(self):
-        """Generate sample transaction data"""
-        categories = ["Groceries", "Dining", "Transportation", "Entertainment", "Utilities", "Shopping"]
-        merchants = {
-            "Groceries": ["Whole Foods", "Trader Joe's", "Safeway"],
-            "Dining": ["Chipotle", "Starbucks", "Local Cafe"],
-            "Transportation": ["Uber", "Gas Station", "Public Transit"],
-            "Entertainment": ["Netflix", "Movie Theater", "Spotify"],
-            "Utilities": ["Electric Company", "Water Utility", "Internet Provider"],
-            "Shopping": ["Amazon", "Target", "Best Buy"]
-        }
-        
-        transactions = []
-        for i in range(90):
-            date = datetime.now() - timedelta(days=i)
-            category = random.choice(categories)
-            merchant = random.choice(merchants[category])
-            amount = round(random.uniform(10, 200), 2)
-            
-            transactions.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "merchant": merchant,
-                "category": category,
-                "amount": amount,
-                "description": f"Purchase at {merchant}"
-            })
-        
-        return transactions
+    def _generate_mock_transactions(self, years=2, seed=123):
+        """Generate a seeded transaction history, newest first"""
+        return SyntheticBank(seed=seed, years=years).transaction_dicts()
     
     def _generate_mock_goals(self):
-        """Generate sample financial goals"""
+        """Generate sample financial goals with the last six monthly contributions"""
         return [
             {
                 "id": "goal_1",
@@ -66,7 +62,8 @@ class BankDataWrapper:
                 "target_amount": 10000,
                 "current_amount": 4500,
                 "target_date": "2025-12-31",
-                "status": "active"
+                "status": "active",
+                "contribution_history": [300, 250, 400, 300, 200, 350]
             },
             {
                 "id": "goal_2",
@@ -74,7 +71,8 @@ class BankDataWrapper:
                 "target_amount": 5000,
                 "current_amount": 2100,
                 "target_date": "2026-06-01",
-                "status": "active"
+                "status": "active",
+                "contribution_history": [150, 100, 200, 0, 250, 150]
             },
             {
                 "id": "goal_3",
@@ -82,7 +80,8 @@ class BankDataWrapper:
                 "target_amount": 50000,
                 "current_amount": 12000,
                 "target_date": "2027-01-01",
-                "status": "active"
+                "status": "active",
+                "contribution_history": [800, 1000, 600, 900, 700, 1200]
             }
         ]
     
@@ -95,13 +94,26 @@ class BankDataWrapper:
                 {"type": "Bonds", "value": 12000, "allocation": 26.7},
                 {"type": "Real Estate", "value": 5000, "allocation": 11.1},
                 {"type": "Cash", "value": 3000, "allocation": 6.7}
-            ],
-            "performance": {
-                "ytd_return": 8.5,
-                "one_year_return": 12.3,
-                "three_year_return": 10.8
-            }
+            ]
+        }
+    
+    def _generate_mock_holdings_history(self, years=3, seed=4):
+        """Generate daily values per position ending at the current holdings"""
+        holdings = self._generate_mock_investments()["holdings"]
+        today = datetime.now().date()
+        dates = np.arange(
+            np.datetime64(today - timedelta(days=365 * years)),
+            np.datetime64(today + timedelta(days=1)),
+            dtype="datetime64[D]"
+        )
+        dates = dates[np.is_busday(dates)]
+        
+        paths = market_paths(np.random.default_rng(seed), len(dates), [h["type"] for h in holdings])
+        positions = {
+            holding["type"]: np.round(holding["value"] * path / path[-1], 2).tolist()
+            for holding, path in zip(holdings, paths)
         }
+        return {"dates": [str(d) for d in dates], "positions": positions}
     
     def _generate_mock_debts(self):
         """Generate sample debt information"""
@@ -130,7 +142,7 @@ class BankDataWrapper:
         ]
     
     def _generate_mock_perks(self):
-        """Generate sample banking perks and offers"""
+        """Generate sample banking perks and offers with their reward terms"""
         return [
             {
                 "id": "perk_1",
@@ -138,6 +150,7 @@ class BankDataWrapper:
                 "description": "Get 3% cashback on all dining purchases",
                 "estimated_savings": 45.00,
                 "category": "Dining",
+                "reward_rate": 0.03,
                 "status": "active"
             },
             {
@@ -146,6 +159,7 @@ class BankDataWrapper:
                 "description": "Earn 2x points on travel bookings",
                 "estimated_savings": 120.00,
                 "category": "Travel",
+                "reward_rate": 0.02,
                 "status": "available"
             },
             {
@@ -154,84 +168,222 @@ class BankDataWrapper:
                 "description": "Save 5 cents per gallon at partner stations",
                 "estimated_savings": 30.00,
                 "category": "Transportation",
+                "merchants": ["Gas Station"],
+                "reward_rate": 0.015,
                 "status": "active"
+            },
+            {
+                "id": "perk_4",
+                "name": "Grocery Cashback",
+                "description": "Get 2% cashback on groceries, up to $25 a month",
+                "estimated_savings": 20.00,
+                "category": "Groceries",
+                "reward_rate": 0.02,
+                "monthly_cap": 25.00,
+                "status": "available"
+            },
+            {
+                "id": "perk_5",
+                "name": "Streaming Credit",
+                "description": "10% back on Netflix and Spotify, up to $5 a month",
+                "estimated_savings": 5.00,
+                "category": "Entertainment",
+                "merchants": ["Netflix", "Spotify"],
+                "reward_rate": 0.10,
+                "monthly_cap": 5.00,
+                "status": "available"
+            },
+            {
+                "id": "perk_6",
+                "name": "Rideshare Rewards",
+                "description": "Earn 5% back on Uber rides",
+                "estimated_savings": 15.00,
+                "category": "Transportation",
+                "merchants": ["Uber"],
+                "reward_rate": 0.05,
+                "status": "available"
             }
         ]
     
     def _generate_mock_advisors(self):
         """Generate sample financial advisors"""
+        today = datetime.now()
         return [
             {
                 "id": "advisor_1",
                 "name": "Sarah Johnson",
                 "specialty": "Retirement Planning",
+                "keywords": ["401k", "IRA", "pension", "social security", "retire"],
                 "rating": 4.8,
-                "availability": "Available for appointments"
+                "availability": "Available for appointments",
+                "next_available": today.strftime("%Y-%m-%d")
             },
             {
                 "id": "advisor_2",
                 "name": "Michael Chen",
                 "specialty": "Investment Strategy",
+                "keywords": ["stocks", "bonds", "portfolio", "savings", "wealth"],
                 "rating": 4.9,
-                "availability": "Next available: Nov 25"
+                "availability": f"Next available: {(today + timedelta(days=12)).strftime('%b %d')}",
+                "next_available": (today + timedelta(days=12)).strftime("%Y-%m-%d")
             },
             {
                 "id": "advisor_3",
                 "name": "Emily Rodriguez",
                 "specialty": "Debt Management",
+                "keywords": ["loan", "credit card", "mortgage", "consolidation", "budget"],
                 "rating": 4.7,
-                "availability": "Available for appointments"
+                "availability": "Available for appointments",
+                "next_available": today.strftime("%Y-%m-%d")
             }
         ]
     
+    def _generate_mock_advisor_availability(self, days=21):
+        """Generate working-hours availability windows for each advisor from their next available day"""
+        availability = {}
+        for advisor in self.advisors:
+            day = datetime.strptime(advisor["next_available"], "%Y-%m-%d")
+            windows = []
+            for offset in range(days):
+                date = day + timedelta(days=offset)
+                if date.weekday() < 5:
+                    windows.append({
+                        "start": date.replace(hour=9).isoformat(timespec="minutes"),
+                        "end": date.replace(hour=17).isoformat(timespec="minutes")
+                    })
+            availability[advisor["id"]] = windows
+        return availability
+    
+    def _stored_user(self, user_id):
+        """The on-disk dataset and row holding a user, or None"""
+        if self.store is None or user_id in self.users:
+            return None
+        dataset = self.store.refresh()
+        index = dataset.index_of(user_id)
+        return None if index is None else (dataset, index)
+    
+    def _user_data(self, user_id=None):
+        """Get one user's data; None means the demo user. On-disk users get their record and perks"""
+        user_id = user_id or self.default_user_id
+        if user_id in self.users:
+            return self.users[user_id]
+        stored = self._stored_user(user_id)
+        if stored is None:
+            raise KeyError(f"Unknown user: {user_id}")
+        record = stored[0].record(stored[1])
+        active = set(record["active_perks"])
+        record["perks"] = [
+            dict(perk, status="active" if perk["id"] in active else "available") for perk in self.perk_catalogue
+        ]
+        return record
+    
     # Public methods for data access
     
-    def get_user_profile(self):
+    def iter_user_ids(self):
+        """Stream the IDs of all users"""
+        yield from list(self.users)
+        if self.store is not None:
+            for user_id in self.store.refresh().user_ids:
+                yield str(user_id)
+    
+    def get_data_version(self, user_id=None):
+        """Get a user's data version; it changes whenever that user's data changes"""
+        user_id = user_id or self.default_user_id
+        if user_id in self.data_versions:
+            return self.data_versions[user_id]
+        stored = self._stored_user(user_id)
+        if stored is None:
+            raise KeyError(f"Unknown user: {user_id}")
+        # On-disk data changes only by publishing a new version, which records the users it changed
+        return stored[0].user_version(stored[1])
+    
+    def get_user_profile(self, user_id=None):
         """Get user profile information"""
-        return self.mock_data["user_profile"]
+        return self._user_data(user_id)["user_profile"]
     
-    def get_transactions(self, days=90):
-        """Get transaction history"""
-        return self.mock_data["transactions"][:days]
+    def get_transactions(self, days=90, user_id=None):
+        """Get transactions from the last `days` days, newest first"""
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        stored = self._stored_user(user_id)
+        if stored:
+            return stored[0].transactions(stored[1], after_day=to_day(cutoff))
+        return list(takewhile(lambda t: t["date"] > cutoff, self._user_data(user_id)["transactions"]))
     
-    def get_spending_by_category(self, days=90):
+    def add_transactions(self, transactions, user_id=None):
+        """Merge transactions into an in-memory user's history, returning their bumped data version"""
+        user_id = user_id or self.default_user_id
+        with self.write_lock:
+            data = self.users[user_id]
+            # Readers holding the old list keep a consistent snapshot
+            data["transactions"] = sorted(data["transactions"] + transactions, key=lambda t: t["date"], reverse=True)
+            self.data_versions[user_id] += 1
+            return self.data_versions[user_id]
+    
+    def get_spending_by_category(self, days=90, user_id=None):
         """Get spending aggregated by category"""
-        transactions = self.get_transactions(days)
+        transactions = self.get_transactions(days, user_id)
         spending = {}
         for txn in transactions:
             category = txn["category"]
             spending[category] = spending.get(category, 0) + txn["amount"]
         return spending
     
-    def get_goals(self):
+    def get_goals(self, user_id=None):
         """Get financial goals"""
-        return self.mock_data["goals"]
+        return self._user_data(user_id)["goals"]
     
-    def get_investments(self):
+    def get_investments(self, user_id=None):
         """Get investment portfolio"""
-        return self.mock_data["investments"]
+        stored = self._stored_user(user_id)
+        if stored:
+            return stored[0].investments(stored[1])
+        return self._user_data(user_id)["investments"]
+    
+    def get_holdings_history(self, user_id=None):
+        """Get daily values per investment position"""
+        stored = self._stored_user(user_id)
+        if stored:
+            return stored[0].holdings_history(stored[1])
+        return self._user_data(user_id)["holdings_history"]
     
-    def get_debts(self):
+    def get_debts(self, user_id=None):
         """Get debt information"""
-        return self.mock_data["debts"]
+        return self._user_data(user_id)["debts"]
     
-    def get_net_worth(self):
+    def get_net_worth(self, user_id=None):
         """Calculate net worth"""
-        total_assets = self.mock_data["investments"]["total_value"]
-        total_debts = sum(debt["balance"] for debt in self.mock_data["debts"])
+        total_assets = self.get_investments(user_id)["total_value"]
+        total_debts = sum(debt["balance"] for debt in self.get_debts(user_id))
         return {
             "total_assets": total_assets,
             "total_liabilities": total_debts,
             "net_worth": total_assets - total_debts
         }
     
-    def get_perks(self):
+    def get_perks(self, user_id=None):
         """Get banking perks and offers"""
-        return self.mock_data["perks"]
+        return self._user_data(user_id)["perks"]
+    
+    def get_perk_catalogue(self):
+        """Get every perk the bank offers, without per-user status"""
+        return self.perk_catalogue
     
     def get_advisors(self):
         """Get financial advisors"""
-        return self.mock_data["advisors"]
+        return self.advisors
+    
+    def get_advisor_availability(self):
+        """Get each advisor's availability windows"""
+        return self.advisor_availability
+    
+    def get_advisors_version(self):
+        """Get the advisors directory version; it changes whenever an advisor is added or updated"""
+        return self.advisors_version
+    
+    def add_advisor(self, advisor):
+        """Add an advisor to the directory, replacing any existing one with the same ID"""
+        self.advisors = [a for a in self.advisors if a["id"] != advisor["id"]] + [advisor]
+        self.advisors_version += 1
 
 # Global instance
-bank_data = BankDataWrapper()
\ No newline at end of file
+bank_data = BankDataWrapper(Config.BANK_DATA_PATH)
\ No newline at end of file
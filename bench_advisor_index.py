@@ -0,0 +1,92 @@
+"""
+Measure advisor search latency and incremental indexing cost on a large
+synthetic directory, and check every result against a brute-force ranking.
+
+Run: python bench_advisor_index.py [num_advisors]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from advisor_index import AdvisorIndex
+
+SPECIALTIES = [
+    "Retirement Planning", "Investment Strategy", "Debt Management", "Tax Planning",
+    "Estate Planning", "Insurance", "College Savings", "Small Business", "Real Estate",
+    "Budget Coaching", "Wealth Management", "Credit Repair"
+]
+KEYWORDS = [
+    "401k", "IRA", "pension", "stocks", "bonds", "mortgage", "loan", "credit card", "tax",
+    "trust", "will", "life insurance", "tuition", "payroll", "rental", "budget", "wealth",
+    "inheritance", "annuity", "crypto", "consolidation", "savings"
+]
+QUERIES = [
+    "retirement", "help with my 401k", "investment strategy", "debt consolidation",
+    "tax planning for my small business", "college savings", "mortgage", "estate and trust",
+    "credit card debt", "budget coaching"
+]
+
+
+def synthetic_advisors(rng, count):
+    today = datetime.now()
+    for i in range(count):
+        yield {
+            "id": f"advisor_{i}",
+            "name": f"Advisor {i}",
+            "specialty": SPECIALTIES[rng.integers(len(SPECIALTIES))],
+            "keywords": [KEYWORDS[k] for k in rng.choice(len(KEYWORDS), 4, replace=False)],
+            "rating": round(float(rng.uniform(3.5, 5.0)), 1),
+            "next_available": (today + timedelta(days=int(rng.integers(0, 45)))).strftime("%Y-%m-%d")
+        }
+
+
+def brute_force(index, terms, limit):
+    """Rank every advisor that matches a term"""
+    candidates = [a for a in index.advisors if any(t in index.terms[a] for t in terms)]
+    return sorted(candidates, key=lambda a: index.rank_key(a, terms))[:limit]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    index = AdvisorIndex(synthetic_advisors(rng, count))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {count} advisors in {elapsed:.2f}s ({1e6 * elapsed / count:.1f} us/advisor)")
+
+    for query in QUERIES:
+        terms = index.query_terms(query)
+        assert [a["id"] for _, a in index.search(terms, limit=3)] == brute_force(index, terms, 3), query
+
+    latencies = []
+    for _ in range(50):
+        for query in QUERIES:
+            terms = index.query_terms(query)
+            t = time.perf_counter()
+            index.search(terms, limit=3)
+            latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    print(f"Search p50:        {1e6 * latencies[len(latencies) // 2]:.1f} us")
+    print(f"Search p99:        {1e6 * latencies[int(0.99 * len(latencies))]:.1f} us")
+
+    # Incremental updates: new advisors and rating changes
+    extra = list(synthetic_advisors(rng, 1000))
+    t = time.perf_counter()
+    for i, advisor in enumerate(extra):
+        advisor["id"] = f"new_advisor_{i}"
+        index.add(advisor)
+    for i in range(1000):
+        advisor = dict(index.advisors[f"advisor_{i}"], rating=5.0)
+        index.add(advisor)
+    print(f"Incremental add:   {1e6 * (time.perf_counter() - t) / 2000:.1f} us/advisor")
+
+    terms = index.query_terms("retirement")
+    assert [a["id"] for _, a in index.search(terms, 3)] == brute_force(index, terms, 3)
+    print("All results match brute force")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measure earliest-slot queries and concurrent booking on large advisor
+calendars, and check that racing bookings never double-book a slot.
+
+Run: python bench_advisor_scheduling.py [num_advisors] [days]
+"""
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from advisor_index import AdvisorIndex
+from advisor_scheduling import AdvisorCalendar, SlotUnavailable, to_iso
+from bench_advisor_index import QUERIES, synthetic_advisors
+
+SLOT_MINUTES = 60
+BOOKED_SHARE = 0.7
+BOOKING_THREADS = 8
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    rng = np.random.default_rng(0)
+    index = AdvisorIndex(synthetic_advisors(rng, count))
+    calendar = AdvisorCalendar(SLOT_MINUTES)
+    start_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    start = time.perf_counter()
+    for advisor_id in index.advisors:
+        for offset in range(days):
+            day = start_day + timedelta(days=offset)
+            if day.weekday() < 5:
+                calendar.add_availability(advisor_id, day.replace(hour=9), day.replace(hour=17))
+    slots = sum(len(s) for s in calendar.free.values())
+    print(f"Calendar: {count} advisors, {slots} slots loaded in {time.perf_counter() - start:.1f}s")
+
+    # Fill most of the calendar so free slots are scattered
+    start = time.perf_counter()
+    for advisor_id, free in list(calendar.free.items()):
+        for slot in [s for s in free if rng.random() < BOOKED_SHARE]:
+            calendar.book(advisor_id, to_iso(slot), "filler")
+    elapsed = time.perf_counter() - start
+    print(f"Booked {len(calendar.bookings)} slots in {elapsed:.1f}s "
+          f"({1e6 * elapsed / len(calendar.bookings):.1f} us/booking)")
+
+    # Earliest slot among the advisors matching a need, checked against a scan of every calendar
+    latencies = []
+    for query in QUERIES * 20:
+        terms = index.query_terms(query)
+        t = time.perf_counter()
+        candidates = index.matching_ids(terms)
+        slot, advisors = calendar.earliest(candidates, start_day)[0]
+        index.best_among(advisors, terms)
+        latencies.append(time.perf_counter() - t)
+    for query in QUERIES:
+        candidates = index.matching_ids(index.query_terms(query))
+        expected = min(calendar.free[a][0] for a in candidates if calendar.free[a])
+        assert calendar.earliest(candidates, start_day)[0][0] == to_iso(expected), query
+    latencies.sort()
+    print(f"Earliest slot p50: {1e6 * latencies[len(latencies) // 2]:.1f} us")
+    print(f"Earliest slot p99: {1e6 * latencies[int(0.99 * len(latencies))]:.1f} us")
+
+    # Threads race for the same popular slots; every slot must be won exactly once
+    targets = [(a, to_iso(calendar.free[a][0])) for a in list(calendar.free)[:500] if calendar.free[a]]
+    wins = []
+    conflicts = [0]
+
+    def racer(thread):
+        for advisor_id, slot in targets:
+            try:
+                wins.append((advisor_id, slot, calendar.book(advisor_id, slot, f"racer_{thread}")))
+            except SlotUnavailable:
+                conflicts[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=racer, args=(i,)) for i in range(BOOKING_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    attempts = len(targets) * BOOKING_THREADS
+    assert len(wins) == len(targets) == len({(a, s) for a, s, _ in wins})
+    print(f"Concurrent booking: {attempts} attempts by {BOOKING_THREADS} threads in {elapsed:.2f}s, "
+          f"{len(wins)} booked, {conflicts[0]} conflicts, no double bookings")
+
+
+if __name__ == "__main__":
+    main()
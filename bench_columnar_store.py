@@ -0,0 +1,78 @@
+"""
+Measure the memory-mapped columnar store: opening a version against loading
+its columns into memory, per-user reads of the last 90 days, and publishing
+an append while a reader keeps serving.
+
+Run: python bench_columnar_store.py [num_users]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+import columnar_store
+from columnar_store import ColumnarStore
+from synthetic_data import SyntheticBank
+
+APPEND_ROWS = 10000
+READS = 2000
+
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    root = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        start = time.perf_counter()
+        version = columnar_store.new_version(root)
+        meta = SyntheticBank(end_date=date.today()).write(f"{root}/{version}", num_users)
+        columnar_store.publish(root, version)
+        print(f"Dataset: {num_users} users, {meta['transactions']} transactions, "
+              f"written in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        store = ColumnarStore(root, refresh_interval=0)
+        print(f"Open (mmap): {1000 * (time.perf_counter() - start):.1f} ms")
+        start = time.perf_counter()
+        loaded = {name: np.load(f"{root}/{version}/transactions/{name}.npy")
+                  for name in columnar_store.TRANSACTION_COLUMNS}
+        print(f"Load columns into memory: {1000 * (time.perf_counter() - start):.1f} ms "
+              f"({sum(c.nbytes for c in loaded.values()) / 1e6:.0f} MB per process)")
+        del loaded
+
+        rng = np.random.default_rng(0)
+        dataset = store.refresh()
+        cutoff = columnar_store.to_day(date.today().isoformat()) - 90
+        timings = []
+        for user in rng.integers(num_users, size=READS):
+            user_id = str(dataset.user_ids[user])
+            start = time.perf_counter()
+            current = store.refresh()
+            current.transactions(current.index_of(user_id), after_day=cutoff)
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1e6
+        print(f"90-day read per user: p50 {np.percentile(timings, 50):.0f} us, "
+              f"p99 {np.percentile(timings, 99):.0f} us")
+
+        users = dataset.user_ids[rng.integers(num_users, size=APPEND_ROWS)]
+        columns = {
+            "day": np.full(APPEND_ROWS, cutoff + 90),
+            "merchant": rng.integers(len(dataset.merchants), size=APPEND_ROWS),
+            "category": rng.integers(len(dataset.categories), size=APPEND_ROWS),
+            "amount_cents": rng.integers(100, 20000, size=APPEND_ROWS)
+        }
+        start = time.perf_counter()
+        columnar_store.append_transactions(root, users, columns)
+        elapsed = time.perf_counter() - start
+        refreshed = store.refresh()
+        print(f"Append {APPEND_ROWS} rows and swap: {elapsed:.2f}s "
+              f"(reader now on version {refreshed.version}, {int(refreshed.offsets[-1])} transactions; "
+              f"old version still readable: {len(dataset.transactions(0)) > 0})")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure streaming ingestion: rows per second for CSV and NDJSON feeds into a
+temporary columnar store (parsing, validation, encoding and the merge into a
+new published version), and for a CSV feed into the in-memory demo user. The
+feeds are generated in memory and fed in 64 KiB chunks, as a server receives
+them.
+
+Run: python bench_ingest.py [rows]
+"""
+import json
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import columnar_store
+from bank_wrapper import BankDataWrapper
+from ingest import ingest_stream
+from synthetic_data import MERCHANTS, SyntheticBank
+
+STORE_USERS = 2000
+FEED_CHUNK = 1 << 16
+
+
+def feed_rows(rows, user_ids, seed=0):
+    """Columns of a random feed: user, date, merchant, category (blank for half the rows), amount"""
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    days = [(today - timedelta(days=d)).isoformat() for d in range(365)]
+    merchants = rng.integers(len(MERCHANTS), size=rows)
+    return (
+        [str(user_ids[u]) for u in rng.integers(len(user_ids), size=rows)],
+        [days[d] for d in rng.integers(len(days), size=rows)],
+        [MERCHANTS[m][0] for m in merchants],
+        [MERCHANTS[m][1] if keep else "" for m, keep in zip(merchants, rng.random(rows) < 0.5)],
+        [f"{a:.2f}" for a in rng.lognormal(3.5, 0.8, size=rows)]
+    )
+
+
+def csv_feed(columns):
+    lines = ["user_id,date,merchant,category,amount"]
+    lines += [",".join(row) for row in zip(*columns)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def ndjson_feed(columns):
+    keys = ["user_id", "date", "merchant", "category", "amount"]
+    lines = [json.dumps(dict(zip(keys, row[:4] + (float(row[4]),)))) for row in zip(*columns)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def chunks(data):
+    return (data[i:i + FEED_CHUNK] for i in range(0, len(data), FEED_CHUNK))
+
+
+def run(name, data, feed_format, bank, default_user=None):
+    start = time.perf_counter()
+    report = ingest_stream(chunks(data), feed_format, bank, default_user)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {report['rows']} rows ({len(data) / 1e6:.0f} MB), {report['accepted']} accepted, "
+          f"{elapsed:.2f}s, {report['rows'] / elapsed:,.0f} rows/s, "
+          f"versions published {report['store_versions']}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    root = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        version = columnar_store.new_version(root)
+        SyntheticBank(end_date=date.today()).write(f"{root}/{version}", STORE_USERS)
+        columnar_store.publish(root, version)
+        bank = BankDataWrapper(root)
+        user_ids = bank.store.refresh().user_ids
+
+        columns = feed_rows(rows, user_ids)
+        run("CSV into the store", csv_feed(columns), "csv", bank)
+        run("NDJSON into the store", ndjson_feed(columns), "ndjson", bank)
+        dataset = bank.store.refresh(force=True)
+        print(f"Store now holds {int(dataset.offsets[-1])} transactions in version {dataset.version}")
+
+        columns = feed_rows(rows, [bank.default_user_id], seed=1)
+        run("CSV into the in-memory demo user", csv_feed(columns), "csv", bank)
+        print(f"Demo user now has {len(bank.users[bank.default_user_id]['transactions'])} transactions, "
+              f"data version {bank.get_data_version()}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
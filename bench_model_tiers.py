@@ -0,0 +1,69 @@
+"""
+Measure the query complexity estimator behind model tiering: microseconds per
+query, and how a labeled set of lookups and multi-step questions splits between
+the fast and strong tiers at Config.MODEL_COMPLEXITY_THRESHOLD. Lookups sent
+to the strong tier cost more than they need to; analysis sent to the fast tier
+risks a weaker answer, so both kinds of mistake are reported.
+
+Run: python bench_model_tiers.py [repeats]
+"""
+import sys
+import time
+
+from config import Config
+from model_tiers import complexity
+
+SIMPLE = [
+    "How much did I spend on groceries last month?",
+    "What's my net worth?",
+    "Show my recent transactions",
+    "What are my active perks?",
+    "How much is in my savings account?",
+    "List my subscriptions",
+    "What did I spend at Amazon?",
+    "When is my next advisor meeting?",
+    "How close am I to my vacation goal?",
+    "What's my credit card balance?",
+    "Alert me when dining exceeds $300 a month",
+    "Which category did I spend the most on?",
+]
+COMPLEX = [
+    "Should I pay off my $5,000 credit card first or put $300 a month into my emergency fund?",
+    "Compare the avalanche and snowball strategies for my debts and explain the long-term impact",
+    "What if I increase my retirement contributions by 5% and also keep saving for a house?",
+    "Can I afford a $40,000 car in 2 years given that I'm saving $800 each month? What happens to my other goals?",
+    "Analyze my spending over the last six months and recommend where I should cut back to hit my goals",
+    "Is my portfolio too aggressive, and should I rebalance before retiring in 10 years?",
+    "Help me plan how to prioritize my vacation fund versus paying down my student loan",
+    "Why did my spending jump this quarter, and what's the best way to bring it back under budget?",
+    "Break down the pros and cons of moving $10,000 from savings into my brokerage account",
+    "Forecast my net worth over the next 5 years assuming 6% returns and $500 per month in new savings",
+]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    queries = SIMPLE + COMPLEX
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            complexity(query)
+    elapsed = time.perf_counter() - start
+    print(f"Estimator: {1e6 * elapsed / (repeats * len(queries)):.1f} us/query over {repeats * len(queries):,} calls")
+
+    threshold = Config.MODEL_COMPLEXITY_THRESHOLD
+    simple = [complexity(q) for q in SIMPLE]
+    hard = [complexity(q) for q in COMPLEX]
+    over = [q for q, s in zip(SIMPLE, simple) if s >= threshold]
+    under = [q for q, s in zip(COMPLEX, hard) if s < threshold]
+    print(f"Threshold {threshold}: lookups scored {min(simple):.2f}-{max(simple):.2f}, "
+          f"analysis {min(hard):.2f}-{max(hard):.2f}")
+    print(f"  lookups sent to strong:  {len(over)}/{len(SIMPLE)}")
+    print(f"  analysis sent to fast:   {len(under)}/{len(COMPLEX)}")
+    print(f"  fast-tier share:         {(len(SIMPLE) - len(over) + len(under)) / len(queries):.0%}")
+    for query in over + under:
+        print(f"    misrouted: {complexity(query):.2f}  {query}")
+
+
+if __name__ == "__main__":
+    main()
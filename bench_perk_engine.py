@@ -0,0 +1,86 @@
+"""
+Measure perk scoring throughput against a large synthetic catalogue: one
+user at a time through the category/merchant postings, and chunks of users
+through the batch matrix product.
+
+Run: python bench_perk_engine.py [num_users]
+"""
+import sys
+import time
+
+import numpy as np
+
+from perk_engine import PerkIndex
+from config import Config
+
+NUM_PERKS = 5000
+NUM_CATEGORIES = 30
+NUM_MERCHANTS = 500
+MERCHANT_PERK_SHARE = 0.6
+
+
+def synthetic_catalogue(rng):
+    """Perks spread over categories, most of them tied to one to three merchants"""
+    perks = []
+    for i in range(NUM_PERKS):
+        perk = {
+            "id": f"perk_{i}",
+            "name": f"Perk {i}",
+            "category": f"Category {rng.integers(NUM_CATEGORIES)}",
+            "reward_rate": float(rng.uniform(0.005, 0.1))
+        }
+        if rng.random() < MERCHANT_PERK_SHARE:
+            perk["merchants"] = [f"Merchant {m}" for m in rng.choice(NUM_MERCHANTS, rng.integers(1, 4), replace=False)]
+        if rng.random() < 0.5:
+            perk["monthly_cap"] = float(rng.choice([5, 10, 25, 50]))
+        perks.append(perk)
+    return perks
+
+
+def synthetic_spend(rng, index, users):
+    """Each user spends in a handful of the catalogue's feature columns"""
+    spend = np.zeros((users, len(index.features)))
+    rows = np.repeat(np.arange(users), 12)
+    columns = rng.integers(len(index.features), size=rows.size)
+    spend[rows, columns] = rng.gamma(2.0, 60.0, size=rows.size)
+    return spend
+
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    chunk = Config.PERK_BATCH_CHUNK_SIZE
+    k = Config.PERK_RECOMMENDATION_LIMIT
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    index = PerkIndex(synthetic_catalogue(rng))
+    print(f"Catalogue: {NUM_PERKS} perks, {len(index.features)} spend features, "
+          f"indexed in {1000 * (time.perf_counter() - start):.1f} ms")
+
+    # Single users through the postings
+    spend = synthetic_spend(rng, index, 2000)
+    names = list(index.features)
+    latencies = []
+    for row in spend:
+        category_spend = {name: row[c] for c, (kind, name) in enumerate(names) if kind == "category" and row[c]}
+        merchant_spend = {name: row[c] for c, (kind, name) in enumerate(names) if kind == "merchant" and row[c]}
+        t = time.perf_counter()
+        index.score_user(category_spend, merchant_spend)
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+    print(f"Single user p50:  {1e6 * latencies[len(latencies) // 2]:.1f} us")
+    print(f"Single user p99:  {1e6 * latencies[int(0.99 * len(latencies))]:.1f} us")
+
+    # Batches of users through the matrix product
+    scored = 0
+    start = time.perf_counter()
+    while scored < num_users:
+        size = min(chunk, num_users - scored)
+        index.top_k(synthetic_spend(rng, index, size), k)
+        scored += size
+    elapsed = time.perf_counter() - start
+    print(f"Batch: {scored} users in {elapsed:.1f}s ({scored / elapsed:,.0f} users/sec, chunk {chunk})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure per-request server overhead of the /run response path: the previous
+generated servers (List[Dict[str, Any]] response model, validated and
+encoded by FastAPI, rendered with json) against agent_server (plain dicts
+returned as an orjson response). The agent answers instantly, so the numbers
+are framework and serialization cost only.
+
+Run: python bench_server_serialization.py [requests]
+"""
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from agent_server import FastJSONResponse, RunRequest, RunResponse, create_app, model_events
+from session_memory import session_store
+
+ANSWER = "Here is your spending summary for the last 30 days. " * 60
+
+
+class EchoAgent:
+    """Answers every query instantly with a fixed reply"""
+
+    def process_query(self, query, history="", user_id=None):
+        return ANSWER
+
+
+class LegacyRunResponse(BaseModel):
+    events: List[Dict[str, Any]]
+
+
+def legacy_app(agent):
+    """The /run route as the old server template built it"""
+    app = FastAPI()
+    app.add_middleware(
+        CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
+    )
+
+    @app.post("/run", response_model=LegacyRunResponse)
+    async def run_agent(request: RunRequest):
+        user_message = request.new_message.parts[0].text
+        history = session_store.render(request.user_id, request.session_id)
+        response_text = await run_in_threadpool(agent.process_query, user_message, history, request.user_id)
+        session_store.record_turn(request.user_id, request.session_id, user_message, response_text)
+        events = [{"content": {"parts": [{"text": response_text}]}, "role": "model"}]
+        return LegacyRunResponse(events=events)
+
+    return app
+
+
+def serialization_only(rounds):
+    """Microseconds to turn one reply into response bytes, each way"""
+    events = model_events(ANSWER)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # Old path: build the model, validate it as the response model, encode, render with json
+        model = LegacyRunResponse(events=events)
+        JSONResponse(LegacyRunResponse.model_validate(model.model_dump()).model_dump(mode="json")).body
+    old = (time.perf_counter() - start) / rounds * 1e6
+    start = time.perf_counter()
+    for _ in range(rounds):
+        FastJSONResponse({"events": events}).body
+    new = (time.perf_counter() - start) / rounds * 1e6
+    return old, new
+
+
+async def per_request(app, requests, session_id):
+    """Per-request latencies (microseconds) of sequential in-process /run calls"""
+    payload = {
+        "app_name": "bench", "user_id": "user_123", "session_id": session_id,
+        "new_message": {"role": "user", "parts": [{"text": "How much did I spend?"}]}
+    }
+    timings = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests + 50):
+            start = time.perf_counter()
+            response = await client.post("/run", json=payload)
+            elapsed = time.perf_counter() - start
+            assert RunResponse.model_validate_json(response.content).events[0].content.parts[0].text == ANSWER
+            if i >= 50:
+                timings.append(elapsed)
+    return np.array(timings) * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    old, new = serialization_only(requests * 5)
+    print(f"Reply of {len(ANSWER)} chars, serialization only: "
+          f"old {old:.1f} us, new {new:.1f} us ({old / new:.1f}x)")
+
+    agent = EchoAgent()
+    for name, app in [("old", legacy_app(agent)), ("new", create_app(agent))]:
+        timings = asyncio.run(per_request(app, requests, f"bench-{name}"))
+        print(f"{name} /run in-process: p50 {np.percentile(timings, 50):.0f} us, "
+              f"p99 {np.percentile(timings, 99):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure hit rate, false-hit rate and lookup latency of the near-duplicate
+answer cache against a corpus of paraphrased banking questions, and check
+that questions differing only in direction, negation or an amount never share an answer
+(the script exits non-zero if one does).
+
+Run: python bench_similarity_cache.py
+"""
+import sys
+import time
+
+from similarity_cache import SimilarityCache
+from config import Config
+
+# Each group holds paraphrases of one question; the first one is cached and the
+# rest should hit it. Queries from different groups must never share an answer.
+QUERY_CORPUS = [
+    ["How much did I spend eating out?", "dining spend this month", "What did I spend on dining?",
+     "how much have I spent on restaurants", "Show my dining spending"],
+    ["What is my net worth?", "what's my net worth", "Tell me my net worth please",
+     "net worth", "How much is my net worth right now?"],
+    ["What did I spend on groceries last month?", "grocery spending last month",
+     "How much did I spend on groceries last month?", "last month grocery spend"],
+    ["How am I doing on my emergency fund goal?", "emergency fund goal progress",
+     "Show progress on my emergency fund goal", "how is my emergency fund goal doing"],
+    ["What perks can save me money?", "which perks save me money", "What rewards can save me money?",
+     "perks that can save money"],
+    ["Show me my recent transactions", "recent transactions", "list my recent purchases",
+     "What are my recent transactions?"],
+    ["What's the best way to pay off my debts?", "best way to pay off debt",
+     "How should I pay off my debts?", "what is the best way to pay off debts"],
+    ["I need help with retirement planning", "help with retirement planning",
+     "Can you help me with retirement planning?", "retirement planning help"],
+    ["Show me my investment portfolio", "show my investments", "what is in my investment portfolio",
+     "my investment portfolio"],
+    ["What are my biggest spending categories?", "biggest spending categories",
+     "which categories do I spend the most on", "show my biggest spend categories"],
+    ["How much did I spend on transportation?", "transportation spending",
+     "what have I spent on transportation", "transportation spend"],
+    ["Calculate my total potential savings from perks", "total potential savings from perks",
+     "what are my total potential perk savings", "potential savings from all perks"],
+]
+
+# Pairs that look alike but ask opposite things; neither may hit the other's entry
+OPPOSITE_PAIRS = [
+    ("Move $500 from savings to checking", "Move $500 from checking to savings"),
+    ("How much did I transfer from my brokerage account to my savings?",
+     "How much did I transfer from my savings to my brokerage account?"),
+    ("Should I move money into my emergency fund from investments?",
+     "Should I move money into investments from my emergency fund?"),
+    ("Which perks do I use?", "Which perks don't I use?"),
+    ("Did I spend on dining this month?", "Did I not spend on dining this month?"),
+    ("Show transactions with a merchant category", "Show transactions without a merchant category"),
+    ("Am I on track for my emergency fund goal?", "Am I not on track for my emergency fund goal?"),
+    ("What if I pay $300 extra a month on my credit card?", "What if I pay $1500 extra a month on my credit card?"),
+    ("Can I afford a $40,000 car in 2 years?", "Can I afford a $40,000 car in 5 years?"),
+]
+
+
+def check_opposites(cache):
+    """Store each side of every opposite pair and look up the other; return the false hits"""
+    false_hits = []
+    for pair_id, pair in enumerate(OPPOSITE_PAIRS):
+        for stored, asked in (pair, pair[::-1]):
+            scope = ("bench-opposites", pair_id, stored)
+            cache.store(scope, stored, stored)
+            if cache.lookup(scope, asked) is not None:
+                false_hits.append((asked, stored))
+    return false_hits
+
+
+def main():
+    cache = SimilarityCache(
+        Config.SIMILARITY_CACHE_THRESHOLD,
+        Config.SIMILARITY_CACHE_NUM_PERM,
+        Config.SIMILARITY_CACHE_BANDS,
+        Config.SIMILARITY_CACHE_MAX_ENTRIES,
+        Config.SIMILARITY_CACHE_TTL
+    )
+    scope = ("bench", "user_123", 1)
+
+    for group_id, group in enumerate(QUERY_CORPUS):
+        cache.store(scope, group[0], group_id)
+
+    hits = false_hits = misses = 0
+    latencies = []
+    for group_id, group in enumerate(QUERY_CORPUS):
+        for query in group[1:]:
+            start = time.perf_counter()
+            answer = cache.lookup(scope, query)
+            latencies.append(time.perf_counter() - start)
+            if answer is None:
+                misses += 1
+                print(f"  miss:      {query!r}")
+            elif answer == group_id:
+                hits += 1
+            else:
+                false_hits += 1
+                print(f"  FALSE HIT: {query!r} -> {QUERY_CORPUS[answer][0]!r}")
+
+    # Repeat lookups to get stable latency percentiles
+    for _ in range(200):
+        for group in QUERY_CORPUS:
+            for query in group:
+                start = time.perf_counter()
+                cache.lookup(scope, query)
+                latencies.append(time.perf_counter() - start)
+
+    total = hits + false_hits + misses
+    latencies.sort()
+    print()
+    print(f"Paraphrase lookups: {total}")
+    print(f"Hit rate:           {hits / total:.1%}")
+    print(f"False-hit rate:     {false_hits / total:.1%}")
+    print(f"Lookup p50:         {1e6 * latencies[len(latencies) // 2]:.1f} us")
+    print(f"Lookup p99:         {1e6 * latencies[int(0.99 * len(latencies))]:.1f} us")
+
+    false_hits = check_opposites(cache)
+    print(f"Opposite pairs:     {len(false_hits)}/{2 * len(OPPOSITE_PAIRS)} false hits")
+    for asked, stored in false_hits:
+        print(f"  FALSE HIT: {asked!r} -> {stored!r}")
+    if false_hits:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Budget rules: spending limits per category and period, with alerts.
+
+A rule is "at most `limit` dollars on `category` per week, month or year"
+("*" is all spending). Rules are indexed by (user, category, period), and
+each index entry holds the spend of its current period, shared by every
+rule on that key. A batch of new transactions is summed per category and
+touches only the entries for that category and for "*", a constant number of
+dictionary lookups per distinct category. A period that has ended is reset
+the first time a transaction or a read falls after it.
+
+Counters are tagged with the user's data version, the same way the recurring
+charge tracker and anomaly detector are: ingest passes newly written rows
+through observe(), and any other change to the data makes the next read
+recount that user's current periods from their history. Sums do not depend
+on order, so back-dated rows are simply added if they fall in a current
+period.
+
+Crossing BUDGET_WARN_SHARE of a limit raises a warning alert and crossing the
+limit an exceeded alert, each at most once per rule and period, dated by the
+transaction that crossed it.
+
+Rules come from POST /budgets/{user_id}, or from the spending agent when a
+query reads like "tell me when dining exceeds $400 this month". A user has at
+most one rule per category and period; creating it again sets its limit. Set
+BUDGET_RULES_PATH to keep them in SQLite across restarts.
+"""
+import math
+import re
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from datetime import date
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from bank_wrapper import bank_data
+from config import Config
+from recurring_charges import transaction_columns
+from synthetic_data import CATEGORY_NAMES
+
+ALL = "*"
+PERIODS = {"week": "W", "month": "M", "year": "Y"}
+PERIOD_WORDS = {"weekly": "week", "monthly": "month", "yearly": "year", "annual": "year", "annually": "year"}
+ALL_WORDS = {"all", "total", "everything", "overall", "spending", "all spending", "total spending"}
+
+AMOUNT = r"\$?(?P<limit>\d[\d,]*(?:\.\d{1,2})?)\s*(?:dollars\s*)?"
+PERIOD = r"(?:(?:this|a|per|each|every|the)\s+)?(?P<period>week|month|year)"
+TRAILING_PERIOD = rf"(?:(?:in\s+|for\s+)?{PERIOD}|(?P<trailing>{'|'.join(PERIOD_WORDS)}))"
+ALERT_RULE = re.compile(
+    rf"^(?:please\s+)?(?:tell|alert|notify|warn|let)\s+me(?:\s+know)?\s+(?:when|if)\s+(?:my\s+)?"
+    rf"(?P<category>[a-z][a-z &]*?)(?:\s+spending)?\s+(?:exceeds|goes\s+over|is\s+over|gets\s+over|passes|tops|hits)\s+"
+    rf"{AMOUNT}{TRAILING_PERIOD}?$"
+)
+BUDGET_RULE = re.compile(
+    rf"^(?:please\s+)?(?:set|create|add|make|start)?\s*(?:up\s+)?(?:a|my|an)?\s*(?P<adjective>weekly|monthly|yearly|annual)?\s*"
+    rf"budget\s+(?:of\s+)?{AMOUNT}(?:(?:for|on)\s+(?:my\s+)?(?P<category>[a-z][a-z &]*?))?(?:\s+{TRAILING_PERIOD})?$"
+)
+
+
+def period_starts(days, period):
+    """First day (days since the epoch) of the period holding each day"""
+    unit = PERIODS[period]
+    days = np.asarray(days, dtype=np.int64)
+    if unit == "W":
+        # The epoch was a Thursday; periods start on Mondays
+        return days - (days + 3) % 7
+    return days.astype("datetime64[D]").astype(f"datetime64[{unit}]").astype("datetime64[D]").astype(np.int64)
+
+
+def period_end(start, period):
+    """Last day of the period starting on `start`"""
+    if period == "week":
+        return start + 6
+    unit = PERIODS[period]
+    following = np.datetime64(int(start), "D").astype(f"datetime64[{unit}]") + 1
+    return int(following.astype("datetime64[D]").astype(np.int64)) - 1
+
+
+def to_date(day):
+    return str(np.datetime64(int(day), "D"))
+
+
+def today_day():
+    return (date.today() - date(1970, 1, 1)).days
+
+
+def canonical_category(name):
+    """A category name as stored, ALL for overall spending, or None if it is not a category"""
+    text = " ".join(str(name).lower().split())
+    if text in ALL_WORDS or text == ALL:
+        return ALL
+    for category in CATEGORY_NAMES:
+        if text in (category.lower(), category.lower().rstrip("s")):
+            return category
+    return None
+
+
+def parse_rule(query):
+    """(category, limit, period) of a query asking for a budget or spending alert, or None"""
+    text = " ".join(query.lower().replace("’", "'").split()).rstrip("?!. ")
+    match = ALERT_RULE.match(text) or BUDGET_RULE.match(text)
+    if not match:
+        return None
+    fields = match.groupdict()
+    # No period at all means a monthly budget
+    period = fields.get("period") or PERIOD_WORDS.get(fields.get("trailing") or fields.get("adjective") or "", "month")
+    category = fields.get("category") or "all"
+    return category, float(fields["limit"].replace(",", "")), period
+
+
+class SqliteBudgetBackend:
+    """Optional local persistence so rules survive restarts"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS budget_rules ("
+            "rule_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, category TEXT NOT NULL, "
+            "period TEXT NOT NULL, amount_limit REAL NOT NULL, created TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load_all(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rule_id, user_id, category, period, amount_limit, created FROM budget_rules ORDER BY created"
+            ).fetchall()
+        keys = ["rule_id", "user_id", "category", "period", "limit", "created"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def save(self, rule):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO budget_rules VALUES (?, ?, ?, ?, ?, ?)",
+                (rule["rule_id"], rule["user_id"], rule["category"], rule["period"], rule["limit"], rule["created"])
+            )
+            self._conn.commit()
+
+    def delete(self, rule_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM budget_rules WHERE rule_id = ?", (rule_id,))
+            self._conn.commit()
+
+
+class BudgetEngine:
+    """Budget rules indexed by (user, category, period), with per-period spend counters and alerts"""
+
+    def __init__(self, bank=None, backend=None):
+        self.bank = bank or bank_data
+        self.backend = backend
+        self.rules = {}
+        # (user_id, category, period) -> {"start": first day of the counted period, "spent": dollars, "rules": [ids]}
+        self.counters = {}
+        # user_id -> {"version": data version counted (None to recount), "keys": set, "alerts": deque}
+        self.users = {}
+        # user_id -> number of rule changes, so answers quoting a user's rules can be cached per version
+        self.rule_versions = {}
+        self._lock = threading.RLock()
+        self.transactions = 0
+        self.recounts = 0
+        self.alerts_raised = 0
+        for rule in backend.load_all() if backend else []:
+            self._index(rule)
+
+    def _index(self, rule):
+        key = (rule["user_id"], rule["category"], rule["period"])
+        counter = self.counters.setdefault(key, {"start": -1, "spent": 0.0, "rules": []})
+        counter["rules"].append(rule["rule_id"])
+        user = self.users.setdefault(
+            rule["user_id"], {"version": None, "keys": set(), "alerts": deque(maxlen=Config.BUDGET_MAX_ALERTS)}
+        )
+        user["keys"].add(key)
+        # The new counter has not been counted yet
+        user["version"] = None
+        self.rules[rule["rule_id"]] = dict(rule, alerted={})
+
+    def add_rule(self, user_id, category, limit, period="month"):
+        """
+        Create a rule, or update the limit of the user's rule on the same category
+        and period, returning its status; ValueError for an unknown category,
+        period or bad limit
+        """
+        user_id = user_id or self.bank.default_user_id
+        self.bank.get_data_version(user_id)
+        stored = canonical_category(category)
+        if stored is None:
+            raise ValueError(f"Unknown category: {category}. Categories are {', '.join(CATEGORY_NAMES)} or all")
+        period = PERIOD_WORDS.get(period, period)
+        if period not in PERIODS:
+            raise ValueError(f"Period must be one of {', '.join(PERIODS)}")
+        limit = float(limit)
+        if not math.isfinite(limit) or limit <= 0:
+            raise ValueError("Limit must be a positive amount")
+        with self._lock:
+            # One rule per (user, category, period): asking again changes its limit, and a retried
+            # request changes nothing
+            existing = self.counters.get((user_id, stored, period))
+            if existing:
+                rule = self.rules[existing["rules"][0]]
+                if rule["limit"] != round(limit, 2):
+                    rule["limit"] = round(limit, 2)
+                    # Alerts are re-raised against the new limit on the next recount
+                    rule["alerted"] = {}
+                    self.users[user_id]["version"] = None
+                    self._rules_changed(user_id)
+                    if self.backend:
+                        self.backend.save(rule)
+                return next(s for s in self.status(user_id) if s["rule_id"] == rule["rule_id"])
+            held = self.users.get(user_id)
+            if held and sum(len(self.counters[k]["rules"]) for k in held["keys"]) >= Config.BUDGET_MAX_RULES_PER_USER:
+                raise ValueError(f"A user can have at most {Config.BUDGET_MAX_RULES_PER_USER} budget rules")
+            rule = {
+                "rule_id": uuid.uuid4().hex[:12],
+                "user_id": user_id,
+                "category": stored,
+                "period": period,
+                "limit": round(float(limit), 2),
+                "created": date.today().isoformat()
+            }
+            self._index(rule)
+            self._rules_changed(user_id)
+            if self.backend:
+                self.backend.save(rule)
+            return next(s for s in self.status(user_id) if s["rule_id"] == rule["rule_id"])
+
+    def _rules_changed(self, user_id):
+        self.rule_versions[user_id] = self.rule_versions.get(user_id, 0) + 1
+
+    def rules_version(self, user_id=None):
+        """A number that changes whenever one of the user's rules is added, changed or removed"""
+        with self._lock:
+            return self.rule_versions.get(user_id or self.bank.default_user_id, 0)
+
+    def remove_rule(self, user_id, rule_id):
+        """Delete a user's rule, returning whether it existed"""
+        user_id = user_id or self.bank.default_user_id
+        with self._lock:
+            rule = self.rules.get(rule_id)
+            if rule is None or rule["user_id"] != user_id:
+                return False
+            del self.rules[rule_id]
+            key = (user_id, rule["category"], rule["period"])
+            self.counters[key]["rules"].remove(rule_id)
+            if not self.counters[key]["rules"]:
+                del self.counters[key]
+                self.users[user_id]["keys"].discard(key)
+            self._rules_changed(user_id)
+            if self.backend:
+                self.backend.delete(rule_id)
+            return True
+
+    def _add(self, key, days, amounts, today=None):
+        """Add charges (all of one category, or any for ALL) to a counter and raise the alerts they cause"""
+        counter = self.counters[key]
+        period = key[2]
+        starts = period_starts(days, period)
+        newest = max(int(starts.max()) if len(starts) else -1, period_starts([today], period)[0] if today else -1)
+        if newest > counter["start"]:
+            counter["start"], counter["spent"] = int(newest), 0.0
+        current = np.flatnonzero(starts == counter["start"])
+        if not len(current):
+            return
+        order = current[np.argsort(np.asarray(days)[current], kind="stable")]
+        before = counter["spent"]
+        running = before + np.cumsum(np.asarray(amounts, dtype=float)[order])
+        counter["spent"] = float(running[-1])
+        for rule_id in counter["rules"]:
+            self._check(self.rules[rule_id], counter, before, running, np.asarray(days)[order])
+
+    def _check(self, rule, counter, before, running, days):
+        limit, start = rule["limit"], counter["start"]
+        for level, share in (("exceeded", 1.0), ("warning", Config.BUDGET_WARN_SHARE)):
+            threshold = limit * share
+            if rule["alerted"].get(level) == start or not (before < threshold <= running[-1]):
+                continue
+            rule["alerted"][level] = start
+            if level == "exceeded":
+                # Exceeding the limit also covers the warning
+                rule["alerted"]["warning"] = start
+            crossed = int(np.searchsorted(running, threshold))
+            self.users[rule["user_id"]]["alerts"].append({
+                "rule_id": rule["rule_id"],
+                "level": level,
+                "category": "All spending" if rule["category"] == ALL else rule["category"],
+                "period": rule["period"],
+                "period_start": to_date(start),
+                "limit": limit,
+                "spent": round(float(running[crossed]), 2),
+                "date": to_date(days[crossed])
+            })
+            self.alerts_raised += 1
+            break
+
+    def _recount(self, user_id, version):
+        """Count a user's current periods from their history (lock held)"""
+        user = self.users[user_id]
+        today = today_day()
+        first = min((int(period_starts([today], k[2])[0]) for k in user["keys"]), default=today)
+        history = self.bank.get_transactions(days=today - first + 1, user_id=user_id)
+        days, _, categories, amounts = transaction_columns(history)
+        categories = np.asarray(categories, dtype=object)
+        amounts = np.asarray(amounts, dtype=float)
+        for key in user["keys"]:
+            counter = self.counters[key]
+            counter["start"], counter["spent"] = -1, 0.0
+            rows = slice(None) if key[1] == ALL else categories == key[1]
+            self._add(key, days[rows], amounts[rows], today)
+        user["version"] = version
+        self.recounts += 1
+
+    def _current(self, user_id):
+        """A user's counters, recounted if the data changed and rolled over into today's periods (lock held)"""
+        version = self.bank.get_data_version(user_id)
+        user = self.users[user_id]
+        if user["version"] != version:
+            self._recount(user_id, version)
+        today = today_day()
+        for key in user["keys"]:
+            counter = self.counters[key]
+            start = int(period_starts([today], key[2])[0])
+            if start > counter["start"]:
+                counter["start"], counter["spent"] = start, 0.0
+
+    def tracked(self, user_id):
+        with self._lock:
+            return user_id in self.users and bool(self.users[user_id]["keys"])
+
+    def observe(self, user_id, days, merchants, categories, amounts, old_version, new_version):
+        """
+        Add charges just written for a user to the counters their category and
+        ALL index, if the counters describe exactly the data before the write
+        """
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return
+            if user["version"] != old_version:
+                user["version"] = None
+                return
+            days = np.asarray(days, dtype=np.int64)
+            amounts = np.asarray(amounts, dtype=float)
+            categories = np.asarray(categories, dtype=object)
+            for category in set(categories.tolist()) | {ALL}:
+                rows = slice(None) if category == ALL else categories == category
+                for period in PERIODS:
+                    if (user_id, category, period) in self.counters:
+                        self._add((user_id, category, period), days[rows], amounts[rows])
+            user["version"] = new_version
+            self.transactions += len(days)
+
+    def status(self, user_id=None):
+        """Every rule of a user with its current period's spend, projection and state"""
+        user_id = user_id or self.bank.default_user_id
+        self.bank.get_data_version(user_id)
+        with self._lock:
+            if user_id not in self.users:
+                return []
+            self._current(user_id)
+            today = today_day()
+            result = []
+            for key in sorted(self.users[user_id]["keys"]):
+                counter = self.counters[key]
+                end = period_end(counter["start"], key[2])
+                elapsed = today - counter["start"] + 1
+                projected = counter["spent"] * (end - counter["start"] + 1) / elapsed
+                for rule_id in counter["rules"]:
+                    limit = self.rules[rule_id]["limit"]
+                    spent = counter["spent"]
+                    if spent >= limit:
+                        state = "exceeded"
+                    elif spent >= limit * Config.BUDGET_WARN_SHARE:
+                        state = "warning"
+                    else:
+                        state = "on track" if projected <= limit else "projected to exceed"
+                    result.append({
+                        "rule_id": rule_id,
+                        "category": "All spending" if key[1] == ALL else key[1],
+                        "period": key[2],
+                        "period_start": to_date(counter["start"]),
+                        "period_end": to_date(end),
+                        "limit": limit,
+                        "spent": round(spent, 2),
+                        "remaining": round(max(limit - spent, 0), 2),
+                        "used_pct": round(spent / limit * 100, 1),
+                        "projected_spend": round(projected, 2),
+                        "status": state
+                    })
+            return result
+
+    def alerts(self, user_id=None, days=None):
+        """A user's alerts from the last `days` days, newest first"""
+        user_id = user_id or self.bank.default_user_id
+        days = days or Config.BUDGET_ALERT_DAYS
+        self.bank.get_data_version(user_id)
+        with self._lock:
+            if user_id not in self.users:
+                return []
+            self._current(user_id)
+            cutoff = to_date(today_day() - days)
+            return [a for a in reversed(self.users[user_id]["alerts"]) if a["date"] >= cutoff]
+
+    def rule_from_query(self, query, user_id=None):
+        """
+        If a query asks for a budget or spending alert, create the rule and
+        return ("created", status) or ("rejected", reason); otherwise None
+        """
+        parsed = parse_rule(query)
+        if parsed is None:
+            return None
+        try:
+            return "created", self.add_rule(user_id, *parsed)
+        except ValueError as e:
+            return "rejected", str(e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget_rules": {
+                    "rules": len(self.rules),
+                    "counters": len(self.counters),
+                    "users": len(self.users),
+                    "transactions": self.transactions,
+                    "recounts": self.recounts,
+                    "alerts": self.alerts_raised
+                }
+            }
+
+
+budget_engine = BudgetEngine(
+    backend=SqliteBudgetBackend(Config.BUDGET_RULES_PATH) if Config.BUDGET_RULES_PATH else None
+)
+
+router = APIRouter(prefix="/budgets")
+
+
+@router.get("/{user_id}")
+async def get_budgets(user_id: str):
+    """A user's budget rules with their current spend, and recent alerts"""
+    try:
+        budgets = await run_in_threadpool(budget_engine.status, user_id)
+        alerts = await run_in_threadpool(budget_engine.alerts, user_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    return {"budgets": budgets, "alerts": alerts}
+
+
+@router.post("/{user_id}", status_code=201)
+async def create_budget(user_id: str, request: Request):
+    """Create a rule from {"category", "limit", "period"} and return its status"""
+    try:
+        body = await request.json()
+        category, limit, period = body["category"], float(body["limit"]), body.get("period", "month")
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Body must be JSON with "category", "limit" and optionally "period"')
+    try:
+        return await run_in_threadpool(budget_engine.add_rule, user_id, category, limit, period)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/{user_id}/{rule_id}", status_code=204)
+async def delete_budget(user_id: str, rule_id: str):
+    if not budget_engine.remove_rule(user_id, rule_id):
+        raise HTTPException(status_code=404, detail=f"Unknown budget rule: {rule_id}")
+    return Response(status_code=204)
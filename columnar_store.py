@@ -0,0 +1,374 @@
+"""
+Memory-mapped columnar bank data shared by every agent process.
+
+A dataset is a directory of per-column .npy files in the layout written by
+synthetic_data.py. Opening one maps the columns read-only instead of loading
+them, so startup is a handful of file opens however large the data is, and
+every process and worker reading the same files shares one copy of the pages
+in the OS page cache. A user's transactions are the contiguous rows
+offsets[i]:offsets[i + 1] of every column, newest first; user IDs are found
+by binary search over the sorted ID column, and a user's record by slicing
+users.jsonl, also mapped when the dataset is opened, at its byte offsets.
+
+A store root keeps immutable versions of a dataset side by side, plus a
+CURRENT file naming the live one:
+    root/CURRENT
+    root/v000001/...
+    root/v000002/...
+Published versions are never modified. append_transactions writes a new
+version that merges the new rows into copies of the transaction columns
+(files that do not change are hard-linked), then publish() swaps CURRENT with
+an atomic rename. It also writes user_versions.npy, the version in which each
+user's rows last changed, so a publish only changes the data version of the
+users it added rows for; every cache keyed on the data version (answers, perk
+indexes, trackers, /data ETags) stays valid for everyone else. A dataset
+without that file (as synthetic_data.py writes it) counts every user as
+changed in its own version. Readers pick up the new version on their next refresh
+check; requests still holding the old one keep reading it, since every file a
+Dataset reads is mapped when it is opened and mapped files stay readable even
+after pruning unlinks them.
+
+One writer at a time, across processes: every agent server mounts /ingest and
+the CLIs write the same root, so anything that reads the live version to build
+the next one holds store_lock(root), an flock on root/LOCK, from reading
+CURRENT until it has published. Without it two appends starting from the same
+live version would each publish, and the second would drop the first's rows.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within a process only
+    fcntl = None
+
+import numpy as np
+
+TRANSACTION_COLUMNS = ["day", "merchant", "category", "amount_cents"]
+CURRENT = "CURRENT"
+LOCK = "LOCK"
+VERSION_PATTERN = re.compile(r"^v(\d{6})$")
+# Rows merged per pass when appending, to bound temporary memory
+APPEND_CHUNK_ROWS = 1 << 22
+# Files an append never changes, hard-linked into the new version
+UNCHANGED_FILES = ["users.jsonl", "user_ids.npy", "user_offsets.npy", "holdings/day.npy", "holdings/values.npy"]
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def to_day(date_str):
+    """Days since 1970-01-01 for a YYYY-MM-DD string"""
+    return int((np.datetime64(date_str, "D") - EPOCH).astype(np.int64))
+
+
+class StoreLock:
+    """
+    Exclusive writer lock on a store root, held across threads and processes.
+    Unlike threading.Lock it is also an flock on root/LOCK, and like it, it may
+    be released from another thread than the one that acquired it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self._file = open(os.path.join(self.root, LOCK), "a")
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        file, self._file = self._file, None
+        if file is not None:
+            # Closing the file drops the flock
+            file.close()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def store_lock(root):
+    """The process's StoreLock for a store root"""
+    key = os.path.realpath(root)
+    with _store_locks_lock:
+        return _store_locks.setdefault(key, StoreLock(root))
+
+
+def current_version(root):
+    """Name of the live version of a store root, or None for a plain dataset directory"""
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def versions(root):
+    """Names of every version in a store root, oldest first"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if VERSION_PATTERN.match(name))
+
+
+def new_version(root):
+    """Create the directory for the next version of a store root and return its name"""
+    os.makedirs(root, exist_ok=True)
+    existing = versions(root)
+    number = int(VERSION_PATTERN.match(existing[-1]).group(1)) + 1 if existing else 1
+    name = f"v{number:06d}"
+    os.makedirs(os.path.join(root, name))
+    return name
+
+
+def publish(root, version, keep=2):
+    """Make a complete version the live one, then drop all but the newest `keep` older versions"""
+    if not os.path.exists(os.path.join(root, version, "meta.json")):
+        raise ValueError(f"{version} is not a complete dataset")
+    temp = os.path.join(root, f"{CURRENT}.{os.getpid()}")
+    with open(temp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, os.path.join(root, CURRENT))
+
+    older = [v for v in versions(root) if v < version]
+    for name in older[:max(len(older) - keep, 0)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class Dataset:
+    """One dataset version with its columns memory-mapped"""
+
+    def __init__(self, path, version=1):
+        self.path = path
+        self.version = version
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.offsets = self._load("transactions/offsets.npy")
+        self.columns = {name: self._load(f"transactions/{name}.npy") for name in TRANSACTION_COLUMNS}
+        self.holding_days = self._load("holdings/day.npy")
+        self.holdings = self._load("holdings/values.npy")
+        self.user_ids = self._load("user_ids.npy")
+        self.record_offsets = self._load("user_offsets.npy")
+        has_versions = os.path.exists(os.path.join(path, "user_versions.npy"))
+        self.user_versions = self._load("user_versions.npy") if has_versions else None
+        records = os.path.join(path, "users.jsonl")
+        self.records = np.memmap(records, dtype=np.uint8, mode="r") if os.path.getsize(records) else np.zeros(0, np.uint8)
+        self.merchants = [m[0] for m in self.meta["merchants"]]
+        self.categories = self.meta["categories"]
+        self.positions = self.meta["positions"]
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def index_of(self, user_id):
+        """Row of a user, or None if the dataset does not have them"""
+        i = int(np.searchsorted(self.user_ids, user_id))
+        return i if i < len(self.user_ids) and self.user_ids[i] == user_id else None
+
+    def user_version(self, index):
+        """The dataset version in which a user's data last changed"""
+        return self.version if self.user_versions is None else int(self.user_versions[index])
+
+    def record(self, index):
+        """A user's profile, goals, debts and active perk IDs"""
+        start, end = int(self.record_offsets[index]), int(self.record_offsets[index + 1])
+        return json.loads(self.records[start:end].tobytes())
+
+    def transactions(self, index, after_day=None):
+        """A user's transactions newer than `after_day` (days since the epoch) as dicts, newest first"""
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        days = self.columns["day"][start:end]
+        if after_day is not None:
+            # Days run newest first, so the rows after the cutoff are a prefix
+            end = start + int(np.searchsorted(-days, -after_day))
+        dates = (EPOCH + self.columns["day"][start:end]).astype(str)
+        merchants = self.columns["merchant"][start:end]
+        categories = self.columns["category"][start:end]
+        amounts = self.columns["amount_cents"][start:end] / 100
+        return [
+            {
+                "date": str(dates[i]),
+                "merchant": self.merchants[merchants[i]],
+                "category": self.categories[categories[i]],
+                "amount": float(amounts[i]),
+                "description": f"Purchase at {self.merchants[merchants[i]]}"
+            }
+            for i in range(end - start)
+        ]
+
+    def holdings_history(self, index):
+        """A user's daily values per position, as {"dates": [...], "positions": {name: [values]}}"""
+        values = np.round(self.holdings[index].astype(float), 2)
+        return {
+            "dates": (EPOCH + self.holding_days).astype(str).tolist(),
+            "positions": {p: values[k].tolist() for k, p in enumerate(self.positions)}
+        }
+
+    def investments(self, index):
+        """A user's current portfolio from the last day of their holdings"""
+        current = self.holdings[index, :, -1].astype(float)
+        total = float(current.sum())
+        return {
+            "total_value": round(total, 2),
+            "holdings": [
+                {"type": p, "value": round(float(current[k]), 2), "allocation": round(float(current[k]) / total * 100, 1)}
+                for k, p in enumerate(self.positions)
+            ]
+        }
+
+
+class ColumnarStore:
+    """
+    Reader of a store root, or of a single dataset directory, that reopens the
+    live version when CURRENT changes. Checks happen at most once per
+    `refresh_interval` seconds.
+    """
+
+    def __init__(self, path, refresh_interval=5.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.version_name = None
+        self.dataset = None
+        self.checked_at = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """The dataset to read from, reopened first if a newer version was published"""
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.refresh_interval:
+            return self.dataset
+        with self.lock:
+            self.checked_at = now
+            name = current_version(self.path)
+            if self.dataset is None or name != self.version_name:
+                if name is None:
+                    self.dataset = Dataset(self.path)
+                else:
+                    version = int(VERSION_PATTERN.match(name).group(1))
+                    self.dataset = Dataset(os.path.join(self.path, name), version)
+                self.version_name = name
+        return self.dataset
+
+
+def _link_or_copy(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _sort_keys(users, days):
+    """Keys ordering rows by user, then newest first"""
+    return (users.astype(np.int64) << 32) - days.astype(np.int64)
+
+
+def _chunk_keys(dataset, start, end):
+    users = np.searchsorted(dataset.offsets, np.arange(start, end), side="right") - 1
+    return _sort_keys(users, dataset.columns["day"][start:end])
+
+
+def append_transactions(root, user_ids, columns, keep=2, merchants=None, locked=False):
+    """
+    Publish a new version of a store root with extra transactions merged in and
+    return its name. `user_ids` holds each new row's user and `columns` the rows'
+    day (days since the epoch), merchant, category and amount_cents values.
+    `merchants` replaces meta["merchants"] when the rows use merchants the live
+    version does not list yet; it must keep the existing entries in order.
+    Takes store_lock(root) unless the caller already holds it (`locked`).
+    """
+    with nullcontext() if locked else store_lock(root):
+        return _append(root, user_ids, columns, keep, merchants)
+
+
+def _append(root, user_ids, columns, keep, merchants):
+    live = current_version(root)
+    if live is None:
+        raise ValueError(f"{root} is not a columnar store root")
+    base = Dataset(os.path.join(root, live), int(VERSION_PATTERN.match(live).group(1)))
+    user_ids = np.asarray(user_ids)
+    rows = np.searchsorted(base.user_ids, user_ids)
+    known = (rows < len(base)) & (base.user_ids[np.minimum(rows, len(base) - 1)] == user_ids)
+    if not known.all():
+        raise KeyError(f"Unknown user: {user_ids[~known][0]}")
+
+    if merchants and merchants[:len(base.merchants)] != base.meta["merchants"]:
+        raise ValueError("merchants must extend the live merchant list")
+    new_columns = {name: np.asarray(columns[name], dtype=base.columns[name].dtype) for name in TRANSACTION_COLUMNS}
+    new_keys = _sort_keys(rows, new_columns["day"])
+    order = np.argsort(new_keys, kind="stable")
+    new_keys = new_keys[order]
+    new_columns = {name: data[order] for name, data in new_columns.items()}
+
+    old_total = int(base.offsets[-1])
+    total = old_total + len(new_keys)
+    added = np.bincount(rows, minlength=len(base))
+    offsets = base.offsets + np.concatenate([[0], np.cumsum(added)])
+
+    version = new_version(root)
+    path = os.path.join(root, version)
+    os.makedirs(os.path.join(path, "transactions"))
+    np.save(os.path.join(path, "transactions", "offsets.npy"), offsets)
+    # Only the users given rows get a new data version
+    old_versions = base.user_versions if base.user_versions is not None else np.full(len(base), base.version)
+    number = int(VERSION_PATTERN.match(version).group(1))
+    np.save(os.path.join(path, "user_versions.npy"), np.where(added > 0, number, old_versions).astype(np.int64))
+    out = {
+        name: np.lib.format.open_memmap(
+            os.path.join(path, "transactions", f"{name}.npy"), mode="w+",
+            dtype=base.columns[name].dtype, shape=(total,)
+        )
+        for name in TRANSACTION_COLUMNS
+    }
+
+    # Both row sets are already in key order, so each new row goes in front of
+    # the first old row whose key is not smaller, and the old rows are copied
+    # through in sequential chunks with the new rows inserted
+    positions = np.zeros(len(new_keys), dtype=np.int64)
+    for start in range(0, old_total, APPEND_CHUNK_ROWS):
+        end = min(start + APPEND_CHUNK_ROWS, old_total)
+        positions += np.searchsorted(_chunk_keys(base, start, end), new_keys, side="left")
+    for start in range(0, max(old_total, 1), APPEND_CHUNK_ROWS):
+        end = min(start + APPEND_CHUNK_ROWS, old_total)
+        # The last chunk also takes the rows that go after every old row
+        first, last = np.searchsorted(positions, [start, end + (end == old_total)])
+        for name in TRANSACTION_COLUMNS:
+            out[name][start + first:end + last] = np.insert(
+                base.columns[name][start:end], positions[first:last] - start, new_columns[name][first:last]
+            )
+    for name in TRANSACTION_COLUMNS:
+        out[name].flush()
+    del out
+
+    for name in UNCHANGED_FILES:
+        _link_or_copy(os.path.join(base.path, name), os.path.join(path, name))
+    meta = dict(base.meta, transactions=total, merchants=merchants or base.meta["merchants"])
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    publish(root, version, keep)
+    return version
@@ -10,8 +10,14 @@ class Config:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GOOGLE_GENAI_USE_VERTEXAI = os.getenv("GOOGLE_GENAI_USE_VERTEXAI", "FALSE")
     
+    # Local stub model (no API key needed) for testing timeouts, hedging and load
+    USE_STUB_MODEL = os.getenv("USE_STUB_MODEL", "FALSE") == "TRUE"
+    STUB_MODEL_LATENCY = float(os.getenv("STUB_MODEL_LATENCY", "0.2"))
+    STUB_MODEL_JITTER = float(os.getenv("STUB_MODEL_JITTER", "0.1"))
+    STUB_MODEL_FAILURE_RATE = float(os.getenv("STUB_MODEL_FAILURE_RATE", "0"))
+    
     # Validate API key
-    if not GOOGLE_API_KEY and GOOGLE_GENAI_USE_VERTEXAI != "TRUE":
+    if not GOOGLE_API_KEY and GOOGLE_GENAI_USE_VERTEXAI != "TRUE" and not USE_STUB_MODEL:
         raise ValueError(
             "GOOGLE_API_KEY environment variable not set. "
             "Please add it to your .env file."
@@ -36,6 +42,206 @@ class Config:
     # Gemini Model - using a model that's available for your API key
     MODEL_NAME = "gemini-2.0-flash-exp"
     
+    # Model Tiers (model_tiers.py)
+    # Routing and simple questions go to the fast tier, multi-step analysis to
+    # the strong one. MODEL_AGENT_TIERS fixes an agent's tier, or "auto" picks
+    # per query: strong once the local complexity estimate reaches
+    # MODEL_COMPLEXITY_THRESHOLD. With tiering off every call uses MODEL_NAME.
+    MODEL_TIERING_ENABLED = os.getenv("MODEL_TIERING_ENABLED", "TRUE") == "TRUE"
+    MODEL_TIERS = {
+        "fast": os.getenv("MODEL_FAST", "gemini-2.0-flash-lite"),
+        "strong": os.getenv("MODEL_STRONG", MODEL_NAME)
+    }
+    MODEL_AGENT_TIERS = {
+        "chat_orchestrator": "fast",
+        "spending_specialist": "auto",
+        "goals_specialist": "auto",
+        "portfolio_specialist": "auto",
+        "perks_specialist": "auto",
+        "advisors_specialist": "fast",
+        "insight_pipeline": "strong",
+    }
+    MODEL_COMPLEXITY_THRESHOLD = float(os.getenv("MODEL_COMPLEXITY_THRESHOLD", "0.3"))
+    
+    # LLM Concurrency Limits
+    # Model calls beyond the concurrency limit wait in a bounded queue; once the
+    # queue is full callers get HTTP 429 with a Retry-After header.
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    LLM_AGENT_MAX_CONCURRENCY = {
+        "chat_orchestrator": 8,
+        "spending_specialist": 4,
+        "goals_specialist": 4,
+        "portfolio_specialist": 4,
+        "perks_specialist": 4,
+        "advisors_specialist": 4,
+    }
+    LLM_AGENT_MAX_QUEUE = 16
+    LLM_PROVIDER_RETRY_AFTER = 5
+    
+    # LLM Deadlines (seconds) per call type
+    LLM_ROUTING_TIMEOUT = float(os.getenv("LLM_ROUTING_TIMEOUT", "10"))
+    LLM_SPECIALIST_TIMEOUT = float(os.getenv("LLM_SPECIALIST_TIMEOUT", "45"))
+    
+    # Hedged requests: fire a duplicate call once the first has run longer than
+    # the recent p95 latency (never sooner than LLM_HEDGE_MIN_DELAY)
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "FALSE") == "TRUE"
+    LLM_HEDGE_PERCENTILE = 0.95
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    LLM_HEDGE_MIN_SAMPLES = 20
+    
+    # Degraded mode (degraded_mode.py): when a specialist's model call misses
+    # this deadline (seconds) or the breaker is open, answer with the gathered
+    # data alone, marked as data-only, instead of an error
+    DEGRADED_MODE_ENABLED = os.getenv("DEGRADED_MODE_ENABLED", "TRUE") == "TRUE"
+    DEGRADED_MODE_DEADLINE = float(os.getenv("DEGRADED_MODE_DEADLINE", "12"))
+    DEGRADED_MODE_MAX_ITEMS = 10
+    DEGRADED_MODE_MAX_DEPTH = 3
+    
+    # Circuit breaker for the model endpoint
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", "30"))
+    
+    # Multi-intent fan-out: most specialists per query, and how long past the
+    # specialist model deadline the orchestrator waits for each before replying
+    # without it (seconds)
+    ORCHESTRATOR_MAX_AGENTS = 3
+    ORCHESTRATOR_AGENT_MARGIN = float(os.getenv("ORCHESTRATOR_AGENT_MARGIN", "2"))
+    
+    # Session Memory
+    # Each session keeps its last few exchanges verbatim plus a capped rolling
+    # summary of older ones; set SESSION_STORE_PATH to persist them in SQLite,
+    # written in one batch every SESSION_FLUSH_INTERVAL seconds
+    SESSION_RECENT_TURNS = 6
+    SESSION_TURN_MAX_CHARS = 600
+    SESSION_SUMMARY_MAX_CHARS = 1500
+    SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "")
+    SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1"))
+    
+    # Near-duplicate answer cache in front of the specialists (MinHash/LSH).
+    # 64 permutations in 16 bands of 4 surface candidates from ~0.5 Jaccard;
+    # the threshold then decides on the exact shingle-set similarity.
+    SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "TRUE") == "TRUE"
+    SIMILARITY_CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.6"))
+    SIMILARITY_CACHE_NUM_PERM = 64
+    SIMILARITY_CACHE_BANDS = 16
+    SIMILARITY_CACHE_MAX_ENTRIES = 50000
+    SIMILARITY_CACHE_TTL = float(os.getenv("SIMILARITY_CACHE_TTL", "900"))
+    
+    # Batch /run_batch endpoint: by default a batch uses half the global LLM
+    # concurrency so interactive traffic keeps the rest
+    BATCH_MAX_ITEMS = 10000
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+    BATCH_MAX_RETRIES = 2
+    
+    # Offline insight-report pipeline (insight_pipeline.py)
+    INSIGHT_PIPELINE_WORKERS = os.cpu_count() or 1
+    INSIGHT_PIPELINE_CONCURRENCY = LLM_MAX_CONCURRENCY
+    INSIGHT_PIPELINE_MAX_RETRIES = 5
+    INSIGHT_PIPELINE_REPORT_EVERY = 100
+    # Users whose contexts one worker task builds, so their perks are scored in one batch
+    INSIGHT_PIPELINE_CHUNK_SIZE = 16
+    
+    # Template answers for purely factual queries (fast_path.py), skipping both
+    # model calls; FAST_PATH_INTENTS picks which intents are answered this way
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "TRUE") == "TRUE"
+    FAST_PATH_INTENTS = os.getenv("FAST_PATH_INTENTS", "net_worth,list_goals,recent_transactions").split(",")
+    FAST_PATH_TRANSACTION_LIMIT = 10
+    
+    # Extra monthly payments (dollars) the debt payoff simulator compares, and
+    # for what-if questions the sweep of extra payments (0 to max, in steps)
+    # simulated for every payoff order
+    DEBT_EXTRA_PAYMENT_SCENARIOS = [50, 100, 250, 500]
+    DEBT_SWEEP_MAX = 2000
+    DEBT_SWEEP_STEP = 25
+    
+    # Monte Carlo goal projections (goal_projection.py)
+    GOAL_MC_PATHS = int(os.getenv("GOAL_MC_PATHS", "20000"))
+    GOAL_MC_CHUNK_CELLS = 250000
+    GOAL_MC_TIME_BUDGET_MS = float(os.getenv("GOAL_MC_TIME_BUDGET_MS", "150"))
+    GOAL_MC_ANNUAL_RETURN = 0.04
+    GOAL_MC_ANNUAL_VOLATILITY = 0.06
+    GOAL_MC_SEED = 42
+    GOAL_MC_WORKERS = 2
+    GOAL_MC_POOL_TIMEOUT = 10
+    
+    # Portfolio analytics (portfolio_analytics.py): target weights for rebalancing
+    # drift and the trailing window (trading days) for rolling correlations
+    PORTFOLIO_TARGET_ALLOCATION = {"Stocks": 0.55, "Bonds": 0.27, "Real Estate": 0.11, "Cash": 0.07}
+    PORTFOLIO_ROLLING_WINDOW = 63
+    
+    # Perk recommendations (perk_engine.py): spend window used to estimate monthly
+    # spend, perks recommended per user, perks with no matching spend named in
+    # the prompt (the rest are only counted), and users scored per batch matrix product
+    PERK_SPEND_WINDOW_DAYS = 90
+    PERK_RECOMMENDATION_LIMIT = 5
+    PERK_NO_SPEND_EXAMPLES = 3
+    PERK_BATCH_CHUNK_SIZE = 1000
+    
+    # Advisors returned by advisor search and recommendations
+    ADVISOR_SEARCH_LIMIT = 3
+    
+    # Advisor appointments (advisor_scheduling.py): length of a bookable slot
+    # and how many upcoming slots to offer; set ADVISOR_BOOKINGS_PATH to keep
+    # bookings in SQLite, shared across processes and restarts
+    ADVISOR_SLOT_MINUTES = 60
+    ADVISOR_APPOINTMENT_OPTIONS = 3
+    ADVISOR_BOOKINGS_PATH = os.getenv("ADVISOR_BOOKINGS_PATH", "")
+    
+    # On-disk bank data (columnar_store.py): a store root or dataset directory
+    # whose users are served alongside the demo user, memory-mapped and shared
+    # by every process, and how often (seconds) to check for a new version
+    BANK_DATA_PATH = os.getenv("BANK_DATA_PATH", "")
+    BANK_DATA_REFRESH_INTERVAL = float(os.getenv("BANK_DATA_REFRESH_INTERVAL", "5"))
+    
+    # Model-free /data endpoints (data_api.py): rendered bodies kept per
+    # (resource, user, data version, day)
+    DATA_API_CACHE_SIZE = 4096
+    
+    # Transaction ingestion (ingest.py, POST /ingest): input text parsed and
+    # validated per batch, accepted rows buffered before they are merged into
+    # users' histories (each on-disk merge publishes a store version), and how
+    # many rejected rows the report lists individually
+    INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_BYTES", str(1 << 20)))
+    INGEST_WRITE_BATCH_ROWS = int(os.getenv("INGEST_WRITE_BATCH_ROWS", "1000000"))
+    INGEST_MAX_ERRORS = 20
+    
+    # Merchant classifier (merchant_classifier.py): raw descriptors whose
+    # (merchant, category) result is kept in its LRU, and how many leading
+    # characters of a descriptor are matched and named (real ones are well
+    # under this; longer ones are corrupt or hostile)
+    MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT_CACHE_SIZE", "200000"))
+    MERCHANT_MAX_DESCRIPTOR_CHARS = int(os.getenv("MERCHANT_MAX_DESCRIPTOR_CHARS", "64"))
+    
+    # Recurring charges (recurring_charges.py): how far back a user's history is
+    # read when their summary is rebuilt, and how many users' summaries are kept
+    RECURRING_HISTORY_DAYS = int(os.getenv("RECURRING_HISTORY_DAYS", "3650"))
+    RECURRING_TRACKER_USERS = int(os.getenv("RECURRING_TRACKER_USERS", "10000"))
+    
+    # Spending anomalies (spending_anomalies.py): weight of each new value in the
+    # moving statistics, values a merchant or category needs before it is judged,
+    # score (standard deviations) and dollars above typical that make a charge or
+    # week unusual, and how much of each user's findings is kept and shown
+    ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.1"))
+    ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "5"))
+    ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.5"))
+    ANOMALY_MIN_AMOUNT = float(os.getenv("ANOMALY_MIN_AMOUNT", "20"))
+    ANOMALY_LOOKBACK_DAYS = int(os.getenv("ANOMALY_LOOKBACK_DAYS", "30"))
+    ANOMALY_MAX_PER_USER = int(os.getenv("ANOMALY_MAX_PER_USER", "100"))
+    ANOMALY_TRACKER_USERS = int(os.getenv("ANOMALY_TRACKER_USERS", "10000"))
+    
+    # Budget rules (budget_rules.py): share of a limit that raises a warning,
+    # rules per user, alerts kept per user and how many days of them are shown;
+    # set BUDGET_RULES_PATH to persist rules in SQLite
+    BUDGET_WARN_SHARE = float(os.getenv("BUDGET_WARN_SHARE", "0.8"))
+    BUDGET_MAX_RULES_PER_USER = int(os.getenv("BUDGET_MAX_RULES_PER_USER", "50"))
+    BUDGET_MAX_ALERTS = 50
+    BUDGET_ALERT_DAYS = int(os.getenv("BUDGET_ALERT_DAYS", "31"))
+    BUDGET_RULES_PATH = os.getenv("BUDGET_RULES_PATH", "")
+    
     # CORS Configuration
     CORS_ORIGINS = ["*"]
     
@@ -0,0 +1,81 @@
+"""
+Read-only REST endpoints over the agents' data tools, with no model calls.
+
+Each endpoint serves the exact JSON an agent tool computes for a user:
+    GET /data/{user_id}/net_worth
+    GET /data/{user_id}/spending_summary
+    GET /data/{user_id}/goal_progress
+    GET /data/{user_id}/active_perks
+    GET /data/{user_id}/summary          all four in one object
+The ETag is derived from the user's data version and today's date (spending
+and goal figures are relative to today). A client that sends it back in
+If-None-Match gets 304 Not Modified until either changes. Rendered bodies are
+cached under the same key, so a poll costs a version lookup and at most one
+dictionary hit.
+"""
+import hashlib
+import json
+from datetime import date
+from functools import lru_cache
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from bank_wrapper import bank_data
+from config import Config
+from goals_agent import get_goal_progress
+from perks_agent import get_active_perks
+from portfolio_agent import get_net_worth
+from spending_agent import get_spending_summary
+
+DATA_TOOLS = {
+    "net_worth": get_net_worth,
+    "spending_summary": get_spending_summary,
+    "goal_progress": get_goal_progress,
+    "active_perks": get_active_perks
+}
+
+router = APIRouter(prefix="/data")
+
+
+@lru_cache(maxsize=Config.DATA_API_CACHE_SIZE)
+def _render(resource, user_id, data_version, today):
+    """JSON body of a resource; the version and date only key the cache"""
+    if resource == "summary":
+        return json.dumps({name: json.loads(tool(user_id=user_id)) for name, tool in DATA_TOOLS.items()}).encode()
+    return DATA_TOOLS[resource](user_id=user_id).encode()
+
+
+def etag_for(resource, user_id, data_version, today):
+    """Strong ETag of a resource for one data version and day"""
+    key = f"{resource}\0{user_id}\0{data_version}\0{today}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def not_modified(request, etag):
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+@router.get("/{user_id}/{resource}")
+async def get_data(user_id: str, resource: str, request: Request):
+    """One data resource of a user, with ETag and 304 support"""
+    if resource != "summary" and resource not in DATA_TOOLS:
+        raise HTTPException(status_code=404, detail=f"Unknown resource: {resource}")
+    try:
+        data_version = bank_data.get_data_version(user_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user_id}")
+
+    today = date.today().isoformat()
+    etag = etag_for(resource, user_id, data_version, today)
+    # no-cache lets clients keep the body but revalidate it on every use
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = await run_in_threadpool(_render, resource, user_id, data_version, today)
+    return Response(body, media_type="application/json", headers=headers)
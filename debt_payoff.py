@@ -0,0 +1,134 @@
+"""
+Month-by-month debt payoff simulation, vectorized with NumPy.
+
+Every (payoff order, extra payment) scenario is one row of a balance matrix,
+so hundreds of scenarios advance together one month at a time. Each month
+interest accrues, every open debt gets its minimum payment, and the rest of
+the scenario's fixed monthly budget (sum of minimums + extra payment) goes to
+the open debts in that row's priority order. Minimums freed by paid-off debts
+therefore roll over to the next debt in line, as in the classic avalanche and
+snowball methods.
+"""
+from datetime import datetime
+
+import numpy as np
+
+MAX_MONTHS = 600
+
+
+def payoff_orders(debts, custom_order=None):
+    """Priority orders (indices into debts) for avalanche, snowball and an optional custom order"""
+    orders = {
+        "avalanche": sorted(range(len(debts)), key=lambda i: debts[i]["interest_rate"], reverse=True),
+        "snowball": sorted(range(len(debts)), key=lambda i: debts[i]["balance"])
+    }
+    if custom_order:
+        types = [d["type"].lower() for d in debts]
+        order = [types.index(name.lower()) for name in custom_order if name.lower() in types]
+        # Debts not named keep their avalanche position after the named ones
+        order += [i for i in orders["avalanche"] if i not in order]
+        orders["custom"] = order
+    return orders
+
+
+def simulate_payoff(debts, orders, extra_payments, max_months=MAX_MONTHS):
+    """
+    Simulate every combination of payoff order and extra monthly payment.
+
+    Returns arrays shaped (orders, scenarios): months to become debt-free
+    (-1 if the budget never pays the debts off), total interest, total paid,
+    plus payoff_months shaped (orders, scenarios, debts).
+    """
+    balances = np.array([d["balance"] for d in debts], dtype=float)
+    monthly_rates = np.array([d["interest_rate"] for d in debts], dtype=float) / 100 / 12
+    minimums = np.array([d["minimum_payment"] for d in debts], dtype=float)
+    orders = np.asarray(orders, dtype=int)
+    extra_payments = np.asarray(extra_payments, dtype=float)
+
+    num_orders, num_debts = orders.shape
+    num_scenarios = len(extra_payments)
+    rows = num_orders * num_scenarios
+
+    # Row r simulates order r // num_scenarios with extra payment r % num_scenarios
+    balance = np.tile(balances, (rows, 1))
+    priority = np.repeat(orders, num_scenarios, axis=0)
+    budget = minimums.sum() + np.tile(extra_payments, num_orders)
+    row_index = np.arange(rows)
+
+    total_interest = np.zeros(rows)
+    total_paid = np.zeros(rows)
+    payoff_months = np.full((rows, num_debts), -1)
+    payoff_months[:, balances <= 0] = 0
+
+    for month in range(1, max_months + 1):
+        open_debts = balance > 0.005
+        if not open_debts.any():
+            break
+
+        interest = balance * monthly_rates
+        balance += interest
+        total_interest += interest.sum(axis=1)
+
+        minimum_due = np.where(open_debts, np.minimum(balance, minimums), 0.0)
+        balance -= minimum_due
+        remaining = np.maximum(budget - minimum_due.sum(axis=1), 0.0)
+
+        # Extra money goes down each row's priority list
+        for position in range(num_debts):
+            debt = priority[:, position]
+            payment = np.minimum(remaining, balance[row_index, debt])
+            balance[row_index, debt] -= payment
+            remaining -= payment
+
+        total_paid += budget - remaining
+        just_paid_off = open_debts & (balance <= 0.005)
+        payoff_months[just_paid_off] = month
+
+    months = np.where((payoff_months >= 0).all(axis=1), payoff_months.max(axis=1), -1)
+    return {
+        "months": months.reshape(num_orders, num_scenarios),
+        "total_interest": total_interest.reshape(num_orders, num_scenarios),
+        "total_paid": total_paid.reshape(num_orders, num_scenarios),
+        "payoff_months": payoff_months.reshape(num_orders, num_scenarios, num_debts)
+    }
+
+
+def _month_label(months_from_now, today=None):
+    """YYYY-MM label for a number of months from today"""
+    today = today or datetime.now()
+    month_index = today.year * 12 + today.month - 1 + months_from_now
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+
+def compare_strategies(debts, extra_payments=(0, 50, 100, 250, 500), custom_order=None):
+    """Payoff dates, total interest and extra-payment savings for each strategy"""
+    if not debts:
+        return {"message": "No debts to pay off"}
+
+    orders = payoff_orders(debts, custom_order)
+    names = list(orders)
+    extra_payments = sorted(set([0] + list(extra_payments)))
+    result = simulate_payoff(debts, [orders[n] for n in names], extra_payments)
+
+    strategies = {}
+    for o, name in enumerate(names):
+        baseline_interest = result["total_interest"][o, 0]
+        scenarios = []
+        for s, extra in enumerate(extra_payments):
+            months = int(result["months"][o, s])
+            scenarios.append({
+                "extra_monthly_payment": extra,
+                "months_to_debt_free": months if months >= 0 else None,
+                "debt_free_date": _month_label(months) if months >= 0 else None,
+                "total_interest": round(float(result["total_interest"][o, s]), 2),
+                "interest_saved_vs_no_extra": round(float(baseline_interest - result["total_interest"][o, s]), 2)
+            })
+        strategies[name] = {
+            "order": [debts[i]["type"] for i in orders[name]],
+            "payoff_dates_without_extra": {
+                debts[i]["type"]: _month_label(int(m)) if m >= 0 else None
+                for i, m in enumerate(result["payoff_months"][o, 0])
+            },
+            "scenarios": scenarios
+        }
+    return strategies
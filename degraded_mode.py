@@ -0,0 +1,134 @@
+"""
+Data-only answers for when the model cannot answer in time.
+
+Specialists gather all their tool outputs before calling the model. When that
+call misses the degraded-mode deadline (ModelTimeout) or the circuit breaker
+is open (CircuitOpen), generate_or_degrade lays the same outputs out as a
+plain structured answer, clearly marked as data-only, instead of returning an
+error or a 503. A query that has already changed state (booked an appointment,
+created a budget rule) is answered this way even when it is refused admission,
+since a 429 would invite a retry that repeats the change. During a provider incident a chat then takes at most about
+the deadline, and still shows the user their numbers. Degraded answers are
+never cached, so normal answers come back as soon as the model does.
+"""
+import json
+import threading
+from collections import defaultdict
+
+from config import Config
+from llm_gateway import AdmissionRejected, CircuitOpen, ModelTimeout, generate_content
+
+REASONS = {
+    "timeout": "the assistant model did not respond in time",
+    "unavailable": "the assistant model is temporarily unavailable",
+    "overloaded": "the assistant model is busy"
+}
+
+_lock = threading.Lock()
+_degraded = defaultdict(lambda: defaultdict(int))
+
+
+def _label(key):
+    return str(key).replace("_", " ").capitalize()
+
+
+def _scalar(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}" if abs(value) >= 1000 else f"{value:g}"
+    return str(value)
+
+
+def _is_scalar(value):
+    return not isinstance(value, (dict, list))
+
+
+def render_value(value, indent="", depth=0):
+    """Lines of a JSON value as a bulleted outline, capped in depth and list length"""
+    lines = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, list) and all(_is_scalar(i) for i in item):
+                lines.append(f"{indent}- {_label(key)}: {', '.join(_scalar(i) for i in item) or 'none'}")
+            elif not _is_scalar(item):
+                if depth + 1 < Config.DEGRADED_MODE_MAX_DEPTH and item:
+                    lines.append(f"{indent}- {_label(key)}:")
+                    lines.extend(render_value(item, indent + "  ", depth + 1))
+            else:
+                lines.append(f"{indent}- {_label(key)}: {_scalar(item)}")
+    elif isinstance(value, list):
+        for item in value[:Config.DEGRADED_MODE_MAX_ITEMS]:
+            if isinstance(item, dict):
+                # One line per record, from its scalar fields
+                fields = [f"{_label(k)}: {_scalar(v)}" for k, v in item.items() if _is_scalar(v)]
+                lines.append(f"{indent}- " + ", ".join(fields))
+            else:
+                lines.append(f"{indent}- {_scalar(item)}")
+        if len(value) > Config.DEGRADED_MODE_MAX_ITEMS:
+            lines.append(f"{indent}- ...and {len(value) - Config.DEGRADED_MODE_MAX_ITEMS} more")
+    else:
+        lines.append(f"{indent}{_scalar(value)}")
+    return lines
+
+
+def data_only_answer(sections, reason):
+    """A marked answer laying out each titled tool output (JSON text) without analysis"""
+    parts = [
+        f"[Data-only answer] {REASONS[reason].capitalize()}, so here is the relevant account "
+        f"data without analysis. Please ask again in a moment for a full answer."
+    ]
+    for title, output in sections.items():
+        try:
+            value = json.loads(output)
+        except (TypeError, ValueError):
+            value = output
+        parts.append(f"**{title}:**\n" + ("\n".join(render_value(value)) or "- None"))
+    return "\n\n".join(parts)
+
+
+def specialist_deadline():
+    """Seconds a specialist's model call may take before it is given up"""
+    if Config.DEGRADED_MODE_ENABLED:
+        return min(Config.LLM_SPECIALIST_TIMEOUT, Config.DEGRADED_MODE_DEADLINE)
+    return Config.LLM_SPECIALIST_TIMEOUT
+
+
+def generate_or_degrade(model, context, agent, sections, tier=None, changed=False):
+    """
+    The model's answer to a specialist context as (text, False), or a data-only
+    answer built from `sections` as (text, True) if the model misses the
+    deadline or the breaker is open, or if the query `changed` state and the
+    call is refused admission
+    """
+    if not Config.DEGRADED_MODE_ENABLED and not changed:
+        return generate_content(model, context, agent=agent, tier=tier).text, False
+    try:
+        return generate_content(model, context, agent=agent, timeout=specialist_deadline(), tier=tier).text, False
+    except ModelTimeout:
+        if not Config.DEGRADED_MODE_ENABLED:
+            raise
+        reason = "timeout"
+    except CircuitOpen:
+        if not Config.DEGRADED_MODE_ENABLED and not changed:
+            raise
+        reason = "unavailable"
+    except AdmissionRejected:
+        if not changed:
+            raise
+        reason = "overloaded"
+    with _lock:
+        _degraded[agent][reason] += 1
+    return data_only_answer(sections, reason), True
+
+
+def get_degraded_stats():
+    """Data-only answers served per agent and reason, for the /metrics endpoint"""
+    with _lock:
+        by_agent = {agent: dict(reasons) for agent, reasons in _degraded.items()}
+    return {
+        "degraded_mode": {
+            "enabled": Config.DEGRADED_MODE_ENABLED,
+            "deadline_s": specialist_deadline(),
+            "answers": sum(sum(r.values()) for r in by_agent.values()),
+            "by_agent": by_agent
+        }
+    }
@@ -0,0 +1,143 @@
+"""
+Template answers for purely factual queries, with no model calls.
+
+"What is my net worth", "list my goals" and "show my recent transactions"
+are fully answered by existing data tools, so routing them through the
+model twice only adds latency and cost. Each intent is a pattern that must
+match the whole normalized query: filler such as "please" or "can you" is
+stripped first, and anything asking for judgement ("should I", "can I
+afford", "why") never matches, so such queries still go to the specialists.
+A matched query is answered by filling a template from the tool's JSON.
+"""
+import json
+import re
+import threading
+import time
+
+from config import Config
+from goals_agent import get_all_goals
+from portfolio_agent import get_net_worth
+from spending_agent import get_recent_transactions
+
+FILLER = re.compile(r"^(?:(?:please|hey|hi|ok|okay|so)\b,?\s*|(?:can|could|would|will) you\s+(?:please\s+)?)+")
+TRAILING_FILLER = re.compile(r",?\s*\b(?:please|thanks|thank you)$")
+ASK = r"(?:(?:what(?:'s| is| are)|show(?: me)?|list|tell me|give me|get|display)\s+)?"
+MY = r"(?:(?:all\s+)?(?:of\s+)?my\s+)?"
+
+INTENT_PATTERNS = {
+    "net_worth": re.compile(
+        rf"^{ASK}{MY}(?:current\s+|total\s+)?net\s*worth(?:\s+(?:right now|today|now))?$|^how much am i worth$"
+    ),
+    "list_goals": re.compile(
+        rf"^{ASK}{MY}(?:(?:current|active|savings|saving|financial)\s+)*goals$"
+    ),
+    "recent_transactions": re.compile(
+        rf"^{ASK}{MY}(?:(?P<count>\d+)\s+)?(?:most\s+)?(?:recent|latest|last)\s+"
+        rf"(?:(?P<count_after>\d+)\s+)?(?:transactions|purchases)$"
+    )
+}
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace, drop punctuation at the end and filler at either end"""
+    text = " ".join(query.lower().replace("’", "'").split()).rstrip("?!. ")
+    text = TRAILING_FILLER.sub("", text).rstrip("?!., ")
+    return FILLER.sub("", text).strip()
+
+
+def money(amount):
+    return f"${amount:,.2f}"
+
+
+def net_worth_answer(match, user_id):
+    data = json.loads(get_net_worth(user_id))
+    return (
+        f"Your net worth is {money(data['net_worth'])}: {money(data['total_assets'])} in assets "
+        f"minus {money(data['total_liabilities'])} in liabilities."
+    )
+
+
+def goals_answer(match, user_id):
+    goals = json.loads(get_all_goals(user_id))
+    if not goals:
+        return "You don't have any financial goals set up yet."
+    lines = [f"You have {len(goals)} goal{'s' if len(goals) != 1 else ''}:"]
+    for goal in goals:
+        progress = goal["current_amount"] / goal["target_amount"] * 100 if goal["target_amount"] else 0
+        lines.append(
+            f"- {goal['name']}: {money(goal['current_amount'])} of {money(goal['target_amount'])} "
+            f"({progress:.1f}%), target date {goal['target_date']}"
+        )
+    return "\n".join(lines)
+
+
+def transactions_answer(match, user_id):
+    limit = int(match.group("count") or match.group("count_after") or Config.FAST_PATH_TRANSACTION_LIMIT)
+    transactions = json.loads(get_recent_transactions(limit, user_id))
+    if not transactions:
+        return "You have no transactions in the last 30 days."
+    lines = [f"Your {len(transactions)} most recent transaction{'s' if len(transactions) != 1 else ''}:"]
+    for txn in transactions:
+        lines.append(f"- {txn['date']}  {txn['merchant']} ({txn['category']})  {money(txn['amount'])}")
+    return "\n".join(lines)
+
+
+TEMPLATES = {
+    "net_worth": net_worth_answer,
+    "list_goals": goals_answer,
+    "recent_transactions": transactions_answer
+}
+
+
+class FastPath:
+    """Matches factual intents and answers them from templates, counting hits"""
+
+    def __init__(self, intents, enabled=True):
+        self.enabled = enabled
+        self.intents = [i for i in intents if i in INTENT_PATTERNS]
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.hits = 0
+        self.intent_hits = {i: 0 for i in self.intents}
+        self.answer_time = 0.0
+
+    def match(self, query):
+        """(intent, match) of the first enabled intent the whole query matches, or None"""
+        text = normalize_query(query)
+        for intent in self.intents:
+            match = INTENT_PATTERNS[intent].match(text)
+            if match:
+                return intent, match
+        return None
+
+    def answer(self, query, user_id=None):
+        """A template answer to a factual query, or None to fall through to the model"""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        matched = self.match(query)
+        answer = TEMPLATES[matched[0]](matched[1], user_id) if matched else None
+        with self._lock:
+            self.queries += 1
+            if matched:
+                self.hits += 1
+                self.intent_hits[matched[0]] += 1
+                self.answer_time += time.perf_counter() - start
+        return answer
+
+    def stats(self):
+        """Hit rate, hits per intent and template answer latency"""
+        with self._lock:
+            return {
+                "fast_path": {
+                    "enabled": self.enabled,
+                    "queries": self.queries,
+                    "hits": self.hits,
+                    "hit_rate": round(self.hits / self.queries, 3) if self.queries else 0,
+                    "hits_by_intent": dict(self.intent_hits),
+                    "avg_answer_ms": round(1000 * self.answer_time / self.hits, 3) if self.hits else 0
+                }
+            }
+
+
+fast_path = FastPath(Config.FAST_PATH_INTENTS, enabled=Config.FAST_PATH_ENABLED)
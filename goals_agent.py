@@ -1,20 +1,27 @@
 import google.generativeai as genai
 from config import Config
+from degraded_mode import generate_or_degrade
+from llm_gateway import AdmissionRejected
+from model_tiers import TieredModel
+from similarity_cache import answer_cache
 from bank_wrapper import bank_data
+from goal_projection import run_projection
+from spending_agent import get_budget_status
+from budget_rules import budget_engine
 import json
 from datetime import datetime
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
 
-def get_all_goals():
+def get_all_goals(user_id=None):
     """Get all financial goals"""
-    goals = bank_data.get_goals()
+    goals = bank_data.get_goals(user_id)
     return json.dumps(goals, indent=2)
 
-def get_goal_progress(goal_name=None):
+def get_goal_progress(goal_name=None, user_id=None):
     """Get progress towards financial goals"""
-    goals = bank_data.get_goals()
+    goals = bank_data.get_goals(user_id)
     
     if goal_name:
         goal = next((g for g in goals if goal_name.lower() in g["name"].lower()), None)
@@ -46,6 +53,12 @@ def get_goal_progress(goal_name=None):
     
     return json.dumps(progress_data, indent=2)
 
+def get_goal_projections(user_id=None):
+    """Project each goal with Monte Carlo simulation of returns and contributions"""
+    goals = bank_data.get_goals(user_id)
+    projections = run_projection(goals)
+    return json.dumps(projections, indent=2)
+
 def calculate_savings_plan(target_amount, months):
     """Calculate monthly savings needed for a goal"""
     monthly_amount = target_amount / months
@@ -54,7 +67,7 @@ def calculate_savings_plan(target_amount, months):
         "target_amount": target_amount,
         "time_period_months": months,
         "monthly_savings_needed": round(monthly_amount, 2),
-        "weekly_savings_needed": round(monthly_amount / 4, 2),
+        "weekly_savings_needed": round(monthly_amount * 12 / 52, 2),
         "total_to_save": target_amount
     }
     return json.dumps(plan, indent=2)
@@ -79,24 +92,31 @@ class GoalsAgent:
         1. Use the data provided to get accurate goal information
         2. Break down large goals into manageable monthly amounts
         3. Celebrate progress and achievements
-        4. Offer realistic timelines based on current savings rate
+        4. Offer realistic timelines based on current savings rate, using the projected
+           probability of reaching each goal and the range of likely balances
         5. Provide specific action steps
         6. Be encouraging and supportive
         
         If asked about topics outside financial goals, politely redirect to your area of expertise.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
     
-    def process_query(self, query):
-        """Process a user query"""
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query, with the conversation so far if there is one"""
         try:
+            # Near-duplicate questions from the same user on the same data and budget rules reuse an answer
+            cache_scope = (self.name, user_id, bank_data.get_data_version(user_id), budget_engine.rules_version(user_id))
+            cached = answer_cache.lookup(cache_scope, query)
+            if cached is not None:
+                return cached
+            
             # Get all goals data
-            goals_data = get_all_goals()
-            progress_data = get_goal_progress()
+            goals_data = get_all_goals(user_id=user_id)
+            progress_data = get_goal_progress(user_id=user_id)
+            projections = get_goal_projections(user_id=user_id)
+            budgets = get_budget_status(user_id=user_id)
             
             # Create context with data
             context = f"""
@@ -110,12 +130,31 @@ All Goals:
 Progress Details:
 {progress_data}
 
+Projections (Monte Carlo, probability of reaching each target by its date):
+{projections}
+
+Budgets (spend against each limit this period, and recent alerts):
+{budgets}
+
 Please provide a helpful response based on this data. Be specific, encouraging, and actionable.
 """
             
-            response = self.model.generate_content(context)
-            return response.text
+            if history:
+                context = f"\nConversation So Far:\n{history}\n" + context
+            
+            # Simple questions go to the fast model tier, multi-step analysis to the strong one
+            tier, model = self.models.select(query, history)
+            
+            # Past the deadline or with the breaker open, answer from the data alone
+            response_text, degraded = generate_or_degrade(model, context, self.name, {"Progress": progress_data, "Projections": projections, "Budgets": budgets}, tier=tier)
+            
+            # Only answers that didn't lean on earlier turns are safe to reuse
+            if not history and not degraded:
+                answer_cache.store(cache_scope, query, response_text)
+            return response_text
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
@@ -0,0 +1,660 @@
+"""
+Streaming transaction ingestion from CSV, NDJSON and OFX feeds.
+
+Usage:
+    python ingest.py feed.csv
+    python ingest.py feed.ndjson --user user_123
+    cat statement.ofx | python ingest.py - --format ofx --user user_123
+    python ingest.py feed.csv --url http://localhost:8000
+
+Without --url the feed is written in this process, which makes on-disk users
+(a store root at BANK_DATA_PATH) durable; with --url it is streamed to a
+running server's POST /ingest, the way to add to its in-memory demo user.
+
+Feed formats:
+    csv     a header row naming date, merchant, amount and optionally user_id and category
+    ndjson  one object per line with the same keys
+    ofx     <STMTTRN> records (DTPOSTED, TRNAMT, NAME); debits become purchases, credits are skipped
+Dates are YYYY-MM-DD and amounts dollars. In CSV and NDJSON feeds positive
+amounts are purchases and negative ones refunds. Rows without a user_id go
+to the feed's default user. The merchant may be a raw card descriptor such as
+"SQ *LOCAL CAFE 1234": names of known merchants are kept, and anything else
+goes through merchant_classifier, which supplies the canonical merchant and,
+for rows without a category, the category.
+
+The feed is read in chunks. A parser keeps only the incomplete record at the
+end of what it has read, and turns each INGEST_CHUNK_BYTES of input into a
+batch of columns, so memory stays bounded however large the feed is. Each
+batch is validated with NumPy over whole columns rather than row by row;
+rejected rows are counted by reason and the first few reported. Accepted rows
+are buffered, as transaction dicts for in-memory users and as compact codes
+for on-disk ones, and written every INGEST_WRITE_BATCH_ROWS rows and at the
+end: merged into the in-memory histories, bumping those users' data
+versions, and into the store with columnar_store.append_transactions, which
+publishes a new version recording which users it changed. Every cache
+derived from user data (spending summaries, perk and holdings indexes, /data
+ETags, the answer cache) is keyed on the data version, so it picks up the new
+rows with no further work; recurring-charge summaries, anomaly statistics and
+budget counters already held for a user take in the written rows instead of
+being rebuilt.
+"""
+import argparse
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import orjson
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+import columnar_store
+from bank_wrapper import bank_data
+from budget_rules import budget_engine
+from config import Config
+from merchant_classifier import merchant_classifier
+from recurring_charges import recurring_tracker, transaction_columns
+from spending_anomalies import anomaly_detector
+from synthetic_data import CATEGORY_NAMES, MERCHANTS
+
+FIELDS = ["user_id", "date", "merchant", "category", "amount"]
+REQUIRED_FIELDS = ["date", "merchant", "amount"]
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-ofx": "ofx",
+    "application/ofx": "ofx"
+}
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".ofx": "ofx", ".qfx": "ofx"}
+
+# Rejection reasons, in the order rows are checked; code 0 is an accepted row
+REJECTIONS = [
+    None,
+    "malformed record",
+    "unknown user",
+    "invalid date",
+    "date in the future",
+    "invalid amount",
+    "missing merchant",
+    "unknown category",
+    "too many merchants"
+]
+MALFORMED, UNKNOWN_USER, INVALID_DATE, FUTURE_DATE, INVALID_AMOUNT, MISSING_MERCHANT, UNKNOWN_CATEGORY, \
+    TOO_MANY_MERCHANTS = range(1, len(REJECTIONS))
+MAX_CENTS = np.iinfo(np.int32).max
+MAX_MERCHANTS = np.iinfo(np.uint16).max + 1
+
+class Batch:
+    """Columns of consecutive records, with positions already known to be malformed or skipped"""
+
+    def __init__(self, columns, rows, problems=(), skipped=()):
+        self.columns = columns
+        self.rows = rows
+        self.problems = list(problems)
+        self.skipped = list(skipped)
+
+
+class FeedParser:
+    """
+    Incremental parser: feed() it bytes as they arrive and it returns a Batch
+    whenever it has buffered chunk_bytes of text, holding back any incomplete
+    record at the end for the next call
+    """
+
+    def __init__(self, chunk_bytes=None):
+        self.chunk_bytes = chunk_bytes or Config.INGEST_CHUNK_BYTES
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self.pending = []
+        self.pending_chars = 0
+        self.tail = ""
+
+    def feed(self, data):
+        text = self.decoder.decode(data)
+        self.pending.append(text)
+        self.pending_chars += len(text)
+        return self._take(final=False) if self.pending_chars >= self.chunk_bytes else None
+
+    def close(self):
+        """Batch of everything still buffered, or None"""
+        self.pending.append(self.decoder.decode(b"", final=True))
+        return self._take(final=True)
+
+    def _take(self, final):
+        text = self.tail + "".join(self.pending)
+        self.pending, self.pending_chars = [], 0
+        cut = len(text) if final else self.split(text)
+        self.tail = text[cut:]
+        return self.parse(text[:cut]) if text[:cut].strip() else None
+
+    def split(self, text):
+        """Length of the prefix of `text` holding only complete records"""
+        return text.rfind("\n") + 1
+
+    def parse(self, text):
+        raise NotImplementedError
+
+
+class CSVParser(FeedParser):
+    def __init__(self, chunk_bytes=None):
+        super().__init__(chunk_bytes)
+        self.header = None
+
+    def split(self, text):
+        cut = text.rfind("\n") + 1
+        # A quoted field may hold newlines; quotes are balanced only at record ends
+        while cut and text.count('"', 0, cut) % 2:
+            cut = text.rfind("\n", 0, cut - 1) + 1
+        return cut
+
+    def parse(self, text):
+        if '"' in text:
+            rows = [row for row in csv.reader(io.StringIO(text, newline="")) if row]
+            lines = None
+        else:
+            # Without quotes every field is plain text between commas
+            lines = [line for line in text.splitlines() if line]
+            rows = lines
+        if self.header is None:
+            header = rows.pop(0) if rows else []
+            self._set_header(header.split(",") if lines is not None else header)
+        width = len(self.header)
+        if lines is None:
+            problems = [i for i, row in enumerate(rows) if len(row) != width]
+            for i in problems:
+                rows[i] = [""] * width
+            columns = list(zip(*rows)) if rows else [()] * width
+        else:
+            problems = [i for i, line in enumerate(lines) if line.count(",") != width - 1]
+            for i in problems:
+                lines[i] = "," * (width - 1)
+            # One flat list of strings instead of a list per row, which the garbage collector would keep scanning
+            fields = ",".join(lines).split(",") if lines else []
+            columns = [fields[k::width] for k in range(width)]
+        return Batch({f: columns[self.header.index(f)] for f in FIELDS if f in self.header}, len(rows), problems)
+
+    def _set_header(self, names):
+        self.header = [name.strip().lower() for name in names]
+        missing = [f for f in REQUIRED_FIELDS if f not in self.header]
+        if missing:
+            raise ValueError(f"CSV header lacks {', '.join(missing)}")
+
+
+class NDJSONParser(FeedParser):
+    def parse(self, text):
+        records, problems = [], []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                problems.append(len(records))
+                record = {}
+            records.append(record)
+        fields = {f: [r.get(f) for r in records] for f in FIELDS}
+        return Batch(fields, len(records), problems)
+
+
+class OFXParser(FeedParser):
+    TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+    ELEMENT = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+    def split(self, text):
+        end = text.upper().rfind("</STMTTRN>")
+        return end + len("</STMTTRN>") if end >= 0 else 0
+
+    def parse(self, text):
+        dates, merchants, amounts, problems, skipped = [], [], [], [], []
+        for match in self.TRANSACTION.finditer(text):
+            elements = {k.upper(): v.strip() for k, v in self.ELEMENT.findall(match.group(1))}
+            posted = elements.get("DTPOSTED", "")
+            dates.append(f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}")
+            merchants.append(elements.get("NAME") or elements.get("MEMO"))
+            try:
+                # OFX amounts are signed from the account's side: debits are negative
+                amount = -float(elements.get("TRNAMT", ""))
+            except ValueError:
+                problems.append(len(amounts))
+                amount = 0.0
+            if amount < 0:
+                skipped.append(len(amounts))
+            amounts.append(amount)
+        fields = {"date": dates, "merchant": merchants, "amount": amounts}
+        return Batch(fields, len(amounts), problems, skipped)
+
+
+PARSERS = {"csv": CSVParser, "ndjson": NDJSONParser, "ofx": OFXParser}
+
+
+def _stripped(values):
+    """String values with surrounding whitespace removed, and "" for anything that is not a string"""
+    return _map_distinct(lambda v: v.strip() if isinstance(v, str) else "", values)
+
+
+def _days(values):
+    """Days since the epoch per value, with -1 where it is not a YYYY-MM-DD date"""
+    text = np.array(_stripped(values), dtype=str)
+    # NumPy also parses "2026", "2026-01" and "today", so check the shape first:
+    # ten characters, digits with dashes at 4 and 7
+    shaped = np.char.str_len(text) == 10
+    codes = text.astype("U10").view(np.uint32).reshape(len(text), 10)
+    digits = (codes >= ord("0")) & (codes <= ord("9"))
+    dashes = codes == ord("-")
+    shaped &= digits[:, [0, 1, 2, 3, 5, 6, 8, 9]].all(axis=1) & dashes[:, [4, 7]].all(axis=1)
+    text = np.where(shaped, text, "NaT")
+    try:
+        parsed = text.astype("datetime64[D]")
+    except ValueError:
+        # Some date is out of range, like 2026-02-30
+        parsed = np.array([_date_or_nat(v) for v in text], dtype="datetime64[D]")
+    days = (parsed - columnar_store.EPOCH).astype(np.int64)
+    days[np.isnat(parsed)] = -1
+    return days
+
+
+def _date_or_nat(value):
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return None
+
+
+def _amounts(values):
+    """Float per value, NaN where it is not a number"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        return np.array([_float_or_nan(v) for v in values], dtype=np.float64)
+
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _hashable(column):
+    """The column, with values that cannot be dictionary keys (JSON arrays and objects) replaced by None"""
+    try:
+        set(column)
+        return column
+    except TypeError:
+        return [None if isinstance(v, (list, dict)) else v for v in column]
+
+
+def _map_distinct(function, column):
+    """function applied to every value of a column, computed once per distinct value"""
+    column = _hashable(column)
+    results = {value: function(value) for value in set(column)}
+    return list(map(results.__getitem__, column))
+
+
+class TransactionIngester:
+    """
+    Validates and writes one feed. feed() takes raw bytes as they arrive and
+    finish() flushes what is buffered and returns the report.
+    """
+
+    def __init__(self, feed_format, bank=None, default_user=None, chunk_bytes=None, write_batch_rows=None):
+        if feed_format not in PARSERS:
+            raise ValueError(f"Unknown feed format: {feed_format}")
+        self.parser = PARSERS[feed_format](chunk_bytes)
+        self.bank = bank or bank_data
+        self.default_user = default_user or self.bank.default_user_id
+        self.write_batch_rows = write_batch_rows or Config.INGEST_WRITE_BATCH_ROWS
+        self.categories = {c.lower(): c for c in CATEGORY_NAMES}
+        # Merchant name (any case) -> (canonical name, category)
+        self.known_merchants = {m.lower(): (m, c) for m, c in MERCHANTS}
+
+        # On-disk users are writable only when the store is a root that can take new versions
+        store = self.bank.store
+        self.store_root = store.path if store and columnar_store.current_version(store.path) else None
+        if store:
+            # Merchants earlier feeds added to the store keep the category they came with
+            self.known_merchants.update((m.lower(), (m, c)) for m, c in store.refresh().meta["merchants"])
+        self.holds_store = False
+        self.dataset = None
+        self.store_merchants = None
+        self.merchant_codes = None
+        self.category_codes = None
+        self.store_rows = []
+        self.memory_rows = {}
+        self.buffered = 0
+
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.accepted = 0
+        self.skipped = 0
+        self.rejected = [0] * len(REJECTIONS)
+        self.errors = []
+        self.users = set()
+        self.published = []
+
+    def feed(self, data):
+        batch = self.parser.feed(data)
+        if batch is not None:
+            self.add(batch)
+
+    def finish(self):
+        """Flush buffered rows, release the store and return the report"""
+        try:
+            batch = self.parser.close()
+            if batch is not None:
+                self.add(batch)
+            self.flush()
+        finally:
+            self.release()
+        return self.report()
+
+    def release(self):
+        if self.holds_store:
+            self.holds_store = False
+            columnar_store.store_lock(self.store_root).release()
+
+    def _resolve_users(self, column, rows):
+        """
+        Per row: 0 for an unknown user, 1 for in-memory and 2 for on-disk, and
+        the on-disk row; then the distinct users and each row's index into them
+        """
+        if column is None:
+            user_ids, inverse = [self.default_user], np.zeros(rows, dtype=np.int64)
+        else:
+            column = _hashable(column)
+            user_ids, positions, codes = [], {}, {}
+            for value in set(column):
+                user_id = value if value is not None and value != "" else self.default_user
+                if user_id not in positions:
+                    positions[user_id] = len(user_ids)
+                    user_ids.append(user_id)
+                codes[value] = positions[user_id]
+            inverse = np.fromiter(map(codes.__getitem__, column), dtype=np.int64, count=rows)
+
+        kinds = np.array([1 if isinstance(u, str) and u in self.bank.users else 0 for u in user_ids])
+        targets = np.full(len(user_ids), -1, dtype=np.int64)
+        stored = [k for k, u in enumerate(user_ids) if not kinds[k] and isinstance(u, str)]
+        if stored and self.store_root is not None:
+            if self.dataset is None:
+                self.dataset = self.bank.store.refresh()
+            ids = self.dataset.user_ids
+            found = np.searchsorted(ids, np.array([user_ids[k] for k in stored], dtype=ids.dtype))
+            for k, index in zip(stored, found):
+                if index < len(ids) and ids[index] == user_ids[k]:
+                    kinds[k], targets[k] = 2, index
+        return kinds[inverse], targets[inverse], user_ids, inverse
+
+    def _resolve_merchants(self, merchants):
+        """Canonical merchant and its category (or None) per row, classifying descriptors that are not known names"""
+        resolved = {}
+        unknown = []
+        for merchant in set(merchants):
+            known = self.known_merchants.get(merchant.lower())
+            if known is not None or not merchant:
+                resolved[merchant] = known or (merchant, None)
+            else:
+                unknown.append(merchant)
+        resolved.update(zip(unknown, merchant_classifier.classify_many(unknown)))
+        return [resolved[m][0] for m in merchants], [resolved[m][1] for m in merchants]
+
+    def add(self, batch):
+        """Validate a batch and write its accepted rows"""
+        n = batch.rows
+        columns = batch.columns
+        reason = np.zeros(n, dtype=np.int8)
+
+        def reject(mask, code):
+            reason[(reason == 0) & mask] = code
+
+        # Skipped rows are neither written nor rejected
+        reason[batch.skipped] = -1
+        flagged = np.zeros(n, dtype=bool)
+        flagged[batch.problems] = True
+        reject(flagged, MALFORMED)
+        kinds, targets, user_ids, inverse = self._resolve_users(columns.get("user_id"), n)
+        reject(kinds == 0, UNKNOWN_USER)
+        days = _days(columns["date"])
+        reject(days < 0, INVALID_DATE)
+        reject(days > columnar_store.to_day(date.today().isoformat()), FUTURE_DATE)
+        cents = np.rint(_amounts(columns["amount"]) * 100)
+        reject(~(np.abs(cents) <= MAX_CENTS) | (cents == 0), INVALID_AMOUNT)
+        merchants = _map_distinct(lambda m: m.strip() if isinstance(m, str) else "", columns["merchant"])
+        reject(np.array([not m for m in merchants], dtype=bool), MISSING_MERCHANT)
+        # An explicit category must be a known one; a blank one comes from the merchant
+        explicit = _map_distinct(
+            lambda c: self.categories.get(c.strip().lower()) if isinstance(c, str) and c.strip() else "",
+            columns.get("category") or [None] * n
+        )
+        merchants, by_merchant = self._resolve_merchants(merchants)
+        categories = [c if c != "" else m for c, m in zip(explicit, by_merchant)]
+        reject(np.array([c is None for c in categories], dtype=bool), UNKNOWN_CATEGORY)
+
+        in_store = np.flatnonzero((reason == 0) & (kinds == 2))
+        if len(in_store):
+            self._buffer_store(in_store, targets, days, merchants, categories, cents, reason)
+        in_memory = np.flatnonzero((reason == 0) & (kinds == 1))
+        if len(in_memory):
+            self._buffer_memory(in_memory, inverse, user_ids, days, merchants, categories, cents)
+
+        counts = np.bincount(reason[reason > 0], minlength=len(REJECTIONS))
+        for code in np.flatnonzero(counts):
+            self.rejected[code] += int(counts[code])
+        for i in np.flatnonzero(reason > 0)[:max(Config.INGEST_MAX_ERRORS - len(self.errors), 0)]:
+            self.errors.append({"row": self.rows + int(i) + 1, "error": REJECTIONS[reason[i]]})
+        self.users.update(user_ids[k] for k in np.unique(inverse[reason == 0]))
+        self.skipped += int((reason == -1).sum())
+        self.accepted += int((reason == 0).sum())
+        self.rows += n
+        if self.buffered >= self.write_batch_rows:
+            self.flush()
+
+    def _buffer_memory(self, rows, inverse, user_ids, days, merchants, categories, cents):
+        """Buffer accepted rows of in-memory users as transaction dicts"""
+        dates = (columnar_store.EPOCH + days[rows]).astype(str).tolist()
+        amounts = (cents[rows] / 100).tolist()
+        owners = inverse[rows]
+        for k in np.unique(owners):
+            own = np.flatnonzero(owners == k).tolist()
+            self.memory_rows.setdefault(user_ids[k], []).extend(
+                {
+                    "date": dates[j],
+                    "merchant": merchants[rows[j]],
+                    "category": categories[rows[j]],
+                    "amount": amounts[j],
+                    "description": f"Purchase at {merchants[rows[j]]}"
+                }
+                for j in own
+            )
+        self.buffered += len(rows)
+
+    def _buffer_store(self, rows, targets, days, merchants, categories, cents, reason):
+        """Encode accepted rows of on-disk users and merge them once enough are buffered"""
+        if not self.holds_store:
+            # Appends to the store root are serialized across processes; an ingest holds
+            # the lock from its first on-disk row to its end
+            columnar_store.store_lock(self.store_root).acquire()
+            self.holds_store = True
+            # Codes must match the newest version, which another ingest may have just published
+            self.dataset = self.bank.store.refresh(force=True)
+            self.store_merchants = [list(m) for m in self.dataset.meta["merchants"]]
+            self.merchant_codes = {m[0]: i for i, m in enumerate(self.store_merchants)}
+            self.category_codes = {c: i for i, c in enumerate(self.dataset.categories)}
+
+        row_merchants = [merchants[i] for i in rows]
+        new = set(row_merchants).difference(self.merchant_codes)
+        if new:
+            # New merchants are listed with the category of their first row
+            first = {m: i for m, i in zip(reversed(row_merchants), reversed(rows.tolist())) if m in new}
+            for merchant in sorted(new, key=first.get):
+                self.merchant_codes[merchant] = len(self.store_merchants)
+                self.store_merchants.append([merchant, categories[first[merchant]]])
+        merchant_codes = np.fromiter(map(self.merchant_codes.__getitem__, row_merchants), dtype=np.int64)
+        full = merchant_codes >= MAX_MERCHANTS
+        if full.any():
+            reason[rows[full]] = TOO_MANY_MERCHANTS
+            rows, merchant_codes = rows[~full], merchant_codes[~full]
+
+        self.store_rows.append((
+            targets[rows].astype(np.int32),
+            days[rows].astype(np.int32),
+            merchant_codes.astype(np.uint16),
+            np.fromiter((self.category_codes[categories[i]] for i in rows), dtype=np.uint8, count=len(rows)),
+            cents[rows].astype(np.int32)
+        ))
+        self.buffered += len(rows)
+
+    def flush(self):
+        """Write buffered rows: merge them into in-memory histories and into a new published store version"""
+        # Recurring-charge summaries, anomaly statistics and budget counters held for a user take in just the new rows
+        observers = [o for o in (recurring_tracker, anomaly_detector, budget_engine) if o.bank is self.bank]
+        for user_id, transactions in self.memory_rows.items():
+            old_version = self.bank.get_data_version(user_id)
+            new_version = self.bank.add_transactions(transactions, user_id)
+            if any(o.tracked(user_id) for o in observers):
+                columns = transaction_columns(transactions)
+                for observer in observers:
+                    observer.observe(user_id, *columns, old_version, new_version)
+        self.memory_rows = {}
+        if self.store_rows:
+            users, day, merchant, category, amount_cents = (np.concatenate(c) for c in zip(*self.store_rows))
+            self.store_rows = []
+            old_dataset, owners = self.dataset, self.dataset.user_ids[users]
+            version = columnar_store.append_transactions(
+                self.store_root,
+                owners,
+                {"day": day, "merchant": merchant, "category": category, "amount_cents": amount_cents},
+                merchants=self.store_merchants,
+                locked=True
+            )
+            self.dataset = self.bank.store.refresh(force=True)
+            self.published.append(version)
+            for user_id in np.unique(owners).tolist() if observers else []:
+                if not any(o.tracked(user_id) for o in observers):
+                    continue
+                own = np.flatnonzero(owners == user_id)
+                index = int(users[own[0]])
+                columns = (
+                    day[own],
+                    [self.store_merchants[m][0] for m in merchant[own]],
+                    [self.dataset.categories[c] for c in category[own]],
+                    amount_cents[own] / 100
+                )
+                for observer in observers:
+                    observer.observe(user_id, *columns, old_dataset.user_version(index), self.dataset.user_version(index))
+        self.buffered = 0
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "accepted": self.accepted,
+            "skipped": self.skipped,
+            "rejected": sum(self.rejected),
+            "rejected_by_reason": {REJECTIONS[code]: count for code, count in enumerate(self.rejected) if count},
+            "errors": self.errors,
+            "users": len(self.users),
+            "store_versions": self.published,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(self.rows / elapsed) if elapsed else 0
+        }
+
+
+def ingest_stream(chunks, feed_format, bank=None, default_user=None, progress=None):
+    """Ingest an iterable of byte chunks and return the report"""
+    ingester = TransactionIngester(feed_format, bank, default_user)
+    try:
+        for data in chunks:
+            ingester.feed(data)
+            if progress:
+                progress(ingester)
+    except BaseException:
+        ingester.release()
+        raise
+    return ingester.finish()
+
+
+def format_for(content_type=None, filename=None):
+    """Feed format named by a Content-Type header or a file extension, or None"""
+    if content_type:
+        return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    if filename:
+        return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+    return None
+
+
+router = APIRouter()
+
+
+@router.post("/ingest")
+async def ingest_feed(request: Request, format: str = None, user_id: str = None):
+    """Stream a CSV, NDJSON or OFX feed in the request body into the bank data and return the report"""
+    feed_format = format or format_for(content_type=request.headers.get("content-type"))
+    if feed_format not in PARSERS:
+        raise HTTPException(status_code=415, detail="Feed format must be csv, ndjson or ofx")
+    ingester = TransactionIngester(feed_format, default_user=user_id)
+    try:
+        async for data in request.stream():
+            # Parsing and validation are CPU-bound, so they run off the event loop
+            await run_in_threadpool(ingester.feed, data)
+        return await run_in_threadpool(ingester.finish)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        ingester.release()
+
+
+def read_chunks(f, size=1 << 20):
+    while True:
+        data = f.read(size)
+        if not data:
+            return
+        yield data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a CSV, NDJSON or OFX transaction feed")
+    parser.add_argument("feed", help="Feed file, or - for stdin")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="Feed format (default: from the file extension)")
+    parser.add_argument("--user", help="User for rows without a user_id (default: the demo user)")
+    parser.add_argument("--url", help="Stream the feed to this server's /ingest instead of writing it here")
+    args = parser.parse_args()
+
+    feed_format = args.format or format_for(filename=args.feed)
+    if feed_format is None:
+        parser.error("cannot tell the feed format from the file name; pass --format")
+    f = sys.stdin.buffer if args.feed == "-" else open(args.feed, "rb")
+    last_report = [time.perf_counter()]
+
+    def progress(ingester):
+        now = time.perf_counter()
+        if now - last_report[0] >= 2:
+            last_report[0] = now
+            elapsed = now - ingester.started
+            print(f"  {ingester.rows} rows, {ingester.accepted} accepted "
+                  f"({ingester.rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+    with f:
+        if args.url:
+            import httpx
+            params = {"format": feed_format, **({"user_id": args.user} if args.user else {})}
+            response = httpx.post(f"{args.url.rstrip('/')}/ingest", params=params,
+                                  content=read_chunks(f), timeout=None)
+            response.raise_for_status()
+            report = response.json()
+        else:
+            report = ingest_stream(read_chunks(f), feed_format, default_user=args.user, progress=progress)
+    print(json.dumps(report, indent=2))
+    print(f"Ingested {report['accepted']} of {report['rows']} rows in {report['seconds']}s "
+          f"({report['rows_per_sec']:,} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Offline pipeline that pre-generates monthly financial insight reports for every user.
+
+Usage:
+    python insight_pipeline.py
+    python insight_pipeline.py --month 2026-10 --workers 4 --concurrency 8 --output insights.jsonl
+
+User IDs are streamed from the data layer, data contexts are built a chunk of
+users at a time with the agents' tool functions in a process pool (perks are
+scored for the whole chunk in one batch), and the model is called from a
+bounded thread pool through the LLM gateway. Reports are appended to
+the JSONL output as they finish. The output file doubles as the checkpoint:
+re-running with the same output skips users already written, so an
+interrupted run resumes where it stopped. Failures go to <output>.errors.jsonl
+and are retried on the next run.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+
+from config import Config
+from bank_wrapper import bank_data
+from llm_gateway import AdmissionRejected, generate_content
+from model_tiers import TieredModel
+from spending_agent import get_spending_summary, get_monthly_trends
+from goals_agent import get_goal_progress
+from portfolio_agent import get_net_worth, get_debt_summary, analyze_asset_allocation
+from perks_agent import get_active_perks, calculate_total_savings, batch_recommend_perks
+
+INSIGHT_INSTRUCTION = """
+You are a financial insights writer at Cymbal Bank. Each month you write a short,
+personalized insight report for one customer from their banking data.
+
+The report must cover, in this order:
+1. Spending - totals, top categories and notable trends
+2. Goals - progress on each goal and whether it is on track
+3. Portfolio - net worth, debt and allocation highlights
+4. Perks - perks in use and the recommended perks that would save the most
+
+Use the exact numbers from the data. Keep it under 250 words, friendly and actionable.
+"""
+
+
+def build_user_contexts(user_ids):
+    """Gather spending, goals, portfolio and perks data for a chunk of users with the agents' tool functions"""
+    start = time.perf_counter()
+    recommendations = dict(batch_recommend_perks(user_ids, chunk_size=len(user_ids)))
+    contexts = [
+        (user_id, {
+            "spending_summary": json.loads(get_spending_summary(user_id=user_id)),
+            "monthly_trends": json.loads(get_monthly_trends(user_id=user_id)),
+            "goal_progress": json.loads(get_goal_progress(user_id=user_id)),
+            "net_worth": json.loads(get_net_worth(user_id=user_id)),
+            "debt_summary": json.loads(get_debt_summary(user_id=user_id)),
+            "asset_allocation": json.loads(analyze_asset_allocation(user_id=user_id)),
+            "active_perks": json.loads(get_active_perks(user_id=user_id)),
+            "perk_savings": json.loads(calculate_total_savings(user_id=user_id)),
+            "perk_recommendations": recommendations[user_id]
+        })
+        for user_id in user_ids
+    ]
+    return contexts, time.perf_counter() - start
+
+
+def generate_insight(models, user_id, context, month):
+    """Ask the model for one user's report, backing off while the gateway is overloaded"""
+    prompt = f"""
+Report Month: {month}
+
+Customer Data:
+{json.dumps(context, indent=2)}
+
+Please write this customer's monthly insight report.
+"""
+    tier, model = models.select(prompt)
+    start = time.perf_counter()
+    for attempt in range(Config.INSIGHT_PIPELINE_MAX_RETRIES + 1):
+        try:
+            response = generate_content(model, prompt, agent="insight_pipeline", tier=tier)
+            break
+        except AdmissionRejected as e:
+            if attempt == Config.INSIGHT_PIPELINE_MAX_RETRIES:
+                raise
+            time.sleep(e.retry_after)
+
+    return {
+        "user_id": user_id,
+        "month": month,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "insight": response.text,
+        "data": context
+    }, time.perf_counter() - start
+
+
+def load_checkpoint(output_path):
+    """User IDs already written, truncating a partial last line left by a crash"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    good_offset = 0
+    with open(output_path, "rb+") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            done.add(record["user_id"])
+            good_offset += len(line)
+        f.truncate(good_offset)
+    return done
+
+
+class PipelineStats:
+    """Throughput counters for the run"""
+
+    def __init__(self, skipped):
+        self.start = time.perf_counter()
+        self.skipped = skipped
+        self.completed = 0
+        self.errors = 0
+        self.context_time = 0.0
+        self.model_time = 0.0
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        done = max(1, self.completed)
+        lines = [
+            f"{'Finished' if final else 'Progress'}: {self.completed} reports, {self.errors} errors, "
+            f"{self.skipped} skipped from checkpoint in {elapsed:.1f}s",
+            f"  throughput:      {self.completed / elapsed if elapsed else 0:.2f} users/sec",
+            f"  avg context:     {1000 * self.context_time / done:.1f} ms/user",
+            f"  avg model call:  {1000 * self.model_time / done:.1f} ms/user"
+        ]
+        print("\n".join(lines), file=sys.stderr, flush=True)
+
+
+def run_pipeline(output_path, month, workers, concurrency, limit=None):
+    """Generate reports for every user not yet in the output file"""
+    done = load_checkpoint(output_path)
+    stats = PipelineStats(skipped=len(done))
+    # Reports take the tier Config.MODEL_AGENT_TIERS sets for the pipeline (strong by default)
+    models = TieredModel("insight_pipeline", INSIGHT_INSTRUCTION)
+
+    user_ids = (user_id for user_id in bank_data.iter_user_ids() if user_id not in done)
+    submitted = 0
+
+    # Only a couple of users per model slot are in flight at once, so memory stays
+    # bounded no matter how many users there are
+    chunk_size = Config.INSIGHT_PIPELINE_CHUNK_SIZE
+    max_in_flight = max(concurrency * 2, chunk_size)
+    pending = {}
+    in_flight = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as context_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as model_pool, \
+            open(output_path, "a") as out, \
+            open(output_path + ".errors.jsonl", "a") as errors:
+
+        while True:
+            while in_flight < max_in_flight and (limit is None or submitted < limit):
+                room = min(chunk_size, max_in_flight - in_flight)
+                if limit is not None:
+                    room = min(room, limit - submitted)
+                chunk = list(islice(user_ids, room))
+                if not chunk:
+                    break
+                pending[context_pool.submit(build_user_contexts, chunk)] = ("context", chunk)
+                submitted += len(chunk)
+                in_flight += len(chunk)
+
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, users = pending.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    for user_id in (users if stage == "context" else [users]):
+                        stats.errors += 1
+                        in_flight -= 1
+                        errors.write(json.dumps({"user_id": user_id, "stage": stage, "error": str(e)}) + "\n")
+                    errors.flush()
+                    continue
+
+                if stage == "context":
+                    stats.context_time += elapsed
+                    for user_id, context in result:
+                        pending[model_pool.submit(generate_insight, models, user_id, context, month)] = ("model", user_id)
+                else:
+                    in_flight -= 1
+                    stats.model_time += elapsed
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                    stats.completed += 1
+                    if stats.completed % Config.INSIGHT_PIPELINE_REPORT_EVERY == 0:
+                        stats.report()
+
+    stats.report(final=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate monthly insight reports for all users")
+    parser.add_argument("--month", default=datetime.now().strftime("%Y-%m"), help="Report month (YYYY-MM)")
+    parser.add_argument("--output", help="JSONL output / checkpoint file (default: insights_<month>.jsonl)")
+    parser.add_argument("--workers", type=int, default=Config.INSIGHT_PIPELINE_WORKERS,
+                        help="Processes building data contexts")
+    parser.add_argument("--concurrency", type=int, default=Config.INSIGHT_PIPELINE_CONCURRENCY,
+                        help="Concurrent model calls")
+    parser.add_argument("--limit", type=int, help="Stop after this many users")
+    args = parser.parse_args()
+
+    run_pipeline(
+        args.output or f"insights_{args.month}.jsonl",
+        args.month,
+        args.workers,
+        args.concurrency,
+        args.limit
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from config import Config
+from stub_model import StubModel
+
+
+class AdmissionRejected(Exception):
+    """Raised when a model call cannot be admitted right now"""
+
+    def __init__(self, message, status_code=429, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpen(AdmissionRejected):
+    """Raised without calling the model while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__("Model endpoint is unavailable", status_code=503, retry_after=retry_after)
+
+
+class ModelTimeout(Exception):
+    """Raised when a model call misses its deadline"""
+
+
+# A deadline (time.monotonic()) set by a caller that stops waiting for this
+# thread's answer at that time, such as the orchestrator's fan-out
+_caller = threading.local()
+
+
+@contextmanager
+def caller_deadline(deadline):
+    """Make model calls in this thread give up their slot wait and cap their own deadline at `deadline`"""
+    previous = getattr(_caller, "deadline", None)
+    _caller.deadline = deadline
+    try:
+        yield
+    finally:
+        _caller.deadline = previous
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight model calls and bounds how many callers may wait for a slot"""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._wait_times = deque(maxlen=1000)
+        self._service_times = deque(maxlen=1000)
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def retry_after(self):
+        """Estimate how many seconds until a new caller would get a slot"""
+        if self._service_times:
+            avg_service = sum(self._service_times) / len(self._service_times)
+        else:
+            avg_service = 1.0
+        backlog = self._waiting + 1
+        return max(1, min(60, math.ceil(backlog * avg_service / self.max_concurrent)))
+
+    def acquire(self):
+        """Wait for a slot, or raise AdmissionRejected if the queue is full or too slow"""
+        start = time.monotonic()
+        with self._cond:
+            if self._in_flight >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise AdmissionRejected(
+                        f"Too many pending model calls ({self.name})",
+                        status_code=429,
+                        retry_after=self.retry_after()
+                    )
+
+                self._waiting += 1
+                deadline = start + self.queue_timeout
+                if getattr(_caller, "deadline", None) is not None:
+                    deadline = min(deadline, _caller.deadline)
+                try:
+                    while self._in_flight >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise AdmissionRejected(
+                                f"Timed out waiting for a model slot ({self.name})",
+                                status_code=503,
+                                retry_after=self.retry_after()
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_flight += 1
+            self.admitted += 1
+            self._wait_times.append(time.monotonic() - start)
+
+    def try_acquire(self):
+        """Take a slot only if one is free right now"""
+        with self._cond:
+            if self._in_flight >= self.max_concurrent or self._waiting:
+                return False
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, service_time):
+        """Free a slot and record how long it was held"""
+        with self._cond:
+            self._in_flight -= 1
+            self._service_times.append(service_time)
+            self._cond.notify()
+
+    def stats(self):
+        """Current queue depth, in-flight count and wait-time statistics"""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(1000 * sum(waits) / len(waits), 2) if waits else 0,
+                "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0
+            }
+
+
+class CircuitBreaker:
+    """Opens after consecutive model failures and lets one trial call through after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def before_call(self):
+        """Raise CircuitOpen if calls should fail fast right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+
+            self.short_circuited += 1
+            raise CircuitOpen(retry_after=max(1, math.ceil(self.reset_timeout - elapsed)))
+
+    def release_trial(self):
+        """Give up a half-open trial that never reached the model"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited
+            }
+
+
+class LatencyTracker:
+    """Recent successful call latencies and timeout/hedge counters for one call type"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def count(self, counter, amount=1):
+        """Add to one of the call counters (calls, failures, timeouts, hedges, hedge_wins)"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_tokens(self, prompt_tokens, output_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+
+    def percentile(self, pct):
+        """Latency at the given percentile, or None with too few samples"""
+        with self._lock:
+            if len(self._latencies) < Config.LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(pct * (len(ordered) - 1))]
+
+    def stats(self):
+        with self._lock:
+            ordered = sorted(self._latencies)
+            counts = {
+                "calls": self.calls,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens
+            }
+        if ordered:
+            counts["p50_ms"] = round(1000 * ordered[int(0.5 * (len(ordered) - 1))], 2)
+            counts["p95_ms"] = round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 2)
+        return counts
+
+
+global_limiter = ConcurrencyLimiter(
+    "global",
+    Config.LLM_MAX_CONCURRENCY,
+    Config.LLM_MAX_QUEUE,
+    Config.LLM_QUEUE_TIMEOUT
+)
+
+_agent_limiters = {}
+_agent_limiters_lock = threading.Lock()
+
+breaker = CircuitBreaker(Config.LLM_BREAKER_FAILURE_THRESHOLD, Config.LLM_BREAKER_RESET_TIMEOUT)
+
+CALL_TIMEOUTS = {
+    "routing": Config.LLM_ROUTING_TIMEOUT,
+    "specialist": Config.LLM_SPECIALIST_TIMEOUT
+}
+latency_trackers = {kind: LatencyTracker() for kind in CALL_TIMEOUTS}
+# The same per model tier, for calls that name one
+tier_trackers = {tier: LatencyTracker() for tier in Config.MODEL_TIERS}
+
+# Model calls run here so the caller can stop waiting at the deadline. A call
+# keeps its slots until it really finishes, even after its caller has timed
+# out, so there are never more calls here than global slots and this never queues
+_call_executor = ThreadPoolExecutor(
+    max_workers=Config.LLM_MAX_CONCURRENCY * 2,
+    thread_name_prefix="llm-call"
+)
+
+
+def create_model(model_name, system_instruction):
+    """Create the Gemini model, or the local stub when Config.USE_STUB_MODEL is set"""
+    if Config.USE_STUB_MODEL:
+        return StubModel(model_name, system_instruction=system_instruction)
+    return genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+
+
+def get_agent_limiter(agent):
+    """Get (or create) the per-agent limiter"""
+    with _agent_limiters_lock:
+        limiter = _agent_limiters.get(agent)
+        if limiter is None:
+            limiter = ConcurrencyLimiter(
+                agent,
+                Config.LLM_AGENT_MAX_CONCURRENCY.get(agent, Config.LLM_MAX_CONCURRENCY),
+                Config.LLM_AGENT_MAX_QUEUE,
+                Config.LLM_QUEUE_TIMEOUT
+            )
+            _agent_limiters[agent] = limiter
+        return limiter
+
+
+class SlotHold:
+    """
+    A per-agent and a global slot, freed once the caller and every provider
+    call attached to them are done, whichever finishes last
+    """
+
+    def __init__(self, agent_limiter, agent_start, global_start):
+        self._agent_limiter = agent_limiter
+        self._agent_start = agent_start
+        self._global_start = global_start
+        self._lock = threading.Lock()
+        self._holders = 1
+
+    def attach(self, future):
+        """Keep the slots until a provider call running on the executor finishes"""
+        with self._lock:
+            self._holders += 1
+        future.add_done_callback(self.drop)
+
+    def drop(self, _future=None):
+        with self._lock:
+            self._holders -= 1
+            if self._holders:
+                return
+        now = time.monotonic()
+        global_limiter.release(now - self._global_start)
+        self._agent_limiter.release(now - self._agent_start)
+
+
+@contextmanager
+def model_slot(agent):
+    """Hold a per-agent slot and a global slot for a model call, and past it while an abandoned call still runs"""
+    agent_limiter = get_agent_limiter(agent)
+    agent_limiter.acquire()
+    start = time.monotonic()
+    try:
+        global_limiter.acquire()
+    except BaseException:
+        agent_limiter.release(time.monotonic() - start)
+        raise
+    hold = SlotHold(agent_limiter, start, time.monotonic())
+    try:
+        yield hold
+    finally:
+        hold.drop()
+
+
+def usage_tokens(response, prompt):
+    """(prompt, output) tokens of a call from the response's usage metadata, or about 4 characters a token without it"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None) is not None:
+        return usage.prompt_token_count, usage.candidates_token_count or 0
+    try:
+        text = response.text
+    except (AttributeError, ValueError):
+        text = ""
+    return len(prompt) // 4, len(text) // 4
+
+
+def _invoke(model, prompt, timeout):
+    """Single model call; returns (response, latency)"""
+    start = time.monotonic()
+    response = model.generate_content(prompt, request_options={"timeout": timeout})
+    return response, time.monotonic() - start
+
+
+def _invoke_hedge(model, prompt, timeout):
+    """Hedge call holding an extra global slot taken with try_acquire"""
+    start = time.monotonic()
+    try:
+        return _invoke(model, prompt, timeout)
+    finally:
+        global_limiter.release(time.monotonic() - start)
+
+
+def _call_with_deadline(model, prompt, kind, timeout, hold):
+    """Run the call against a deadline, hedging once after the p95 delay if enabled"""
+    tracker = latency_trackers[kind]
+    start = time.monotonic()
+    deadline = start + timeout
+
+    hedge_at = None
+    if Config.LLM_HEDGE_ENABLED:
+        p95 = tracker.percentile(Config.LLM_HEDGE_PERCENTILE)
+        if p95 is not None:
+            hedge_at = start + max(Config.LLM_HEDGE_MIN_DELAY, p95)
+
+    primary = _call_executor.submit(_invoke, model, prompt, timeout)
+    hold.attach(primary)
+    pending = {primary}
+    last_error = None
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+
+        wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+        done, pending = wait(pending, timeout=max(0, wait_until - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                response, latency = future.result()
+                tracker.record(latency)
+                if future is not primary:
+                    tracker.count("hedge_wins")
+                return response
+            last_error = future.exception()
+
+        if hedge_at is not None and time.monotonic() >= hedge_at and primary in pending:
+            hedge_at = None
+            # Only hedge into spare capacity; never queue a duplicate
+            if global_limiter.try_acquire():
+                tracker.count("hedges")
+                remaining = max(0, deadline - time.monotonic())
+                pending.add(_call_executor.submit(_invoke_hedge, model, prompt, remaining))
+
+    if last_error is not None and not pending:
+        raise last_error
+
+    tracker.count("timeouts")
+    raise ModelTimeout(f"Model call timed out after {timeout:g}s")
+
+
+def generate_content(model, prompt, agent, kind="specialist", timeout=None, tier=None):
+    """
+    Call model.generate_content under the global and per-agent concurrency limits,
+    with a per-call deadline (the kind's default unless `timeout` is given),
+    optional hedging and circuit breaking; latency and tokens are also
+    counted for the model `tier` if one is given
+    """
+    breaker.before_call()
+    tracker = latency_trackers[kind]
+    tracker.count("calls")
+    tier_tracker = tier_trackers.get(tier)
+    if tier_tracker:
+        tier_tracker.count("calls")
+
+    timeout = CALL_TIMEOUTS[kind] if timeout is None else timeout
+    try:
+        with model_slot(agent) as hold:
+            start = time.monotonic()
+            if getattr(_caller, "deadline", None) is not None:
+                timeout = max(0.0, min(timeout, _caller.deadline - start))
+            try:
+                response = _call_with_deadline(model, prompt, kind, timeout, hold)
+            except google_exceptions.ResourceExhausted as e:
+                tracker.count("failures")
+                if tier_tracker:
+                    tier_tracker.count("failures")
+                breaker.record_failure()
+                raise AdmissionRejected(
+                    "Model provider rate limit reached",
+                    status_code=503,
+                    retry_after=Config.LLM_PROVIDER_RETRY_AFTER
+                ) from e
+            except Exception as e:
+                tracker.count("failures")
+                if tier_tracker:
+                    tier_tracker.count("failures")
+                    tier_tracker.count("timeouts", isinstance(e, ModelTimeout))
+                breaker.record_failure()
+                raise
+    except AdmissionRejected:
+        breaker.release_trial()
+        raise
+
+    breaker.record_success()
+    tokens = usage_tokens(response, prompt)
+    tracker.record_tokens(*tokens)
+    if tier_tracker:
+        tier_tracker.record(time.monotonic() - start)
+        tier_tracker.record_tokens(*tokens)
+    return response
+
+
+def get_stats():
+    """Limiter, latency and breaker statistics for the /metrics endpoint"""
+    with _agent_limiters_lock:
+        agents = dict(_agent_limiters)
+    return {
+        "llm_limits": {
+            "global": global_limiter.stats(),
+            "agents": {name: limiter.stats() for name, limiter in agents.items()}
+        },
+        "llm_calls": {kind: tracker.stats() for kind, tracker in latency_trackers.items()},
+        "llm_tiers": {tier: tracker.stats() for tier, tracker in tier_trackers.items()},
+        "llm_breaker": breaker.stats()
+    }
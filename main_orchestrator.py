@@ -1,5 +1,11 @@
 import google.generativeai as genai
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from config import Config
+from degraded_mode import specialist_deadline
+from fast_path import fast_path
+from llm_gateway import AdmissionRejected, CircuitOpen, ModelTimeout, caller_deadline, generate_content
+from model_tiers import TieredModel
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
@@ -11,8 +17,20 @@ from portfolio_agent import portfolio_agent
 from perks_agent import perks_agent
 from advisors_agent import advisors_agent
 
+# Keywords that pick specialists when the routing model cannot be reached
+ROUTING_KEYWORDS = {
+    'SPENDING': ["spend", "spent", "transaction", "purchase", "expense", "budget", "bought", "subscription", "recurring", "alert me", "exceeds"],
+    'GOALS': ["goal", "saving", "save for", "target", "vacation", "emergency fund"],
+    'PORTFOLIO': ["invest", "portfolio", "net worth", "debt", "loan", "stock", "bond", "allocation", "credit card"],
+    'PERKS': ["perk", "reward", "cashback", "cash back", "offer", "benefit", "points"],
+    'ADVISORS': ["advisor", "adviser", "appointment", "meeting", "book", "schedule", "talk to"]
+}
+
+# Runs specialists side by side when a query spans several of them
+fan_out_executor = ThreadPoolExecutor(max_workers=Config.LLM_MAX_CONCURRENCY, thread_name_prefix="fan-out")
+
 class ChatOrchestrator:
-    """Main chat orchestrator that routes queries to specialist agents"""
+    """Main chat orchestrator that routes queries to one or more specialist agents"""
     
     def __init__(self):
         self.name = "chat_orchestrator"
@@ -22,26 +40,29 @@ class ChatOrchestrator:
         
         AVAILABLE SPECIALIST AGENTS:
         
-        1. SPENDING - For: transactions, expenses, budgets, spending patterns
+        1. SPENDING - For: transactions, expenses, budgets, spending patterns, subscriptions
         2. GOALS - For: savings goals, targets, progress, savings plans
         3. PORTFOLIO - For: investments, net worth, debt, asset allocation
         4. PERKS - For: rewards, cashback, benefits, offers
         5. ADVISORS - For: connecting with financial advisors, scheduling meetings
         
-        Analyze the query and respond with ONLY ONE WORD indicating which specialist to use:
+        Analyze the query and respond with ONLY the specialist names needed to answer it,
+        separated by commas, most relevant first:
         - "SPENDING" for spending/transaction questions
         - "GOALS" for savings goal questions
         - "PORTFOLIO" for investment/debt questions
         - "PERKS" for rewards/benefits questions
         - "ADVISORS" for advisor/meeting questions
         
+        Use a single name when one specialist is enough. Only list several when the
+        question spans areas, e.g. "GOALS, PORTFOLIO" for
+        "Can I afford my Italy trip given my credit card debt?"
+        
         If unclear, respond with "SPENDING" as the default.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
         
         self.agents = {
             'SPENDING': spending_agent,
@@ -51,32 +72,99 @@ class ChatOrchestrator:
             'ADVISORS': advisors_agent
         }
     
-    def process_query(self, query):
-        """Process a user query by routing to the right specialist"""
+    def route(self, query, history=None):
+        """Ask the model which specialists should handle the query"""
+        routing_prompt = f"User query: {query}\n\nWhich specialists should handle this?"
+        if history:
+            # Follow-ups like "what about last month?" need the earlier turns to route
+            routing_prompt = f"Conversation so far:\n{history}\n\n" + routing_prompt
+        tier, model = self.models.select(query, history)
+        routing_response = generate_content(model, routing_prompt, agent=self.name, kind="routing", tier=tier)
+        answer = routing_response.text.strip().upper()
+        
+        # Keep every specialist named, in the order the model listed them
+        positions = {key: answer.find(key) for key in self.agents if key in answer}
+        agent_names = sorted(positions, key=positions.get)[:Config.ORCHESTRATOR_MAX_AGENTS]
+        
+        # Default to spending if no match
+        return agent_names or ['SPENDING']
+    
+    def keyword_route(self, query):
+        """Pick specialists by keyword, for when the routing model is unavailable"""
+        text = query.lower()
+        positions = {}
+        for name, keywords in ROUTING_KEYWORDS.items():
+            found = [text.find(k) for k in keywords if k in text]
+            if found:
+                positions[name] = min(found)
+        agent_names = sorted(positions, key=positions.get)[:Config.ORCHESTRATOR_MAX_AGENTS]
+        return agent_names or ['SPENDING']
+    
+    def _run_agent(self, name, deadline, query, history, user_id):
+        """One specialist's answer, its model calls bounded by the fan-out deadline"""
+        with caller_deadline(deadline):
+            return self.agents[name].process_query(query, history, user_id)
+    
+    def fan_out(self, query, agent_names, history=None, user_id=None):
+        """Run several specialists concurrently and merge their answers"""
+        # A specialist gets its model deadline plus a margin; a model call it has not
+        # started by then gives up waiting for a slot instead of running unread
+        timeout = specialist_deadline() + Config.ORCHESTRATOR_AGENT_MARGIN
+        deadline = time.monotonic() + timeout
+        futures = {
+            name: fan_out_executor.submit(self._run_agent, name, deadline, query, history, user_id)
+            for name in agent_names
+        }
+        done, not_done = wait(futures.values(), timeout=timeout)
+        # Specialists still queued for a fan-out thread never start
+        for future in not_done:
+            future.cancel()
+        
+        sections = []
+        answered = 0
+        rejected = None
+        for name, future in futures.items():
+            title = name.title()
+            if future not in done:
+                sections.append(f"**{title}:**\nThe {title.lower()} specialist took too long to respond.")
+            elif isinstance(future.exception(), AdmissionRejected):
+                rejected = future.exception()
+                sections.append(f"**{title}:**\nThe {title.lower()} specialist is busy right now.")
+            elif future.exception() is not None:
+                sections.append(f"**{title}:**\nError processing query: {str(future.exception())}")
+            else:
+                answered += 1
+                sections.append(f"**{title}:**\n{future.result()}")
+        
+        # Nothing answered because we're overloaded: let the server send 429/503
+        if not answered and rejected is not None:
+            raise rejected
+        
+        return "\n\n".join(sections)
+    
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query by routing to the right specialists"""
         try:
-            # Determine which agent to use
-            routing_prompt = f"User query: {query}\n\nWhich specialist should handle this?"
-            routing_response = self.model.generate_content(routing_prompt)
-            
-            # Extract the agent name from response
-            agent_name = routing_response.text.strip().upper()
-            
-            # Clean up the response to just get the agent name
-            for key in self.agents.keys():
-                if key in agent_name:
-                    agent_name = key
-                    break
+            # Purely factual questions are answered from templates without the model
+            answer = fast_path.answer(query, user_id)
+            if answer is not None:
+                return answer
             
-            # Default to spending if no match
-            if agent_name not in self.agents:
-                agent_name = 'SPENDING'
+            try:
+                agent_names = self.route(query, history)
+            except (ModelTimeout, CircuitOpen):
+                # The specialists can still answer from data in degraded mode
+                if not Config.DEGRADED_MODE_ENABLED:
+                    raise
+                agent_names = self.keyword_route(query)
             
-            # Route to the appropriate agent
-            selected_agent = self.agents[agent_name]
-            response = selected_agent.process_query(query)
+            if len(agent_names) == 1:
+                return self.agents[agent_names[0]].process_query(query, history, user_id)
             
-            return response
+            return self.fan_out(query, agent_names, history, user_id)
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             return f"Error processing query: {str(e)}"
 
@@ -0,0 +1,306 @@
+"""
+Merchant normalization and categorization for raw card descriptors.
+
+Bank feeds describe purchases as strings like "SQ *LOCAL CAFE 1234" or
+"AMZN MKTP US*2K4L81". MerchantClassifier turns each into the canonical
+merchant and category that get_spending_by_category and the perk engine
+group by:
+    "SQ *LOCAL CAFE 1234"   -> ("Local Cafe", "Dining")     dictionary merchant
+    "AMZN MKTP US*2K4L81"   -> ("Amazon", "Shopping")       merchant alias
+    "TST* BLUE DOOR PIZZA"  -> ("Blue Door Pizza", "Dining")  category keyword
+    "ACME WIDGETS 0042"     -> ("Acme Widgets", None)       unknown
+
+Every merchant alias and category keyword is compiled into one Aho-Corasick
+automaton over whole words, so a descriptor is scanned once however large the
+dictionary is. The automaton is a dense NumPy transition table over a
+27-symbol alphabet (letters plus one separator for everything else), and
+classify_many runs it over a whole batch of descriptors at a time: one table
+lookup per character position for all of them at once. Where several entries
+match, a merchant beats a keyword and a longer match beats a shorter one.
+
+Feeds repeat the same descriptors constantly, so results are kept in an LRU
+keyed on the raw descriptor and only unseen descriptors reach the automaton.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from config import Config
+from synthetic_data import MERCHANTS
+
+# Aliases per canonical merchant, beyond the merchant's own name. Any merchant match beats every
+# category keyword, so an alias must not be a common word on its own ("ELECTRIC", "VALVE", "BP")
+MERCHANT_ALIASES = {
+    "Amazon": ["AMZN", "AMZN MKTP", "AMAZON COM", "AMAZON MKTPLACE", "AMAZON MARKETPLACE", "PRIME VIDEO"],
+    "Whole Foods": ["WHOLEFDS", "WFM", "WHOLE FOODS MARKET"],
+    "Trader Joe's": ["TRADER JOES", "TRADER JOE S"],
+    "Costco": ["COSTCO WHSE", "COSTCO WHOLESALE"],
+    "Safeway": ["SAFEWAY STORE"],
+    "Target": ["TARGET COM", "TARGET T"],
+    "Starbucks": ["SBUX", "STARBUCKS STORE"],
+    "Chipotle": ["CHIPOTLE MEX", "CHIPOTLE ONLINE"],
+    "Uber": ["UBER TRIP", "UBERTRIP", "UBER BV"],
+    "Netflix": ["NETFLIX COM"],
+    "Spotify": ["SPOTIFY USA", "SPOTIFYUSA"],
+    "Delta Airlines": ["DELTA AIR", "DELTA AIR LINES"],
+    "Marriott": ["MARRIOTT HOTEL", "MARRIOTT INTL"],
+    "Airbnb": ["AIRBNB COM"],
+    "Best Buy": ["BESTBUY", "BEST BUY COM"],
+    "Home Depot": ["THE HOME DEPOT", "HOMEDEPOT"],
+    "Steam": ["STEAMGAMES", "STEAM PURCHASE"],
+    "Gas Station": ["SHELL OIL", "CHEVRON", "EXXONMOBIL", "EXXON", "ARCO", "SUNOCO"],
+    "Public Transit": ["MTA", "BART", "CLIPPER", "METRO TRANSIT"],
+    "Internet Provider": ["COMCAST", "XFINITY", "SPECTRUM", "VERIZON FIOS"],
+    "Electric Company": ["PG E", "CON ED", "DUKE ENERGY"],
+    "Water Utility": ["WATER DEPT", "CITY WATER"]
+}
+
+# Extra merchants the synthetic data does not use
+EXTRA_MERCHANTS = {
+    "Walmart": ("Shopping", ["WAL MART", "WALMART COM", "WM SUPERCENTER"]),
+    "Kroger": ("Groceries", []),
+    "Lyft": ("Transportation", ["LYFT RIDE"]),
+    "McDonald's": ("Dining", ["MCDONALDS", "MCDONALD S"]),
+    "Dunkin'": ("Dining", ["DUNKIN", "DUNKIN DONUTS"]),
+    "DoorDash": ("Dining", ["DOORDASH", "DD DOORDASH"]),
+    "Uber Eats": ("Dining", ["UBEREATS", "UBER EATS"]),
+    "United Airlines": ("Travel", ["UNITED AIR", "UNITED AIRLINES"]),
+    "Hilton": ("Travel", ["HILTON HOTELS", "HAMPTON INN"]),
+    "AMC Theatres": ("Entertainment", ["AMC THEATRES", "AMC ONLINE"]),
+    "Apple": ("Shopping", ["APPLE COM", "APPLE STORE"]),
+    "7-Eleven": ("Groceries", ["SEVEN ELEVEN"])
+}
+
+# Words that give away the category of a merchant the dictionary does not know
+CATEGORY_KEYWORDS = {
+    "Groceries": ["GROCERY", "GROCERIES", "MARKET", "SUPERMARKET", "FOODS", "PRODUCE", "BUTCHER", "BAKERY"],
+    "Dining": ["CAFE", "COFFEE", "PIZZA", "PIZZERIA", "RESTAURANT", "GRILL", "BISTRO", "SUSHI", "TAQUERIA",
+               "BURGER", "DINER", "KITCHEN", "BAR", "PUB", "DELI", "BBQ", "RAMEN"],
+    "Transportation": ["GAS", "FUEL", "PARKING", "TAXI", "CAB", "TRANSIT", "TOLL", "AUTO"],
+    "Entertainment": ["CINEMA", "THEATER", "THEATRE", "CONCERT", "TICKETS", "BOWLING", "GAMES", "GYM", "FITNESS"],
+    "Utilities": ["UTILITY", "UTILITIES", "POWER", "ENERGY", "WATER", "INTERNET", "WIRELESS", "TELECOM"],
+    "Shopping": ["STORE", "SHOP", "BOUTIQUE", "OUTLET", "MALL", "HARDWARE", "BOOKS", "APPAREL"],
+    "Travel": ["AIRLINES", "AIRLINE", "AIRWAYS", "HOTEL", "MOTEL", "INN", "RESORT", "HOSTEL", "TRAVEL"]
+}
+
+# Payment processor and marketplace prefixes ("SQ *", "TST* ", "PAYPAL *") that are not part of the merchant
+PROCESSOR_PREFIX = re.compile(r"^\s*(?:SQ|TST|SP|PP|PAYPAL|PY|IN|CKE|ZLR|BT|GOOGLE|APL)\s*\*\s*", re.I)
+# Words of letters, possibly joined by ' & . or -; words touching digits (store numbers, codes) do not count
+NAME_WORD = re.compile(r"(?<!\w)[^\W\d_]+(?:['’&.-][^\W\d_]+)*(?!\w)")
+SUFFIXES = {"US", "USA", "INC", "LLC", "CO", "COM"}
+
+MERCHANT, KEYWORD = 1, 0
+ALPHABET = 27
+DROPPED = -1
+
+
+def _symbol_table():
+    """Symbol per ASCII code: letters 1-26, apostrophes dropped (so "JOE'S" reads as "JOES"), the rest 0"""
+    table = np.zeros(128, dtype=np.int8)
+    for k, letter in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ"):
+        table[ord(letter)] = table[ord(letter.lower())] = k + 1
+    for char in "'`":
+        table[ord(char)] = DROPPED
+    return table
+
+
+SYMBOLS = _symbol_table()
+
+
+def _fold(text):
+    """ASCII letters for accented ones ("CAFÉ" -> "CAFE") and a plain apostrophe for typographic ones"""
+    text = unicodedata.normalize("NFKD", text.replace("’", "'"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def encode(descriptors, max_chars=None):
+    """
+    Descriptors as an int8 matrix of raw symbols, one row each and at least
+    one trailing separator; runs of separators and dropped characters are
+    left for the scan to skip. Only the first max_chars characters are kept,
+    so one oversized descriptor cannot widen the whole batch.
+    """
+    limit = max_chars or Config.MERCHANT_MAX_DESCRIPTOR_CHARS
+    texts = np.array([d[:limit] if d.isascii() else _fold(d[:limit])[:limit] for d in descriptors], dtype=str)
+    width = max(texts.dtype.itemsize // 4, 1)
+    codes = texts.view(np.uint32).reshape(len(texts), width)
+    symbols = np.zeros((len(texts), width + 1), dtype=np.int8)
+    symbols[:, :-1] = SYMBOLS[np.minimum(codes, 127)]
+    return symbols
+
+
+def pattern_symbols(text):
+    """A dictionary entry as whole-word symbols: each word's letters, with one separator before and after every word"""
+    words = re.split(r"[^A-Z]+", re.sub(r"['`]", "", _fold(text).upper()))
+    pattern = [0]
+    for word in filter(None, words):
+        pattern += [ord(c) - ord("A") + 1 for c in word] + [0]
+    return tuple(pattern)
+
+
+class Automaton:
+    """Aho-Corasick automaton over symbol sequences as a dense transition table"""
+
+    def __init__(self, patterns):
+        # Trie of the patterns; goto[state] maps a symbol to the next state
+        goto = [{}]
+        ends = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for symbol in pattern:
+                if symbol not in goto[state]:
+                    goto.append({})
+                    ends.append([])
+                    goto[state][symbol] = len(goto) - 1
+                state = goto[state][symbol]
+            ends[state].append(index)
+
+        self.delta = np.zeros((len(goto), ALPHABET), dtype=np.int32)
+        fail = [0] * len(goto)
+        self.matches = [list(e) for e in ends]
+        queue = deque()
+        for symbol in range(ALPHABET):
+            if symbol in goto[0]:
+                self.delta[0, symbol] = goto[0][symbol]
+                queue.append(goto[0][symbol])
+        # Breadth first, so each state's failure target is complete before its children need it
+        while queue:
+            state = queue.popleft()
+            self.matches[state] += self.matches[fail[state]]
+            for symbol in range(ALPHABET):
+                child = goto[state].get(symbol)
+                if child is None:
+                    self.delta[state, symbol] = self.delta[fail[state], symbol]
+                else:
+                    fail[child] = int(self.delta[fail[state], symbol])
+                    self.delta[state, symbol] = child
+                    queue.append(child)
+
+
+class MerchantClassifier:
+    """
+    Maps raw descriptors to (merchant, category). Dictionary merchants get
+    their canonical name; other descriptors get a cleaned-up name and the
+    category of any keyword they contain, or None.
+    """
+
+    def __init__(self, merchants=None, keywords=None, cache_size=None):
+        merchants = merchants or default_dictionary()
+        keywords = keywords or CATEGORY_KEYWORDS
+        entries = []
+        for name, (category, aliases) in merchants.items():
+            for alias in [name] + aliases:
+                entries.append((alias, MERCHANT, name, category))
+        for category, words in keywords.items():
+            entries.extend((word, KEYWORD, None, category) for word in words)
+
+        patterns, scores, self.entries = [], [], []
+        seen = set()
+        for text, kind, name, category in entries:
+            pattern = pattern_symbols(text)
+            if pattern not in seen:
+                seen.add(pattern)
+                patterns.append(pattern)
+                self.entries.append((name, category))
+                # Merchants beat keywords, then the longest match wins
+                scores.append(kind * 1000 + len(pattern))
+        automaton = Automaton(patterns)
+        self.delta = automaton.delta
+        # Best entry ending at each state, and its score; index -1 is "no match"
+        scores = np.array(scores + [-1])
+        self.best = np.array(
+            [max(m, key=scores.__getitem__) if m else -1 for m in automaton.matches], dtype=np.int32
+        )
+        self.best_score = scores[self.best]
+        self.states = len(self.delta)
+
+        self.cache_size = cache_size or Config.MERCHANT_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, descriptors):
+        """Index into self.entries of the best dictionary match per descriptor, -1 for none"""
+        if not len(descriptors):
+            return np.zeros(0, dtype=np.int32)
+        symbols = encode(descriptors)
+        # Every descriptor starts after an implicit separator
+        state = np.full(len(symbols), self.delta[0, 0], dtype=np.int32)
+        last = np.zeros(len(symbols), dtype=np.int8)
+        best = np.full(len(symbols), -1, dtype=np.int32)
+        best_score = np.full(len(symbols), -1)
+        for column in range(symbols.shape[1]):
+            symbol = symbols[:, column]
+            # A separator after a separator and a dropped character leave the state as it is
+            skip = (symbol == DROPPED) | ((symbol == 0) & (last == 0))
+            state = np.where(skip, state, self.delta[state, np.maximum(symbol, 0)])
+            last = np.where(symbol == DROPPED, last, symbol)
+            score = self.best_score[state]
+            better = score > best_score
+            best[better] = self.best[state[better]]
+            best_score[better] = score[better]
+        return best
+
+    def classify_many(self, descriptors):
+        """(merchant, category) per descriptor; unseen distinct descriptors are matched in one batch"""
+        results = {}
+        distinct = set(descriptors)
+        with self._lock:
+            for descriptor in distinct:
+                cached = self._cache.get(descriptor)
+                if cached is not None:
+                    self._cache.move_to_end(descriptor)
+                    results[descriptor] = cached
+            self.hits += len(results)
+        unseen = [d for d in distinct if d not in results]
+        if unseen:
+            for descriptor, entry in zip(unseen, self.match(unseen).tolist()):
+                name, category = self.entries[entry] if entry >= 0 else (None, None)
+                results[descriptor] = (name or clean_name(descriptor[:Config.MERCHANT_MAX_DESCRIPTOR_CHARS]), category)
+            with self._lock:
+                self.misses += len(unseen)
+                for descriptor in unseen:
+                    self._cache[descriptor] = results[descriptor]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return list(map(results.__getitem__, descriptors))
+
+    def classify(self, descriptor):
+        """(merchant, category) of one descriptor"""
+        return self.classify_many([descriptor])[0]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "merchant_classifier": {
+                    "dictionary_patterns": len(self.entries),
+                    "automaton_states": self.states,
+                    "cached": len(self._cache),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0
+                }
+            }
+
+
+def default_dictionary():
+    """Canonical merchants with their category and aliases: the synthetic data's merchants plus common chains"""
+    dictionary = {name: (category, list(MERCHANT_ALIASES.get(name, []))) for name, category in MERCHANTS}
+    dictionary.update(EXTRA_MERCHANTS)
+    return dictionary
+
+
+def clean_name(descriptor):
+    """Readable merchant name from a descriptor: no processor prefix, store numbers or corporate suffixes"""
+    words = NAME_WORD.findall(PROCESSOR_PREFIX.sub("", descriptor))
+    return " ".join(
+        w.capitalize() if w.isupper() or w.islower() else w for w in words if w.upper() not in SUFFIXES
+    ) or descriptor.strip()
+
+
+merchant_classifier = MerchantClassifier()
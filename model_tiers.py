@@ -0,0 +1,106 @@
+"""
+Per-call choice between a fast model tier and a strong one.
+
+Routing and simple lookups don't need the strongest model, so each agent
+holds one model per tier and picks one per call. Config.MODEL_AGENT_TIERS
+fixes an agent to "fast" or "strong", or sets "auto" to choose per query:
+complexity() scores the query from 0 to 1 with a few regexes and counts, in
+microseconds and without a model call, and queries scoring at least
+MODEL_COMPLEXITY_THRESHOLD go to the strong tier:
+    analysis terms ("should I", "compare", "what if", "plan", ...)   0.15 each, up to 0.6
+    steps joined by "then", "also", "and if", ...                    0.1 each, up to 0.3
+    each question after the first                                    0.1
+    two or more figures to work with                                 0.1
+    length                                                           up to 0.3, at 60 words
+    an earlier conversation to take into account                     0.1
+
+Calls pass their tier to llm_gateway.generate_content, which keeps latency
+and token counts per tier next to those per call type; stats() adds how often
+each agent chose each tier and the mean complexity of auto-tiered queries.
+With MODEL_TIERING_ENABLED off every agent uses MODEL_NAME.
+"""
+import re
+import threading
+from collections import defaultdict
+
+from config import Config
+from llm_gateway import create_model
+
+ANALYSIS_TERMS = re.compile(
+    r"\b(?:why|should i|should we|compare|comparison|versus|vs|or should|what if|what happens|trade-?offs?|"
+    r"pros and cons|strateg(?:y|ies)|plan|planning|optimi[sz]e|prioriti[sz]e|analy[sz]e|analysis|forecast|"
+    r"project(?:ion|ed)?|scenario|rebalanc\w*|afford|best way|recommend\w*|impact|affect|long[- ]term|"
+    r"explain|break down|worth it)\b"
+)
+STEP_TERMS = re.compile(
+    r"\b(?:then|also|after that|as well as|in addition|and if|but if|while|before|assuming|given that|"
+    r"over the next|each month|every month|per year)\b"
+)
+FIGURE = re.compile(r"\$?\d[\d,]*(?:\.\d+)?%?")
+
+_lock = threading.Lock()
+_selections = defaultdict(lambda: defaultdict(int))
+_complexity = defaultdict(lambda: [0, 0.0])
+
+
+def complexity(query, history=None):
+    """Local estimate from 0 (a lookup) to 1 (multi-step analysis) of how hard a query is"""
+    text = query.lower()
+    score = min(0.15 * len(ANALYSIS_TERMS.findall(text)), 0.6)
+    score += min(0.1 * len(STEP_TERMS.findall(text)), 0.3)
+    score += 0.1 * max(text.count("?") - 1, 0)
+    score += 0.1 if len(FIGURE.findall(text)) >= 2 else 0.0
+    score += min(len(text.split()) / 60, 1.0) * 0.3
+    score += 0.1 if history else 0.0
+    return round(min(score, 1.0), 3)
+
+
+def tier_for(agent, query, history=None):
+    """(tier, complexity or None) an agent should use for a query"""
+    mode = Config.MODEL_AGENT_TIERS.get(agent, "auto") if Config.MODEL_TIERING_ENABLED else "strong"
+    if mode != "auto":
+        return mode, None
+    score = complexity(query, history)
+    return ("strong" if score >= Config.MODEL_COMPLEXITY_THRESHOLD else "fast"), score
+
+
+class TieredModel:
+    """One model per tier an agent can use, all with the agent's system instruction"""
+
+    def __init__(self, agent, system_instruction):
+        self.agent = agent
+        if Config.MODEL_TIERING_ENABLED:
+            mode = Config.MODEL_AGENT_TIERS.get(agent, "auto")
+            names = {tier: Config.MODEL_TIERS[tier] for tier in (Config.MODEL_TIERS if mode == "auto" else [mode])}
+        else:
+            names = {"strong": Config.MODEL_NAME}
+        self.models = {
+            tier: create_model(model_name=name, system_instruction=system_instruction)
+            for tier, name in names.items()
+        }
+
+    def select(self, query, history=None):
+        """(tier, model) for a query, counted for /metrics"""
+        tier, score = tier_for(self.agent, query, history)
+        with _lock:
+            _selections[self.agent][tier] += 1
+            if score is not None:
+                _complexity[self.agent][0] += 1
+                _complexity[self.agent][1] += score
+        return tier, self.models[tier]
+
+
+def stats():
+    """Tier choices per agent and mean complexity of auto-tiered queries, for the /metrics endpoint"""
+    with _lock:
+        return {
+            "model_tiering": {
+                "enabled": Config.MODEL_TIERING_ENABLED,
+                "tiers": dict(Config.MODEL_TIERS) if Config.MODEL_TIERING_ENABLED else {"strong": Config.MODEL_NAME},
+                "threshold": Config.MODEL_COMPLEXITY_THRESHOLD,
+                "selections": {agent: dict(tiers) for agent, tiers in _selections.items()},
+                "mean_complexity": {
+                    agent: round(total / count, 3) for agent, (count, total) in _complexity.items() if count
+                }
+            }
+        }
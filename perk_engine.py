@@ -0,0 +1,121 @@
+"""
+Spending-aware perk matching and ranking, vectorized with NumPy.
+
+A perk earns `reward_rate` of the spend it applies to, up to an optional
+`monthly_cap`. It applies to every merchant in its `merchants` list, or to its
+whole `category` when it names no merchants.
+
+PerkIndex keeps two views of a catalogue:
+- category and merchant postings, so scoring one user only touches the perks
+  that match something the user actually spends on
+- the same postings as flat CSR arrays (feature -> perks, rates), so a whole
+  chunk of users is scored with one vectorized join. Users spend in only a
+  few of the catalogue's features, so the work grows with the (user, perk)
+  pairs that actually match, never with users x perks
+"""
+from collections import defaultdict
+
+import numpy as np
+
+
+def monthly_spend(transactions, days):
+    """Average monthly spend per category and per merchant over a window of days"""
+    months = max(days, 1) / 30
+    by_category = defaultdict(float)
+    by_merchant = defaultdict(float)
+    for txn in transactions:
+        by_category[txn["category"]] += txn["amount"] / months
+        by_merchant[txn["merchant"].lower()] += txn["amount"] / months
+    return dict(by_category), dict(by_merchant)
+
+
+class PerkIndex:
+    """Catalogue of perks indexed by the spend they reward"""
+
+    def __init__(self, perks):
+        self.perks = list(perks)
+        self.by_category = defaultdict(list)
+        self.by_merchant = defaultdict(list)
+        self.features = {}
+
+        rates = []
+        for p, perk in enumerate(self.perks):
+            merchants = [m.lower() for m in perk.get("merchants") or []]
+            if merchants:
+                for merchant in merchants:
+                    self.by_merchant[merchant].append(p)
+                keys = [("merchant", m) for m in merchants]
+            else:
+                self.by_category[perk["category"]].append(p)
+                keys = [("category", perk["category"])]
+            for key in keys:
+                column = self.features.setdefault(key, len(self.features))
+                rates.append((column, p, perk.get("reward_rate", 0.0)))
+
+        # CSR postings: perks for feature f are posting_perks[indptr[f]:indptr[f + 1]]
+        rates.sort()
+        columns = np.array([r[0] for r in rates], dtype=np.int64)
+        self.indptr = np.searchsorted(columns, np.arange(len(self.features) + 1))
+        self.posting_perks = np.array([r[1] for r in rates], dtype=np.int64)
+        self.posting_rates = np.array([r[2] for r in rates], dtype=float)
+        self.caps = np.array([perk.get("monthly_cap") or np.inf for perk in self.perks])
+
+    def spend_vector(self, category_spend, merchant_spend):
+        """One user's monthly spend laid out in the index's feature columns"""
+        vector = np.zeros(len(self.features))
+        for (kind, name), column in self.features.items():
+            vector[column] = (category_spend if kind == "category" else merchant_spend).get(name, 0.0)
+        return vector
+
+    def score_user(self, category_spend, merchant_spend):
+        """Expected monthly savings per matching perk, best first"""
+        savings = defaultdict(float)
+        for category, amount in category_spend.items():
+            for p in self.by_category.get(category, ()):
+                savings[p] += amount * self.perks[p].get("reward_rate", 0.0)
+        for merchant, amount in merchant_spend.items():
+            for p in self.by_merchant.get(merchant.lower(), ()):
+                savings[p] += amount * self.perks[p].get("reward_rate", 0.0)
+        scored = [(p, min(amount, self.caps[p])) for p, amount in savings.items()]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+    def score_batch(self, spend_matrix):
+        """
+        Expected monthly savings for a (users, features) spend matrix, as parallel
+        arrays of user rows, perk indices and savings for every matching pair.
+        """
+        rows, columns = np.nonzero(spend_matrix)
+        counts = self.indptr[columns + 1] - self.indptr[columns]
+        # Expand each (user, feature) spend into one entry per perk posted under the feature
+        firsts = np.repeat(self.indptr[columns] - (np.cumsum(counts) - counts), counts)
+        entries = firsts + np.arange(counts.sum())
+        amounts = np.repeat(spend_matrix[rows, columns], counts) * self.posting_rates[entries]
+        keys = np.repeat(rows, counts) * len(self.perks) + self.posting_perks[entries]
+
+        pairs, inverse = np.unique(keys, return_inverse=True)
+        perks = pairs % len(self.perks)
+        savings = np.minimum(np.bincount(inverse, weights=amounts), self.caps[perks])
+        return pairs // len(self.perks), perks, savings
+
+    def top_k(self, spend_matrix, k, exclude=None):
+        """
+        Each user's k best perks as (users, k) arrays of perk indices and savings,
+        padded with -1 and 0. `exclude` masks (users, perks) the user already holds.
+        """
+        users = spend_matrix.shape[0]
+        rows, perks, savings = self.score_batch(spend_matrix)
+        if exclude is not None:
+            keep = ~exclude[rows, perks]
+            rows, perks, savings = rows[keep], perks[keep], savings[keep]
+
+        # Sort by user, best first within each user, then keep each user's first k
+        order = np.lexsort((-savings, rows))
+        rows, perks, savings = rows[order], perks[order], savings[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = rank < k
+
+        top = np.full((users, k), -1, dtype=np.int64)
+        top_savings = np.zeros((users, k))
+        top[rows[keep], rank[keep]] = perks[keep]
+        top_savings[rows[keep], rank[keep]] = savings[keep]
+        return top, top_savings
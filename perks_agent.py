@@ -1,34 +1,87 @@
 import google.generativeai as genai
 from config import Config
+from degraded_mode import generate_or_degrade
+from llm_gateway import AdmissionRejected
+from model_tiers import TieredModel
+from similarity_cache import answer_cache
 from bank_wrapper import bank_data
+from perk_engine import PerkIndex, monthly_spend
+from functools import lru_cache
+from itertools import islice
+import numpy as np
 import json
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
 
-def get_all_perks():
+def get_all_perks(user_id=None):
     """Get all available banking perks"""
-    perks = bank_data.get_perks()
+    perks = bank_data.get_perks(user_id)
     return json.dumps(perks, indent=2)
 
-def get_active_perks():
+def get_active_perks(user_id=None):
     """Get currently active perks"""
-    perks = bank_data.get_perks()
+    perks = bank_data.get_perks(user_id)
     active = [p for p in perks if p["status"] == "active"]
     return json.dumps(active, indent=2)
 
-def get_available_perks():
+def get_available_perks(user_id=None):
     """Get perks available to activate"""
-    perks = bank_data.get_perks()
+    perks = bank_data.get_perks(user_id)
     available = [p for p in perks if p["status"] == "available"]
     return json.dumps(available, indent=2)
 
-def calculate_total_savings():
-    """Calculate total potential savings from all perks"""
-    perks = bank_data.get_perks()
+@lru_cache(maxsize=256)
+def _load_index(user_id, data_version):
+    """Index one version of a user's perks"""
+    return PerkIndex(bank_data.get_perks(user_id))
+
+def _user_spend(user_id=None):
+    """Monthly spend per category and merchant over the recommendation window"""
+    days = Config.PERK_SPEND_WINDOW_DAYS
+    return monthly_spend(bank_data.get_transactions(days, user_id), days)
+
+def _expected_savings(user_id=None):
+    """Each perk with its expected monthly savings from the user's own spending, best first"""
+    index = _load_index(user_id, bank_data.get_data_version(user_id))
+    scored = dict(index.score_user(*_user_spend(user_id)))
+    ranked = sorted(range(len(index.perks)), key=lambda p: scored.get(p, 0.0), reverse=True)
+    return [
+        {
+            "id": index.perks[p]["id"],
+            "name": index.perks[p]["name"],
+            "category": index.perks[p]["category"],
+            "status": index.perks[p]["status"],
+            "expected_monthly_savings": round(float(scored.get(p, 0.0)), 2)
+        }
+        for p in ranked
+    ]
+
+def recommend_perks(limit=None, user_id=None):
+    """Recommend perks to activate, ranked by expected savings from the user's spending"""
+    perks = _expected_savings(user_id)
+    recommendations = [
+        p for p in perks if p["status"] == "available" and p["expected_monthly_savings"] > 0
+    ][:limit or Config.PERK_RECOMMENDATION_LIMIT]
+    # A large catalogue has many perks the user never spends on; name a few and count the rest
+    no_matching_spend = [p["name"] for p in perks if p["expected_monthly_savings"] == 0]
     
-    active_savings = sum(p["estimated_savings"] for p in perks if p["status"] == "active")
-    potential_savings = sum(p["estimated_savings"] for p in perks if p["status"] == "available")
+    return json.dumps({
+        "based_on_last_days": Config.PERK_SPEND_WINDOW_DAYS,
+        "recommendations": recommendations,
+        "active_perks": [p for p in perks if p["status"] == "active"],
+        "no_matching_spend": {
+            "count": len(no_matching_spend),
+            "examples": no_matching_spend[:Config.PERK_NO_SPEND_EXAMPLES]
+        }
+    }, indent=2)
+
+def calculate_total_savings(user_id=None):
+    """Calculate current and potential monthly savings from perks based on the user's spending"""
+    perks = _expected_savings(user_id)
+    
+    active_savings = sum(p["expected_monthly_savings"] for p in perks if p["status"] == "active")
+    potential_savings = sum(p["expected_monthly_savings"] for p in perks if p["status"] == "available")
     total_possible = active_savings + potential_savings
     
     summary = {
@@ -40,6 +93,34 @@ def calculate_total_savings():
     }
     return json.dumps(summary, indent=2)
 
+def batch_recommend_perks(user_ids, limit=None, chunk_size=None):
+    """Yield (user_id, recommendations) for many users, scoring a chunk of users per matrix product"""
+    index = PerkIndex(bank_data.get_perk_catalogue())
+    columns = {perk["id"]: p for p, perk in enumerate(index.perks)}
+    limit = limit or Config.PERK_RECOMMENDATION_LIMIT
+    chunk_size = chunk_size or Config.PERK_BATCH_CHUNK_SIZE
+    user_ids = iter(user_ids)
+    
+    while True:
+        chunk = list(islice(user_ids, chunk_size))
+        if not chunk:
+            break
+        
+        spend = np.zeros((len(chunk), len(index.features)))
+        held = np.zeros((len(chunk), len(index.perks)), dtype=bool)
+        for row, user_id in enumerate(chunk):
+            spend[row] = index.spend_vector(*_user_spend(user_id))
+            for perk in bank_data.get_perks(user_id):
+                if perk["status"] == "active" and perk["id"] in columns:
+                    held[row, columns[perk["id"]]] = True
+        
+        top, savings = index.top_k(spend, limit, exclude=held)
+        for row, user_id in enumerate(chunk):
+            yield user_id, [
+                {"id": index.perks[p]["id"], "name": index.perks[p]["name"], "expected_monthly_savings": round(float(s), 2)}
+                for p, s in zip(top[row], savings[row]) if p >= 0 and s > 0
+            ]
+
 class PerksAgent:
     """Banking perks specialist agent"""
     
@@ -51,8 +132,8 @@ class PerksAgent:
         
         Your Capabilities:
         - Show all available perks and rewards
-        - Calculate potential savings from perks
-        - Recommend perks based on spending patterns
+        - Calculate potential savings from perks based on the user's actual spending
+        - Recommend perks ranked by expected monthly savings
         - Explain perk terms and conditions
         - Help activate beneficial perks
         
@@ -67,19 +148,24 @@ class PerksAgent:
         If asked about topics outside perks/benefits, politely redirect to your area of expertise.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
     
-    def process_query(self, query):
-        """Process a user query"""
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query, with the conversation so far if there is one"""
         try:
+            # Near-duplicate questions from the same user on the same data reuse an answer
+            cache_scope = (self.name, user_id, bank_data.get_data_version(user_id))
+            cached = answer_cache.lookup(cache_scope, query)
+            if cached is not None:
+                return cached
+            
             # Get all perks data
-            all_perks = get_all_perks()
-            active = get_active_perks()
-            available = get_available_perks()
-            savings = calculate_total_savings()
+            all_perks = get_all_perks(user_id=user_id)
+            active = get_active_perks(user_id=user_id)
+            available = get_available_perks(user_id=user_id)
+            savings = calculate_total_savings(user_id=user_id)
+            recommendations = recommend_perks(user_id=user_id)
             
             # Create context with data
             context = f"""
@@ -99,12 +185,28 @@ Available Perks:
 Savings Calculation:
 {savings}
 
+Personalized Recommendations (expected monthly savings from recent spending):
+{recommendations}
+
 Please provide a helpful response based on this data. Be enthusiastic about savings opportunities!
 """
             
-            response = self.model.generate_content(context)
-            return response.text
+            if history:
+                context = f"\nConversation So Far:\n{history}\n" + context
+            
+            # Simple questions go to the fast model tier, multi-step analysis to the strong one
+            tier, model = self.models.select(query, history)
+            
+            # Past the deadline or with the breaker open, answer from the data alone
+            response_text, degraded = generate_or_degrade(model, context, self.name, {"Active Perks": active, "Recommended Perks": recommendations, "Savings": savings}, tier=tier)
+            
+            # Only answers that didn't lean on earlier turns are safe to reuse
+            if not history and not degraded:
+                answer_cache.store(cache_scope, query, response_text)
+            return response_text
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
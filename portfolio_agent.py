@@ -1,24 +1,58 @@
 import google.generativeai as genai
 from config import Config
+from degraded_mode import generate_or_degrade
+from llm_gateway import AdmissionRejected
+from model_tiers import TieredModel
+from similarity_cache import answer_cache
 from bank_wrapper import bank_data
+from debt_payoff import compare_strategies, payoff_orders, simulate_payoff
+from portfolio_analytics import PortfolioHistory
+from functools import lru_cache
+from itertools import combinations
 import json
+import re
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
 
-def get_portfolio_summary():
+@lru_cache(maxsize=256)
+def _load_history(user_id, data_version):
+    """Build analytics for one version of a user's holdings history"""
+    return PortfolioHistory.from_dict(bank_data.get_holdings_history(user_id))
+
+def load_portfolio_history(user_id=None):
+    """Holdings history with precomputed series, rebuilt only when the user's data changes"""
+    return _load_history(user_id, bank_data.get_data_version(user_id))
+
+def _performance(history):
+    """Portfolio returns over the standard windows"""
+    windows = history.standard_windows()
+    full = windows["full_history"]["series"]["Total"]["return_pct"] / 100
+    years = len(history.dates) / 252
+    return {
+        "one_month_return": windows["one_month"]["series"]["Total"]["return_pct"],
+        "ytd_return": windows["year_to_date"]["series"]["Total"]["return_pct"],
+        "one_year_return": windows["one_year"]["series"]["Total"]["return_pct"],
+        "annualized_return_since_inception": round(((1 + full) ** (1 / years) - 1) * 100, 2)
+    }
+
+def get_portfolio_summary(user_id=None):
     """Get investment portfolio summary"""
-    investments = bank_data.get_investments()
-    return json.dumps(investments, indent=2)
+    investments = bank_data.get_investments(user_id)
+    summary = {
+        **investments,
+        "performance": _performance(load_portfolio_history(user_id))
+    }
+    return json.dumps(summary, indent=2)
 
-def get_net_worth():
+def get_net_worth(user_id=None):
     """Get net worth calculation"""
-    net_worth = bank_data.get_net_worth()
+    net_worth = bank_data.get_net_worth(user_id)
     return json.dumps(net_worth, indent=2)
 
-def get_debt_summary():
+def get_debt_summary(user_id=None):
     """Get summary of all debts"""
-    debts = bank_data.get_debts()
+    debts = bank_data.get_debts(user_id)
     total_debt = sum(debt["balance"] for debt in debts)
     total_minimum = sum(debt["minimum_payment"] for debt in debts)
     
@@ -29,35 +63,123 @@ def get_debt_summary():
     }
     return json.dumps(summary, indent=2)
 
-def calculate_debt_payoff_strategies():
-    """Calculate debt payoff strategies"""
-    debts = bank_data.get_debts()
-    
-    avalanche = sorted(debts, key=lambda x: x["interest_rate"], reverse=True)
-    snowball = sorted(debts, key=lambda x: x["balance"])
+def calculate_debt_payoff_strategies(user_id=None):
+    """Calculate debt payoff strategies with simulated payoff dates and interest"""
+    debts = bank_data.get_debts(user_id)
+    simulation = compare_strategies(debts, extra_payments=Config.DEBT_EXTRA_PAYMENT_SCENARIOS)
     
     strategies = {
         "avalanche_method": {
             "description": "Pay off highest interest rate debts first (saves most money)",
-            "order": [{"type": d["type"], "balance": d["balance"], "rate": d["interest_rate"]} for d in avalanche]
+            **simulation.get("avalanche", {})
         },
         "snowball_method": {
             "description": "Pay off lowest balance debts first (psychological wins)",
-            "order": [{"type": d["type"], "balance": d["balance"], "rate": d["interest_rate"]} for d in snowball]
+            **simulation.get("snowball", {})
         }
     }
     return json.dumps(strategies, indent=2)
 
-def analyze_asset_allocation():
+def simulate_debt_payoff(extra_payments=None, custom_order=None, user_id=None):
+    """
+    Simulate payoff for given extra monthly payments and an optional custom order of debt types,
+    plus months to debt-free and total interest for every order across a sweep of extra payments
+    """
+    debts = bank_data.get_debts(user_id)
+    simulation = compare_strategies(
+        debts,
+        extra_payments=extra_payments or Config.DEBT_EXTRA_PAYMENT_SCENARIOS,
+        custom_order=custom_order
+    )
+    if debts:
+        orders = payoff_orders(debts, custom_order)
+        sweep = list(range(0, Config.DEBT_SWEEP_MAX + 1, Config.DEBT_SWEEP_STEP))
+        result = simulate_payoff(debts, list(orders.values()), sweep)
+        simulation["sweep"] = {
+            "extra_monthly_payment": sweep,
+            **{
+                name: {
+                    "months_to_debt_free": [int(m) if m >= 0 else None for m in result["months"][o]],
+                    "total_interest": [round(float(i), 2) for i in result["total_interest"][o]]
+                }
+                for o, name in enumerate(orders)
+            }
+        }
+    return json.dumps(simulation, indent=2)
+
+# "What if I pay an extra $300 a month?", "pay off the student loan first, then the car loan"
+DEBT_TERMS = re.compile(r"\b(?:debts?|loans?|credit cards?|payoff|pay (?:it |them |this |that )?(?:off|down)|debt[- ]free)\b")
+DOLLARS = re.compile(r"\$\s?(\d[\d,]*(?:\.\d{1,2})?)|\b(\d[\d,]*(?:\.\d{1,2})?)\s*(?:dollars|bucks)\b")
+ORDER_TERMS = re.compile(r"\b(?:first|then|before|after|order|prioriti[sz]e|focus on)\b")
+DEBT_ALIASES = {"car loan": "auto loan", "student debt": "student loan"}
+
+def debt_scenario_from_query(query, debts):
+    """(extra monthly payments, custom order of debt types) a debt what-if question asks about, or None"""
+    text = " ".join(query.lower().split())
+    if not DEBT_TERMS.search(text):
+        return None
+    extra_payments = sorted({
+        float((a or b).replace(",", "")) for a, b in DOLLARS.findall(text)
+        if 0 < float((a or b).replace(",", "")) <= Config.DEBT_SWEEP_MAX * 10
+    })[:10]
+    custom_order = None
+    if ORDER_TERMS.search(text):
+        for alias, name in DEBT_ALIASES.items():
+            text = re.sub(rf"\b{alias}\b", name, text)
+        named = [(text.find(d["type"].lower()), d["type"]) for d in debts if d["type"].lower() in text]
+        custom_order = [name for _, name in sorted(named)] or None
+    if not extra_payments and not custom_order:
+        return None
+    return extra_payments or None, custom_order
+
+def get_portfolio_analytics(start_date=None, end_date=None, user_id=None):
+    """Get returns, volatility, drawdown and correlations for a date window (default: standard windows)"""
+    history = load_portfolio_history(user_id)
+    if start_date or end_date:
+        windows = {"custom": history.window_summary(start_date, end_date)}
+    else:
+        windows = history.standard_windows()
+    
+    window = Config.PORTFOLIO_ROLLING_WINDOW
+    rolling = {}
+    for first, second in combinations(history.positions, 2):
+        _, correlation = history.rolling_correlation(first, second, window)
+        rolling[f"{first} / {second}"] = {
+            "latest": round(float(correlation[-1]), 2),
+            "min": round(float(correlation.min()), 2),
+            "max": round(float(correlation.max()), 2)
+        }
+    
+    analytics = {
+        "windows": windows,
+        f"rolling_{window}_day_correlations": rolling,
+        "rebalancing_drift": history.rebalancing_drift(Config.PORTFOLIO_TARGET_ALLOCATION)
+    }
+    return json.dumps(analytics, indent=2)
+
+def analyze_asset_allocation(user_id=None):
     """Analyze current asset allocation"""
-    investments = bank_data.get_investments()
-    holdings = investments["holdings"]
+    investments = bank_data.get_investments(user_id)
+    history = load_portfolio_history(user_id)
+    one_year = history.standard_windows()["one_year"]["series"]
+    
+    # Diversification ratio: weighted average volatility over portfolio volatility.
+    # 1.0 means no diversification benefit; higher is better.
+    weights = history.weights(len(history.dates) - 1)
+    weighted_volatility = sum(
+        w * one_year[p]["annualized_volatility_pct"] for w, p in zip(weights, history.positions)
+    )
+    portfolio_volatility = one_year["Total"]["annualized_volatility_pct"]
     
     analysis = {
-        "current_allocation": holdings,
+        "current_allocation": investments["holdings"],
         "total_value": investments["total_value"],
-        "diversification_score": len(holdings),
-        "performance": investments["performance"]
+        "diversification_score": round(weighted_volatility / portfolio_volatility, 2) if portfolio_volatility else None,
+        "effective_number_of_holdings": round(float(1 / (weights ** 2).sum()), 2),
+        "one_year_volatility_pct": portfolio_volatility,
+        "one_year_max_drawdown_pct": one_year["Total"]["max_drawdown_pct"],
+        "rebalancing_drift": history.rebalancing_drift(Config.PORTFOLIO_TARGET_ALLOCATION),
+        "performance": _performance(history)
     }
     return json.dumps(analysis, indent=2)
 
@@ -73,35 +195,48 @@ class PortfolioAgent:
         Your Capabilities:
         - Analyze investment portfolio performance
         - Calculate net worth
-        - Provide debt payoff strategies
-        - Assess asset allocation
+        - Provide debt payoff strategies, and simulate what-if payoff plans (extra monthly
+          payments, a custom order of debts) when the user asks about one
+        - Assess asset allocation and drift from target weights
+        - Analyze returns, volatility, drawdowns and correlations over any period
         - Offer portfolio diversification advice
         
         When responding:
         1. Use the data to access accurate financial information
         2. Explain complex financial concepts in simple terms
         3. Provide specific recommendations with rationale
-        4. Compare different strategies (e.g., avalanche vs snowball for debt)
+        4. Compare different strategies (e.g., avalanche vs snowball for debt), quoting the
+           simulated payoff dates, total interest and savings from extra payments exactly
         5. Focus on long-term wealth building
         6. Always note that you provide general guidance, not personalized financial advice
         
         If asked about topics outside investments/debt/portfolio, politely redirect to your specialty.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
     
-    def process_query(self, query):
-        """Process a user query"""
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query, with the conversation so far if there is one"""
         try:
+            # A what-if about extra payments or payoff order gets its own simulation and sweep
+            scenario = debt_scenario_from_query(query, bank_data.get_debts(user_id))
+            
+            # Near-duplicate questions from the same user on the same data reuse an answer,
+            # but a what-if's answer depends on its amounts, so it is never reused
+            cache_scope = (self.name, user_id, bank_data.get_data_version(user_id))
+            cached = answer_cache.lookup(cache_scope, query) if scenario is None else None
+            if cached is not None:
+                return cached
+            
             # Get all portfolio data
-            portfolio_data = get_portfolio_summary()
-            net_worth_data = get_net_worth()
-            debt_data = get_debt_summary()
-            strategies = calculate_debt_payoff_strategies()
-            allocation = analyze_asset_allocation()
+            portfolio_data = get_portfolio_summary(user_id=user_id)
+            net_worth_data = get_net_worth(user_id=user_id)
+            debt_data = get_debt_summary(user_id=user_id)
+            strategies = calculate_debt_payoff_strategies(user_id=user_id)
+            allocation = analyze_asset_allocation(user_id=user_id)
+            analytics = get_portfolio_analytics(user_id=user_id)
+            sections = {"Net Worth": net_worth_data, "Portfolio Summary": portfolio_data, "Debt Summary": debt_data}
             
             # Create context with data
             context = f"""
@@ -124,12 +259,33 @@ Debt Payoff Strategies:
 Asset Allocation Analysis:
 {allocation}
 
+Portfolio Analytics:
+{analytics}
+
 Please provide a helpful response based on this data. Be specific and educational.
 """
             
-            response = self.model.generate_content(context)
-            return response.text
+            if scenario is not None:
+                what_if = simulate_debt_payoff(*scenario, user_id=user_id)
+                context = f"\nDebt Payoff What-If (requested extra payments and order, plus a sweep of extra payments):\n{what_if}\n" + context
+                sections = {"Debt Payoff What-If": what_if, **sections}
+            
+            if history:
+                context = f"\nConversation So Far:\n{history}\n" + context
+            
+            # Simple questions go to the fast model tier, multi-step analysis to the strong one
+            tier, model = self.models.select(query, history)
+            
+            # Past the deadline or with the breaker open, answer from the data alone
+            response_text, degraded = generate_or_degrade(model, context, self.name, sections, tier=tier)
+            
+            # Only answers that didn't lean on earlier turns or run a what-if are safe to reuse
+            if not history and not degraded and scenario is None:
+                answer_cache.store(cache_scope, query, response_text)
+            return response_text
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
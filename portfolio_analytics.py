@@ -0,0 +1,218 @@
+"""
+Time-series analytics over daily holdings history, vectorized with NumPy.
+
+PortfolioHistory precomputes cumulative series when it is loaded so that every
+window query afterwards is O(1):
+- returns from cumulative log returns
+- volatility from prefix sums of returns and squared returns
+- correlations from prefix sums of pairwise return products
+- max drawdown from a disjoint sparse table over log values, whose
+  (max, min, drawdown) summaries merge associatively
+"""
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def months_before(day, months):
+    """The same day of the month `months` calendar months earlier, clamped to that month's length"""
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _merge_drawdown(left, right):
+    """Combine (max, min, drawdown) summaries of two adjacent ranges, left before right"""
+    left_max, left_min, left_dd = left
+    right_max, right_min, right_dd = right
+    return (
+        np.maximum(left_max, right_max),
+        np.minimum(left_min, right_min),
+        np.maximum(np.maximum(left_dd, right_dd), left_max - right_min)
+    )
+
+
+class DrawdownTable:
+    """
+    Disjoint sparse table answering max drawdown of any index range in O(1).
+    Works on log values, one row per series, so drawdowns are log ratios.
+    """
+
+    def __init__(self, log_values):
+        self.log_values = log_values
+        series, length = log_values.shape
+        size = 1
+        while size < max(length, 2):
+            size *= 2
+        self.levels = size.bit_length() - 1
+
+        padded = np.concatenate(
+            [log_values, np.repeat(log_values[:, -1:], size - length, axis=1)], axis=1
+        )
+        self.max = np.empty((self.levels + 1, series, size))
+        self.min = np.empty((self.levels + 1, series, size))
+        self.dd = np.empty((self.levels + 1, series, size))
+
+        for level in range(1, self.levels + 1):
+            half = 1 << (level - 1)
+            blocks = padded.reshape(series, -1, 2 * half)
+            left = blocks[:, :, :half]
+            right = blocks[:, :, half:]
+
+            # Left halves hold suffix summaries ending at the block midpoint
+            left_rev = left[:, :, ::-1]
+            suffix_min = np.minimum.accumulate(left_rev, axis=2)
+            suffix_max = np.maximum.accumulate(left_rev, axis=2)
+            suffix_dd = np.maximum.accumulate(left_rev - suffix_min, axis=2)
+
+            # Right halves hold prefix summaries starting at the block midpoint
+            prefix_max = np.maximum.accumulate(right, axis=2)
+            prefix_min = np.minimum.accumulate(right, axis=2)
+            prefix_dd = np.maximum.accumulate(prefix_max - right, axis=2)
+
+            self.max[level] = np.concatenate([suffix_max[:, :, ::-1], prefix_max], axis=2).reshape(series, size)
+            self.min[level] = np.concatenate([suffix_min[:, :, ::-1], prefix_min], axis=2).reshape(series, size)
+            self.dd[level] = np.concatenate([suffix_dd[:, :, ::-1], prefix_dd], axis=2).reshape(series, size)
+
+    def query(self, start, end):
+        """Max log drawdown of each series over indices start..end inclusive"""
+        if start == end:
+            return np.zeros(self.log_values.shape[0])
+        level = int(start ^ end).bit_length()
+        left = (self.max[level, :, start], self.min[level, :, start], self.dd[level, :, start])
+        right = (self.max[level, :, end], self.min[level, :, end], self.dd[level, :, end])
+        return _merge_drawdown(left, right)[2]
+
+
+class PortfolioHistory:
+    """Daily values per position with precomputed cumulative series"""
+
+    def __init__(self, dates, positions, values):
+        self.dates = list(dates)
+        self.positions = list(positions)
+        self.date_index = {d: i for i, d in enumerate(self.dates)}
+
+        # Row 0 is the total portfolio, rows 1.. the individual positions
+        values = np.asarray(values, dtype=float)
+        self.values = np.vstack([values.sum(axis=0), values])
+        self.series_names = ["Total"] + self.positions
+
+        log_values = np.log(np.maximum(self.values, 1e-9))
+        returns = np.diff(log_values, axis=1)
+        zero = np.zeros((returns.shape[0], 1))
+        self.cum_returns = np.concatenate([zero, np.cumsum(returns, axis=1)], axis=1)
+        self.cum_squares = np.concatenate([zero, np.cumsum(returns ** 2, axis=1)], axis=1)
+
+        position_returns = returns[1:]
+        products = position_returns[:, None, :] * position_returns[None, :, :]
+        self.cum_products = np.concatenate(
+            [np.zeros(products.shape[:2] + (1,)), np.cumsum(products, axis=2)], axis=2
+        )
+        self.drawdowns = DrawdownTable(log_values)
+
+    @classmethod
+    def from_dict(cls, history):
+        """Build from {"dates": [...], "positions": {name: [daily values]}}"""
+        names = list(history["positions"])
+        return cls(history["dates"], names, [history["positions"][n] for n in names])
+
+    def index_of(self, date_str, default):
+        """Index of a date, or of the last trading day on or before it"""
+        if date_str is None:
+            return default
+        if date_str in self.date_index:
+            return self.date_index[date_str]
+        return max(0, int(np.searchsorted(self.dates, date_str, side="right")) - 1)
+
+    def _window_stats(self, start, end):
+        """Return, volatility and drawdown of every series between two indices"""
+        days = end - start
+        log_return = self.cum_returns[:, end] - self.cum_returns[:, start]
+        if days > 1:
+            mean = log_return / days
+            variance = (self.cum_squares[:, end] - self.cum_squares[:, start]) / days - mean ** 2
+            volatility = np.sqrt(np.maximum(variance, 0) * days / (days - 1) * TRADING_DAYS_PER_YEAR)
+        else:
+            volatility = np.zeros_like(log_return)
+        return np.expm1(log_return), volatility, -np.expm1(-self.drawdowns.query(start, end))
+
+    def correlation(self, start, end):
+        """Correlation matrix of daily position returns between two indices"""
+        days = max(end - start, 1)
+        sums = self.cum_returns[1:, end] - self.cum_returns[1:, start]
+        squares = self.cum_squares[1:, end] - self.cum_squares[1:, start]
+        products = self.cum_products[:, :, end] - self.cum_products[:, :, start]
+        covariance = products / days - np.outer(sums, sums) / days ** 2
+        std = np.sqrt(np.maximum(squares / days - (sums / days) ** 2, 1e-18))
+        return covariance / np.outer(std, std)
+
+    def rolling_correlation(self, first, second, window):
+        """Correlation of two positions over every trailing window of `window` days"""
+        i, j = self.positions.index(first), self.positions.index(second)
+        ends = np.arange(window, len(self.dates))
+        starts = ends - window
+        sum_i = self.cum_returns[i + 1, ends] - self.cum_returns[i + 1, starts]
+        sum_j = self.cum_returns[j + 1, ends] - self.cum_returns[j + 1, starts]
+        sq_i = self.cum_squares[i + 1, ends] - self.cum_squares[i + 1, starts]
+        sq_j = self.cum_squares[j + 1, ends] - self.cum_squares[j + 1, starts]
+        prod = self.cum_products[i, j, ends] - self.cum_products[i, j, starts]
+        covariance = prod / window - sum_i * sum_j / window ** 2
+        variance_i = np.maximum(sq_i / window - (sum_i / window) ** 2, 1e-18)
+        variance_j = np.maximum(sq_j / window - (sum_j / window) ** 2, 1e-18)
+        return [self.dates[e] for e in ends], covariance / np.sqrt(variance_i * variance_j)
+
+    def weights(self, index):
+        """Position weights on a given day"""
+        return self.values[1:, index] / self.values[0, index]
+
+    def rebalancing_drift(self, target_weights=None, since=None):
+        """Current weights against targets, or against the weights on the `since` date"""
+        current = self.weights(len(self.dates) - 1)
+        if target_weights:
+            target = np.array([target_weights.get(p, 0.0) for p in self.positions])
+        else:
+            target = self.weights(self.index_of(since, 0))
+        return {
+            p: {
+                "current_weight": round(float(current[k]) * 100, 2),
+                "target_weight": round(float(target[k]) * 100, 2),
+                "drift": round(float(current[k] - target[k]) * 100, 2)
+            }
+            for k, p in enumerate(self.positions)
+        }
+
+    def window_summary(self, start_date=None, end_date=None):
+        """Return, annualized volatility and max drawdown per series plus correlations for a window"""
+        end = self.index_of(end_date, len(self.dates) - 1)
+        start = min(self.index_of(start_date, 0), end)
+        returns, volatility, drawdown = self._window_stats(start, end)
+        correlation = self.correlation(start, end)
+        return {
+            "start_date": self.dates[start],
+            "end_date": self.dates[end],
+            "series": {
+                name: {
+                    "return_pct": round(float(returns[k]) * 100, 2),
+                    "annualized_volatility_pct": round(float(volatility[k]) * 100, 2),
+                    "max_drawdown_pct": round(float(drawdown[k]) * 100, 2)
+                }
+                for k, name in enumerate(self.series_names)
+            },
+            "correlations": {
+                a: {b: round(float(correlation[x, y]), 2) for y, b in enumerate(self.positions)}
+                for x, a in enumerate(self.positions)
+            }
+        }
+
+    def standard_windows(self, today=None):
+        """Window summaries for 1 month, year to date, 1 year and the full history"""
+        today = today or datetime.strptime(self.dates[-1], "%Y-%m-%d")
+        return {
+            "one_month": self.window_summary(months_before(today, 1).strftime("%Y-%m-%d")),
+            "year_to_date": self.window_summary(f"{today.year - 1}-12-31"),
+            "one_year": self.window_summary(months_before(today, 12).strftime("%Y-%m-%d")),
+            "full_history": self.window_summary()
+        }
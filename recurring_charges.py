@@ -0,0 +1,336 @@
+"""
+Recurring charge and subscription detection.
+
+A merchant is recurring for a user when most gaps between their charges there
+fall near one cadence (weekly, every two weeks, monthly, quarterly or yearly).
+Everything the detector needs per merchant is a set of mergeable sums:
+    charges, first and last day, first and last amount
+    gaps per cadence bucket (plus irregular gaps)
+    sum k, k^2, a, a^2 and k*a over charges k = 0, 1, ... with amount a
+The sums give the cadence, how regular it is, the mean amount and its spread,
+and the least-squares drift of the amount from one charge to the next.
+
+summarize() builds them for a whole history in one pass: rows are put in day
+order, grouped by merchant with a stable sort (so each group stays in day
+order), and every sum is a single vectorized np.bincount over the rows or the
+gaps. Two summaries of consecutive stretches of history merge in O(merchants)
+by shifting the later one's charge numbers, so RecurringTracker keeps each
+user's summary tagged with the data version it describes and folds in new
+transactions as ingest writes them; back-dated rows or a version it did not
+see make it rebuild that user from their full history instead.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from bank_wrapper import bank_data
+from config import Config
+
+# Nominal period and tolerance (days) of each cadence
+CADENCES = {
+    "weekly": (7, 1),
+    "biweekly": (14, 2),
+    "monthly": (30.44, 3),
+    "quarterly": (91.3, 6),
+    "annual": (365.25, 10)
+}
+CADENCE_NAMES = list(CADENCES)
+IRREGULAR = len(CADENCES)
+# A merchant needs this many charges, with this share of its gaps on one cadence
+MIN_CHARGES = 3
+MIN_SHARE = 0.75
+# Below this coefficient of variation the amount counts as fixed
+FIXED_AMOUNT_CV = 0.02
+
+SUM_FIELDS = ["k", "k2", "a", "a2", "ka"]
+
+
+def gap_buckets(gaps):
+    """Cadence bucket of each gap between charges, IRREGULAR when it fits none"""
+    buckets = np.full(len(gaps), IRREGULAR, dtype=np.int64)
+    for b, (period, tolerance) in reversed(list(enumerate(CADENCES.values()))):
+        buckets[np.abs(gaps - period) <= tolerance] = b
+    return buckets
+
+
+class MerchantSummary:
+    """Per-merchant sums over a stretch of one user's charges, in day order"""
+
+    def __init__(self, names, categories, counts, first_day, last_day, first_amount, last_amount, gaps, sums):
+        self.names = list(names)
+        self.categories = list(categories)
+        self.counts = counts
+        self.first_day = first_day
+        self.last_day = last_day
+        self.first_amount = first_amount
+        self.last_amount = last_amount
+        self.gaps = gaps
+        self.sums = sums
+
+    @classmethod
+    def empty(cls):
+        zeros = np.zeros(0)
+        return cls([], [], zeros, zeros, zeros, zeros, zeros, np.zeros((0, IRREGULAR + 1)),
+                   {f: zeros for f in SUM_FIELDS})
+
+    def index(self):
+        return {name: m for m, name in enumerate(self.names)}
+
+    def can_append(self, later):
+        """Whether `later` only has charges on or after each shared merchant's last one here"""
+        positions = self.index()
+        shared = [(positions[name], m) for m, name in enumerate(later.names) if name in positions]
+        if not shared:
+            return True
+        mine, theirs = np.array(shared).T
+        return bool((later.first_day[theirs] >= self.last_day[mine]).all())
+
+    def merge(self, later):
+        """Summary of this stretch followed by `later`"""
+        positions = self.index()
+        names, categories = list(self.names), list(self.categories)
+        for name, category in zip(later.names, later.categories):
+            if name not in positions:
+                positions[name] = len(names)
+                names.append(name)
+                categories.append(category)
+            else:
+                categories[positions[name]] = category
+        size = len(names)
+        rows = np.array([positions[name] for name in later.names], dtype=np.int64)
+
+        def grown(values, fill=0.0):
+            out = np.full((size,) + values.shape[1:], fill, dtype=float)
+            out[:len(values)] = values
+            return out
+
+        counts, first_day, last_day = grown(self.counts), grown(self.first_day), grown(self.last_day)
+        first_amount, last_amount, gaps = grown(self.first_amount), grown(self.last_amount), grown(self.gaps)
+        sums = {f: grown(v) for f, v in self.sums.items()}
+        before = counts[rows]
+        new = before == 0
+
+        # The gap between the last charge here and the first one in `later`
+        bridge = later.first_day - last_day[rows]
+        bridged = np.flatnonzero(~new)
+        gaps[rows[bridged], gap_buckets(bridge[bridged])] += 1
+        gaps[rows] += later.gaps
+
+        # later's charge numbers start at the number of charges already seen
+        sums["k2"][rows] += later.sums["k2"] + 2 * before * later.sums["k"] + before ** 2 * later.counts
+        sums["k"][rows] += later.sums["k"] + before * later.counts
+        sums["ka"][rows] += later.sums["ka"] + before * later.sums["a"]
+        sums["a"][rows] += later.sums["a"]
+        sums["a2"][rows] += later.sums["a2"]
+
+        counts[rows] += later.counts
+        first_day[rows[new]] = later.first_day[new]
+        first_amount[rows[new]] = later.first_amount[new]
+        last_day[rows] = later.last_day
+        last_amount[rows] = later.last_amount
+        return MerchantSummary(names, categories, counts, first_day, last_day, first_amount, last_amount, gaps, sums)
+
+
+def summarize(days, merchants, categories, amounts):
+    """
+    MerchantSummary of charges given as columns (days since the epoch,
+    merchant, category, amount); refunds and other non-positive amounts are
+    not charges and are left out
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    charges = amounts > 0
+    if not charges.any():
+        return MerchantSummary.empty()
+    days = np.asarray(days, dtype=np.int64)[charges]
+    amounts = amounts[charges]
+    merchants = np.asarray(merchants, dtype=object)[charges]
+    categories = np.asarray(categories, dtype=object)[charges]
+    names, codes = np.unique(merchants.astype(str), return_inverse=True)
+    # Day order first, then a stable sort by merchant keeps each merchant's charges in day order
+    order = np.argsort(days, kind="stable")
+    order = order[np.argsort(codes[order], kind="stable")]
+    codes, days, amounts = codes[order], days[order], amounts[order]
+    merchant_count = len(names)
+
+    counts = np.bincount(codes, minlength=merchant_count)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ends = starts + counts - 1
+    k = np.arange(len(codes)) - starts[codes]
+
+    same = codes[1:] == codes[:-1]
+    gap_codes = codes[1:][same]
+    buckets = gap_buckets(np.diff(days)[same])
+    gaps = np.bincount(gap_codes * (IRREGULAR + 1) + buckets, minlength=merchant_count * (IRREGULAR + 1))
+
+    category_of = categories[order][ends]
+    return MerchantSummary(
+        names.tolist(), category_of.tolist(),
+        counts.astype(float), days[starts].astype(float), days[ends].astype(float),
+        amounts[starts], amounts[ends],
+        gaps.reshape(merchant_count, IRREGULAR + 1).astype(float),
+        {
+            "k": np.bincount(codes, weights=k, minlength=merchant_count),
+            "k2": np.bincount(codes, weights=k * k, minlength=merchant_count),
+            "a": np.bincount(codes, weights=amounts, minlength=merchant_count),
+            "a2": np.bincount(codes, weights=amounts * amounts, minlength=merchant_count),
+            "ka": np.bincount(codes, weights=k * amounts, minlength=merchant_count)
+        }
+    )
+
+
+def transaction_columns(transactions):
+    """Day, merchant, category and amount columns of transaction dicts"""
+    return (
+        np.array([t["date"] for t in transactions], dtype="datetime64[D]").astype(np.int64),
+        [t["merchant"] for t in transactions],
+        [t["category"] for t in transactions],
+        [t["amount"] for t in transactions]
+    )
+
+
+def summarize_transactions(transactions):
+    """MerchantSummary of transaction dicts in any order"""
+    return summarize(*transaction_columns(transactions))
+
+
+def recurring_charges(summary, today=None):
+    """Recurring merchants of a summary, active ones by monthly cost and then lapsed ones"""
+    today = today or date.today()
+    today_day = (today - date(1970, 1, 1)).days
+    n = summary.counts
+    gap_count = np.maximum(n - 1, 1)
+    cadence = summary.gaps[:, :IRREGULAR].argmax(axis=1) if len(n) else np.zeros(0, dtype=int)
+    share = summary.gaps[np.arange(len(n)), cadence] / gap_count
+    recurring = np.flatnonzero((n >= MIN_CHARGES) & (share >= MIN_SHARE))
+
+    sums = summary.sums
+    mean = sums["a"] / np.maximum(n, 1)
+    # Mean and spread of the charges before the latest one, to tell a price change from drift
+    earlier = np.maximum(n - 1, 1)
+    earlier_mean = (sums["a"] - summary.last_amount) / earlier
+    earlier_spread = np.sqrt(np.maximum((sums["a2"] - summary.last_amount ** 2) / earlier - earlier_mean ** 2, 0))
+    # Least-squares change in amount per charge
+    denominator = n * sums["k2"] - sums["k"] ** 2
+    slope = np.divide(n * sums["ka"] - sums["k"] * sums["a"], denominator,
+                      out=np.zeros(len(n)), where=denominator > 0)
+
+    charges = []
+    for m in recurring:
+        name = CADENCE_NAMES[cadence[m]]
+        period, tolerance = CADENCES[name]
+        charges_per_year = 365.25 / period
+        trend = slope[m] * charges_per_year / mean[m] * 100 if mean[m] else 0.0
+        if earlier_spread[m] <= FIXED_AMOUNT_CV * abs(earlier_mean[m]):
+            same = abs(summary.last_amount[m] - earlier_mean[m]) < 0.005
+            behaviour = "fixed" if same else "price changed"
+        elif abs(trend) >= 5:
+            behaviour = "rising" if trend > 0 else "falling"
+        else:
+            behaviour = "variable"
+        last = date(1970, 1, 1) + timedelta(days=int(summary.last_day[m]))
+        charges.append({
+            "merchant": summary.names[m],
+            "category": summary.categories[m],
+            "cadence": name,
+            "charges": int(n[m]),
+            "regularity": round(float(share[m]), 2),
+            "typical_amount": round(float(mean[m]), 2),
+            "latest_amount": round(float(summary.last_amount[m]), 2),
+            "amount": behaviour,
+            "amount_change_pct": round(
+                float((summary.last_amount[m] - summary.first_amount[m]) / summary.first_amount[m] * 100), 1
+            ) if summary.first_amount[m] else 0.0,
+            "trend_per_year_pct": round(float(trend), 1),
+            "first_charge": (date(1970, 1, 1) + timedelta(days=int(summary.first_day[m]))).isoformat(),
+            "last_charge": last.isoformat(),
+            "next_expected": (last + timedelta(days=round(period))).isoformat(),
+            "monthly_cost": round(float(summary.last_amount[m]) * charges_per_year / 12, 2),
+            # Still billing unless a whole extra period has gone by
+            "active": bool(today_day - summary.last_day[m] <= 1.5 * period + tolerance)
+        })
+    charges.sort(key=lambda c: (not c["active"], -c["monthly_cost"]))
+    return charges
+
+
+class RecurringTracker:
+    """
+    Per-user merchant summaries, each tagged with the data version it
+    describes, kept for the most recently used users
+    """
+
+    def __init__(self, bank=None, max_users=None):
+        self.bank = bank or bank_data
+        self.max_users = max_users or Config.RECURRING_TRACKER_USERS
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.increments = 0
+        self.dropped = 0
+
+    def summary(self, user_id=None):
+        """A user's summary for their current data, rebuilt from their full history if it is not up to date"""
+        user_id = user_id or self.bank.default_user_id
+        version = self.bank.get_data_version(user_id)
+        with self._lock:
+            held = self._users.get(user_id)
+            if held is not None and held[0] == version:
+                self._users.move_to_end(user_id)
+                return held[1]
+        history = self.bank.get_transactions(days=Config.RECURRING_HISTORY_DAYS, user_id=user_id)
+        summary = summarize_transactions(history)
+        with self._lock:
+            self.rebuilds += 1
+            self._store(user_id, version, summary)
+        return summary
+
+    def _store(self, user_id, version, summary):
+        self._users[user_id] = (version, summary)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def tracked(self, user_id):
+        with self._lock:
+            return user_id in self._users
+
+    def observe(self, user_id, days, merchants, categories, amounts, old_version, new_version):
+        """
+        Fold charges just written for a user into their summary, if it describes
+        exactly the data before the write; otherwise forget it so the next read rebuilds
+        """
+        with self._lock:
+            held = self._users.get(user_id)
+            if held is None:
+                return
+            if held[0] != old_version:
+                del self._users[user_id]
+                self.dropped += 1
+                return
+        added = summarize(days, merchants, categories, amounts)
+        with self._lock:
+            held = self._users.get(user_id)
+            if held is None or held[0] != old_version:
+                return
+            if held[1].can_append(added):
+                self._store(user_id, new_version, held[1].merge(added))
+                self.increments += 1
+            else:
+                # Back-dated charges change earlier gaps, which the sums cannot undo
+                del self._users[user_id]
+                self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recurring_tracker": {
+                    "users": len(self._users),
+                    "rebuilds": self.rebuilds,
+                    "increments": self.increments,
+                    "dropped": self.dropped
+                }
+            }
+
+
+recurring_tracker = RecurringTracker()
@@ -2,78 +2,13 @@
 Simple server runner for individual agents
 Run this directly without the complex start_agents.py script
 """
-import sys
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any
 import uvicorn
 
 # Import the orchestrator
 from main_orchestrator import root_agent
+from agent_server import create_app
 
-app = FastAPI()
-
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-class MessagePart(BaseModel):
-    text: str
-
-class Message(BaseModel):
-    role: str
-    parts: List[MessagePart]
-
-class RunRequest(BaseModel):
-    app_name: str
-    user_id: str
-    session_id: str
-    new_message: Message
-    streaming: bool = False
-
-class RunResponse(BaseModel):
-    events: List[Dict[str, Any]]
-
-@app.post("/run", response_model=RunResponse)
-async def run_agent(request: RunRequest):
-    """Run the agent and return response"""
-    try:
-        user_message = request.new_message.parts[0].text
-        
-        # Process with the orchestrator
-        response_text = root_agent.process_query(user_message)
-        
-        # Format response
-        events = [
-            {
-                "content": {
-                    "parts": [
-                        {"text": response_text}
-                    ]
-                },
-                "role": "model"
-            }
-        ]
-        
-        return RunResponse(events=events)
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Error processing request: {error_details}")
-        return RunResponse(events=[{
-            "content": {"parts": [{"text": f"Error: {str(e)}"}]},
-            "role": "model"
-        }])
-
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
+app = create_app(root_agent, log_errors=True)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,286 @@
+import atexit
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import Config
+
+
+def _clip(text, limit):
+    """Shorten text to at most limit characters"""
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class SessionMemory:
+    """
+    Conversation state for one session: a window of recent exchanges plus a
+    rolling summary of older ones, both capped so prompt size stays constant
+    """
+
+    def __init__(self, turns=None, summary="", last_access=None):
+        self.turns = deque(turns or [], maxlen=Config.SESSION_RECENT_TURNS)
+        self.summary = summary
+        self.last_access = last_access or time.time()
+
+    def add_turn(self, user_text, model_text):
+        """Record an exchange, folding the oldest one into the summary when the window is full"""
+        if len(self.turns) == self.turns.maxlen:
+            oldest_user, oldest_model = self.turns[0]
+            self._fold_into_summary(oldest_user, oldest_model)
+
+        self.turns.append((
+            _clip(user_text, Config.SESSION_TURN_MAX_CHARS),
+            _clip(model_text, Config.SESSION_TURN_MAX_CHARS)
+        ))
+        self.last_access = time.time()
+
+    def _fold_into_summary(self, user_text, model_text):
+        """Append a one-line digest of an exchange, dropping the oldest digests past the cap"""
+        digest = f"- User asked: {_clip(user_text, 120)} / Assistant: {_clip(model_text, 160)}"
+        lines = self.summary.splitlines() + [digest]
+        while lines and len("\n".join(lines)) > Config.SESSION_SUMMARY_MAX_CHARS:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    def render(self):
+        """Format the memory for inclusion in a prompt"""
+        if not self.turns and not self.summary:
+            return ""
+
+        parts = []
+        if self.summary:
+            parts.append(f"Earlier in this conversation:\n{self.summary}")
+        if self.turns:
+            recent = "\n".join(f"User: {u}\nAssistant: {m}" for u, m in self.turns)
+            parts.append(f"Recent turns:\n{recent}")
+        return "\n\n".join(parts)
+
+    def approx_bytes(self):
+        """Approximate memory held by this session"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.turns) + sys.getsizeof(self.summary)
+        for user_text, model_text in self.turns:
+            size += sys.getsizeof(user_text) + sys.getsizeof(model_text)
+        return size
+
+    def to_json(self):
+        return json.dumps({
+            "turns": list(self.turns),
+            "summary": self.summary,
+            "last_access": self.last_access
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls([tuple(t) for t in data["turns"]], data["summary"], data["last_access"])
+
+
+def _storage_key(key):
+    """Backend row key for a (user_id, session_id) pair"""
+    return json.dumps(list(key))
+
+
+class SqliteSessionBackend:
+    """
+    Optional local persistence so sessions survive restarts. Saves and touches
+    only update a pending map; a background thread writes it every
+    `flush_interval` seconds in one transaction, so requests never wait on a
+    commit. A crash loses at most the last interval of history.
+    """
+
+    def __init__(self, path, flush_interval=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.flush_interval = Config.SESSION_FLUSH_INTERVAL if flush_interval is None else flush_interval
+
+        # session_id -> (data, or None if only touched, updated_at); `_flushing` is the batch being written
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+        self._purge_before = None
+        self.flushes = 0
+        threading.Thread(target=self._flush_loop, name="session-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def load(self, session_id):
+        with self._pending_lock:
+            data, updated_at = self._pending.get(session_id) or self._flushing.get(session_id) or (None, None)
+        if data is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            data, updated_at = row[0], max(row[1], updated_at or 0)
+        memory = SessionMemory.from_json(data)
+        memory.last_access = updated_at
+        return memory
+
+    def save(self, session_id, data, updated_at):
+        with self._pending_lock:
+            self._pending[session_id] = (data, updated_at)
+
+    def touch(self, session_id, updated_at):
+        with self._pending_lock:
+            data, _ = self._pending.get(session_id, (None, None))
+            self._pending[session_id] = (data, updated_at)
+
+    def delete_expired(self, cutoff):
+        with self._pending_lock:
+            self._purge_before = cutoff
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write pending saves, touches and purges in one transaction"""
+        with self._lock:
+            with self._pending_lock:
+                self._flushing, self._pending = self._pending, {}
+                purge_before, self._purge_before = self._purge_before, None
+            if not self._flushing and purge_before is None:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                [(key, data, at) for key, (data, at) in self._flushing.items() if data is not None]
+            )
+            self._conn.executemany(
+                "UPDATE sessions SET updated_at = MAX(updated_at, ?) WHERE session_id = ?",
+                [(at, key) for key, (data, at) in self._flushing.items() if data is None]
+            )
+            if purge_before is not None:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (purge_before,))
+            self._conn.commit()
+            with self._pending_lock:
+                self._flushing = {}
+            self.flushes += 1
+
+
+class SessionStore:
+    """
+    In-memory LRU of session memories with TTL eviction and an optional
+    persistent backend. Sessions are keyed by (user_id, session_id), so a
+    session ID only ever returns history to the user who created it.
+    """
+
+    def __init__(self, max_sessions, ttl, backend=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.backend = backend
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self._last_purge = time.time()
+
+    def _get(self, key):
+        """Look up a live session, refreshing its LRU position and last access (caller holds the lock)"""
+        memory = self._sessions.get(key)
+        if memory is None and self.backend is not None:
+            memory = self.backend.load(_storage_key(key))
+            if memory is not None:
+                self._sessions[key] = memory
+
+        if memory is None:
+            return None
+
+        if time.time() - memory.last_access > self.ttl:
+            del self._sessions[key]
+            self.evicted_ttl += 1
+            return None
+
+        memory.last_access = time.time()
+        self._sessions.move_to_end(key)
+        return memory
+
+    def _evict(self):
+        """Drop expired sessions from the cold end, then trim to max_sessions (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            key, memory = next(iter(self._sessions.items()))
+            if memory.last_access >= cutoff:
+                break
+            del self._sessions[key]
+            self.evicted_ttl += 1
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted_lru += 1
+
+    def render(self, user_id, session_id):
+        """Conversation context for the user's session, or an empty string for a new one"""
+        if not session_id:
+            return ""
+        key = (user_id, session_id)
+        with self._lock:
+            memory = self._get(key)
+            if memory is None:
+                return ""
+            text = memory.render()
+
+        # A session that is only read must not be purged from the backend either; touches are batched
+        if self.backend is not None:
+            self.backend.touch(_storage_key(key), memory.last_access)
+        return text
+
+    def record_turn(self, user_id, session_id, user_text, model_text):
+        """Add an exchange to the user's session"""
+        if not session_id:
+            return
+        key = (user_id, session_id)
+        with self._lock:
+            memory = self._get(key)
+            if memory is None:
+                memory = SessionMemory()
+                self._sessions[key] = memory
+            memory.add_turn(user_text, model_text)
+            self._evict()
+            data = memory.to_json() if self.backend is not None else None
+
+        if self.backend is not None:
+            self.backend.save(_storage_key(key), data, memory.last_access)
+            # Expired rows are purged at most once a minute
+            if time.time() - self._last_purge > 60:
+                self._last_purge = time.time()
+                self.backend.delete_expired(self._last_purge - self.ttl)
+
+    def stats(self):
+        """Session counts, eviction counters and memory use; no session IDs, which would let readers replay them"""
+        with self._lock:
+            per_session = [memory.approx_bytes() for memory in self._sessions.values()]
+            evicted_lru = self.evicted_lru
+            evicted_ttl = self.evicted_ttl
+
+        total = sum(per_session)
+        largest = sorted(per_session, reverse=True)[:10]
+        return {
+            "sessions": {
+                "active": len(per_session),
+                "max_sessions": self.max_sessions,
+                "evicted_lru": evicted_lru,
+                "evicted_ttl": evicted_ttl,
+                "total_bytes": total,
+                "avg_bytes_per_session": round(total / len(per_session)) if per_session else 0,
+                "largest_sessions_bytes": largest
+            }
+        }
+
+
+session_store = SessionStore(
+    Config.SESSION_MAX_SESSIONS,
+    Config.SESSION_TTL,
+    backend=SqliteSessionBackend(Config.SESSION_STORE_PATH) if Config.SESSION_STORE_PATH else None
+)
@@ -0,0 +1,249 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "mine", "we", "our", "you", "your", "is", "are", "was",
+    "were", "be", "been", "do", "does", "did", "have", "has", "had", "how", "what", "whats",
+    "which", "who", "when", "can", "could", "would", "should", "will", "please", "tell", "show",
+    "give", "much", "many", "of", "on", "in", "at", "for", "with", "about", "by",
+    "and", "or", "this", "that", "these", "those", "it", "its", "so", "far", "there", "any",
+    "some", "am", "s", "let", "know", "see", "up", "out", "all", "currently", "right", "now"
+}
+
+# Direction ("from", "to", "into") and negation words are kept: without them
+# "move $500 from savings to checking" and its reverse, or a question and its
+# negation, would share an answer.
+# Multi-word phrases (matched on whole tokens) and single words mapped onto one
+# canonical token
+PHRASES = {
+    "eating out": "dining",
+    "eat out": "dining",
+    "net worth": "networth",
+    "credit card": "creditcard",
+    "emergency fund": "emergencyfund",
+    "cash back": "cashback"
+}
+SYNONYMS = {
+    "restaurant": "dining", "restaurants": "dining", "food": "dining", "meals": "dining",
+    "spent": "spend", "spending": "spend", "spends": "spend", "expenses": "spend", "expense": "spend",
+    "purchases": "transaction", "purchase": "transaction", "transactions": "transaction",
+    "charges": "transaction", "investments": "invest", "investment": "invest", "investing": "invest",
+    "perks": "perk", "rewards": "perk", "reward": "perk", "benefits": "perk", "offers": "perk",
+    "goals": "goal", "targets": "goal", "savings": "save", "saving": "save", "saved": "save",
+    "debts": "debt", "loans": "loan", "advisors": "advisor", "advisers": "advisor", "adviser": "advisor",
+    "groceries": "grocery", "monthly": "month", "months": "month", "doing": "progress",
+    "portfolio": "invest", "no": "not", "never": "not", "without": "not", "dont": "not",
+    "doesnt": "not", "didnt": "not", "isnt": "not", "arent": "not", "wasnt": "not", "cant": "not",
+    "cannot": "not", "wont": "not", "havent": "not", "hasnt": "not"
+}
+NEGATION = "not"
+PHRASE_TOKENS = {tuple(phrase.split()): token for phrase, token in PHRASES.items()}
+PHRASE_MAX_TOKENS = max(len(phrase) for phrase in PHRASE_TOKENS)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def normalize(query):
+    """Lowercase, canonicalize phrases and synonyms, and drop stopwords"""
+    words = _TOKEN_RE.findall(query.lower().replace("'", "").replace("\u2019", ""))
+    tokens = []
+    i = 0
+    while i < len(words):
+        for size in range(min(PHRASE_MAX_TOKENS, len(words) - i), 1, -1):
+            token = PHRASE_TOKENS.get(tuple(words[i:i + size]))
+            if token is not None:
+                break
+        else:
+            size, token = 1, SYNONYMS.get(words[i], words[i])
+        i += size
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def shingles(query):
+    """Unigrams plus ordered adjacent pairs of the normalized tokens"""
+    tokens = normalize(query)
+    result = set(tokens)
+    for a, b in zip(tokens, tokens[1:]):
+        result.add(f"{a}|{b}")
+    return result
+
+
+def numbers(query):
+    """
+    The numbers a query mentions, canonicalized ("$1,500.00" is "1500"). Two
+    queries only share an answer if these match exactly: "$300 extra a month"
+    and "$1500 extra a month" are near-duplicates by shingles alone.
+    """
+    found = set()
+    for number in _NUMBER_RE.findall(query):
+        number = number.replace(",", "")
+        if "." in number:
+            number = number.rstrip("0").rstrip(".")
+        found.add(number.lstrip("0") or "0")
+    return frozenset(found)
+
+
+def _stable_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+class MinHasher:
+    """MinHash signatures using universal hashing (a * x + b) mod p"""
+
+    def __init__(self, num_perm, seed=1):
+        rng = random.Random(seed)
+        self.params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingle_set):
+        hashes = [_stable_hash(s) for s in shingle_set]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self.params
+        )
+
+
+class CacheEntry:
+    def __init__(self, scope, shingle_set, signature, answer, numbers=frozenset()):
+        self.scope = scope
+        self.shingles = shingle_set
+        self.numbers = numbers
+        self.signature = signature
+        self.answer = answer
+        self.created = time.time()
+
+
+class SimilarityCache:
+    """
+    Answer cache that matches near-duplicate queries.
+    Queries are reduced to shingle sets, MinHash signatures are banded into
+    LSH buckets, and candidates sharing a bucket in the same scope (agent,
+    user, data version) are accepted when their Jaccard similarity reaches
+    the threshold and they mention exactly the same numbers.
+    """
+
+    def __init__(self, threshold, num_perm, bands, max_entries, ttl, enabled=True):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hasher = MinHasher(num_perm)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_time = 0.0
+
+    def _band_keys(self, scope, signature):
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _remove(self, entry_id):
+        """Drop an entry and its bucket references (caller holds the lock)"""
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry.scope, entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def lookup(self, scope, query):
+        """Return the cached answer for a similar query in this scope, or None"""
+        if not self.enabled:
+            return None
+
+        start = time.perf_counter()
+        query_shingles = shingles(query)
+        query_numbers = numbers(query)
+        answer = None
+
+        if query_shingles:
+            signature = self.hasher.signature(query_shingles)
+            with self._lock:
+                candidates = set()
+                for key in self._band_keys(scope, signature):
+                    candidates.update(self._buckets.get(key, ()))
+
+                best_id, best_score = None, 0.0
+                now = time.time()
+                for entry_id in candidates:
+                    entry = self._entries[entry_id]
+                    # One added "not" or a different amount barely moves the similarity but changes the question
+                    if now - entry.created > self.ttl or (NEGATION in query_shingles) != (NEGATION in entry.shingles):
+                        continue
+                    if entry.numbers != query_numbers:
+                        continue
+                    score = len(query_shingles & entry.shingles) / len(query_shingles | entry.shingles)
+                    if score > best_score:
+                        best_id, best_score = entry_id, score
+
+                if best_id is not None and best_score >= self.threshold:
+                    self._entries.move_to_end(best_id)
+                    answer = self._entries[best_id].answer
+
+        with self._lock:
+            self.lookups += 1
+            self.hits += answer is not None
+            self.lookup_time += time.perf_counter() - start
+        return answer
+
+    def store(self, scope, query, answer):
+        """Cache an answer for a query in this scope"""
+        query_shingles = shingles(query)
+        if not self.enabled or not query_shingles:
+            return
+
+        signature = self.hasher.signature(query_shingles)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CacheEntry(scope, query_shingles, signature, answer, numbers(query))
+            for key in self._band_keys(scope, signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        """Hit rate and lookup latency"""
+        with self._lock:
+            return {
+                "similarity_cache": {
+                    "entries": len(self._entries),
+                    "lookups": self.lookups,
+                    "hits": self.hits,
+                    "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0,
+                    "avg_lookup_ms": round(1000 * self.lookup_time / self.lookups, 3) if self.lookups else 0
+                }
+            }
+
+
+answer_cache = SimilarityCache(
+    Config.SIMILARITY_CACHE_THRESHOLD,
+    Config.SIMILARITY_CACHE_NUM_PERM,
+    Config.SIMILARITY_CACHE_BANDS,
+    Config.SIMILARITY_CACHE_MAX_ENTRIES,
+    Config.SIMILARITY_CACHE_TTL,
+    enabled=Config.SIMILARITY_CACHE_ENABLED
+)
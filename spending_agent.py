@@ -1,14 +1,21 @@
 import google.generativeai as genai
 from config import Config
+from degraded_mode import generate_or_degrade
+from llm_gateway import AdmissionRejected
+from model_tiers import TieredModel
+from similarity_cache import answer_cache
 from bank_wrapper import bank_data
+from budget_rules import budget_engine
+from recurring_charges import recurring_charges, recurring_tracker
+from spending_anomalies import anomaly_detector
 import json
 
 # Configure Gemini
 genai.configure(api_key=Config.GOOGLE_API_KEY)
 
-def get_spending_summary():
+def get_spending_summary(user_id=None):
     """Get a summary of recent spending by category"""
-    spending = bank_data.get_spending_by_category(days=30)
+    spending = bank_data.get_spending_by_category(days=30, user_id=user_id)
     total = sum(spending.values())
     
     summary = {
@@ -18,15 +25,15 @@ def get_spending_summary():
     }
     return json.dumps(summary, indent=2)
 
-def get_recent_transactions(limit=10):
+def get_recent_transactions(limit=10, user_id=None):
     """Get recent transactions"""
-    transactions = bank_data.get_transactions(days=30)
+    transactions = bank_data.get_transactions(days=30, user_id=user_id)
     recent = transactions[:limit]
     return json.dumps(recent, indent=2)
 
-def get_monthly_trends():
+def get_monthly_trends(user_id=None):
     """Get spending trends over the last 3 months"""
-    all_transactions = bank_data.get_transactions(days=90)
+    all_transactions = bank_data.get_transactions(days=90, user_id=user_id)
     
     months = {}
     for txn in all_transactions:
@@ -39,6 +46,37 @@ def get_monthly_trends():
     }
     return json.dumps(trends, indent=2)
 
+def get_recurring_charges(user_id=None):
+    """Get subscriptions and other recurring charges across the full history"""
+    charges = recurring_charges(recurring_tracker.summary(user_id))
+    active = [c for c in charges if c["active"]]
+    result = {
+        "recurring_charges": [{k: v for k, v in c.items() if k != "active"} for c in active],
+        "total_monthly_cost": round(sum(c["monthly_cost"] for c in active), 2),
+        "stopped_recurring_charges": [
+            {"merchant": c["merchant"], "cadence": c["cadence"], "last_charge": c["last_charge"]}
+            for c in charges if not c["active"]
+        ]
+    }
+    return json.dumps(result, indent=2)
+
+def get_spending_anomalies(user_id=None):
+    """Get unusually large charges and category spending spikes from the last 30 days"""
+    anomalies = anomaly_detector.anomalies(user_id)
+    result = {
+        "unusual_charges": [a for a in anomalies if a["type"] == "unusual amount"],
+        "category_spikes": [a for a in anomalies if a["type"] == "category spike"]
+    }
+    return json.dumps(result, indent=2)
+
+def get_budget_status(user_id=None):
+    """Get budget rules with this period's spend against each limit, and recent budget alerts"""
+    result = {
+        "budgets": budget_engine.status(user_id),
+        "recent_alerts": budget_engine.alerts(user_id)
+    }
+    return json.dumps(result, indent=2)
+
 class SpendingAgent:
     """Spending specialist agent"""
     
@@ -54,6 +92,9 @@ class SpendingAgent:
         - Suggest areas to reduce expenses
         - Provide insights on transaction patterns
         - Answer questions about recent purchases
+        - Identify subscriptions and recurring bills, their cadence and price changes
+        - Point out unusual charges and sudden spikes in category spending
+        - Track budgets: spend against each limit this period, and alerts when a limit is near or exceeded
         
         When responding:
         1. Use the data provided to give accurate spending information
@@ -62,27 +103,44 @@ class SpendingAgent:
         4. Be concise but thorough in your analysis
         5. Always maintain a helpful and encouraging tone
         
+        When a budget rule was just created from the user's request, confirm it with its current spend;
+        if it was rejected, explain why.
+        
         If asked about something outside spending/transactions, politely explain your specialization.
         """
         
-        self.model = genai.GenerativeModel(
-            model_name=Config.MODEL_NAME,
-            system_instruction=self.instruction
-        )
+        # One model per tier; each query picks one (model_tiers.py)
+        self.models = TieredModel(self.name, self.instruction)
         
         self.tools = {
             'get_spending_summary': get_spending_summary,
             'get_recent_transactions': get_recent_transactions,
-            'get_monthly_trends': get_monthly_trends
+            'get_monthly_trends': get_monthly_trends,
+            'get_recurring_charges': get_recurring_charges,
+            'get_spending_anomalies': get_spending_anomalies,
+            'get_budget_status': get_budget_status
         }
     
-    def process_query(self, query):
-        """Process a user query"""
+    def process_query(self, query, history=None, user_id=None):
+        """Process a user query, with the conversation so far if there is one"""
         try:
+            # "Tell me when dining exceeds $400 this month" creates a rule before anything else
+            rule_change = budget_engine.rule_from_query(query, user_id)
+            
+            # Near-duplicate questions from the same user on the same data and budget rules reuse an answer
+            cache_scope = (self.name, user_id, bank_data.get_data_version(user_id), budget_engine.rules_version(user_id))
+            cached = answer_cache.lookup(cache_scope, query) if rule_change is None else None
+            if cached is not None:
+                return cached
+            
             # Get all data upfront
-            spending_data = get_spending_summary()
-            transactions = get_recent_transactions()
-            trends = get_monthly_trends()
+            spending_data = get_spending_summary(user_id=user_id)
+            transactions = get_recent_transactions(user_id=user_id)
+            trends = get_monthly_trends(user_id=user_id)
+            recurring = get_recurring_charges(user_id=user_id)
+            anomalies = get_spending_anomalies(user_id=user_id)
+            budgets = get_budget_status(user_id=user_id)
+            sections = {"Spending Summary": spending_data, "Recent Transactions": transactions, "Monthly Trends": trends, "Recurring Charges": recurring, "Unusual Activity": anomalies, "Budgets": budgets}
             
             # Create context with data
             context = f"""
@@ -99,12 +157,43 @@ Recent Transactions:
 Monthly Trends:
 {trends}
 
+Recurring Charges:
+{recurring}
+
+Unusual Activity:
+{anomalies}
+
+Budgets:
+{budgets}
+
 Please provide a helpful response based on this data. Be specific and actionable.
 """
             
-            response = self.model.generate_content(context)
-            return response.text
+            if rule_change is not None:
+                outcome, detail = rule_change
+                rule_text = json.dumps(detail, indent=2) if outcome == "created" else detail
+                context = f"\nBudget Rule {outcome.capitalize()}:\n{rule_text}\n" + context
+                sections = {f"Budget rule {outcome}": rule_text, **sections}
+            
+            if history:
+                context = f"\nConversation So Far:\n{history}\n" + context
+            
+            # Simple questions go to the fast model tier, multi-step analysis to the strong one
+            tier, model = self.models.select(query, history)
+            
+            # Past the deadline or with the breaker open, answer from the data alone
+            # Once a rule has changed, a busy model degrades rather than returning a 429 to retry
+            response_text, degraded = generate_or_degrade(
+                model, context, self.name, sections, tier=tier, changed=rule_change is not None
+            )
+            
+            # Only answers that didn't lean on earlier turns or change rules are safe to reuse
+            if not history and not degraded and rule_change is None:
+                answer_cache.store(cache_scope, query, response_text)
+            return response_text
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             return f"Error processing query: {str(e)}"
 
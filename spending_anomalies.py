@@ -0,0 +1,403 @@
+"""
+Streaming detection of unusual charges and category spikes.
+
+Each (user, merchant) and (user, category) key holds a few numbers in flat
+slot arrays: an exponentially weighted mean and variance of log amounts of
+charges (refunds are left out, as in recurring_charges), and for categories
+the open week's net total with an exponentially weighted mean and
+variance of past weekly totals. The first values of a key are averaged
+plainly (the weight is 1/n until it drops to ANOMALY_ALPHA), so a key warms up
+like a running mean and then follows drift. A charge is scored against its
+merchant's state before the charge updates it, or against its category's
+while the merchant has fewer than ANOMALY_WARMUP charges; a week's running
+category total is checked every time it grows.
+
+Charges arrive in day order. A batch is updated in rounds: round r holds the
+r-th charge of every key in the batch, so no key appears twice in a round and
+each round is a handful of whole-array NumPy operations. A feed spread over
+many users and merchants takes few rounds however many rows it has.
+
+The detector keeps the users whose history it has read, each tagged with the
+data version it saw, like recurring_charges.RecurringTracker: ingest passes it
+newly written rows, and back-dated rows or an unseen version make it read the
+user's history again on the next query. That read happens outside the lock,
+so one cold user does not hold up other users' queries or ingest. Keys are
+built from user and name codes that are handed back when a user is forgotten,
+so the codes stay bounded by the users and names currently held.
+"""
+import threading
+from collections import OrderedDict, deque
+from datetime import date, timedelta
+
+import numpy as np
+
+from bank_wrapper import bank_data
+from config import Config
+from recurring_charges import transaction_columns
+
+EPOCH = date(1970, 1, 1)
+# Smallest spread assumed for log amounts, so fixed-price charges need about a 20% change to stand out
+LOG_SPREAD_FLOOR = 0.05
+# Smallest spread of weekly category totals, relative to their mean
+WEEKLY_SPREAD_FLOOR = 0.25
+# Empty weeks folded into a category's weekly statistics after a gap, at most
+MAX_EMPTY_WEEKS = 26
+
+# Keys are user code * NAME_CODES + name code; user codes are reused, so they stay far below 2^31
+NAME_CODES = 1 << 32
+
+MERCHANT_FIELDS = ["n", "mean", "var"]
+CATEGORY_FIELDS = ["n", "mean", "var", "week", "total", "weeks", "week_mean", "week_var", "flagged"]
+
+
+def ewma_step(n, mean, var, x, alpha):
+    """Exponentially weighted mean and variance after one more value, plain running ones while n < 1/alpha"""
+    weight = np.maximum(alpha, 1 / (n + 1))
+    diff = x - mean
+    mean = mean + weight * diff
+    var = (1 - weight) * (var + weight * diff * diff)
+    return n + 1, mean, var
+
+
+class Codes:
+    """
+    Integer codes for values, counting holders so a code is freed and reused
+    once nothing holds its value. While no code is free, the codes in use are
+    exactly 0 .. len - 1
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.refs = {}
+        self.free = []
+
+    def __len__(self):
+        return len(self.codes)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.free.pop() if self.free else len(self.codes)
+            self.codes[value] = code
+        return code
+
+    def hold(self, values):
+        for value in values:
+            self.code(value)
+            self.refs[value] = self.refs.get(value, 0) + 1
+
+    def release(self, values):
+        for value in values:
+            self.refs[value] -= 1
+            if not self.refs[value]:
+                del self.refs[value]
+                self.free.append(self.codes.pop(value))
+
+
+def encode(codes, values):
+    """Integer code of each value, giving new values a code from `codes`"""
+    distinct = list(dict.fromkeys(values))
+    index = {value: i for i, value in enumerate(distinct)}
+    known = np.array([codes.code(value) for value in distinct], dtype=np.int64)
+    return known[np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))]
+
+
+def day_order(days, merchants, categories, amounts):
+    """Columns sorted into day order, ties kept in their given order"""
+    order = np.argsort(days, kind="stable")
+    return (
+        np.asarray(days, dtype=np.int64)[order], [merchants[i] for i in order],
+        [categories[i] for i in order], np.asarray(amounts, dtype=float)[order]
+    )
+
+
+def rounds(slots):
+    """Row indices split into rounds holding each slot at most once, in order of occurrence"""
+    order = np.argsort(slots, kind="stable")
+    ordered = slots[order]
+    starts = np.flatnonzero(np.concatenate([[True], ordered[1:] != ordered[:-1]]))
+    rank = np.empty(len(slots), dtype=np.int64)
+    rank[order] = np.arange(len(slots)) - np.repeat(starts, np.diff(np.append(starts, len(slots))))
+    by_rank = np.argsort(rank, kind="stable")
+    return np.split(by_rank, np.cumsum(np.bincount(rank))[:-1])
+
+
+class SlotTable:
+    """
+    Float arrays of per-key state, grown by doubling, with freed slots reused.
+    Keys are int64 codes, kept sorted with their slots so a batch's keys are
+    found with one searchsorted
+    """
+
+    def __init__(self, fields, fill=None):
+        self.fill = {field: 0.0 for field in fields}
+        self.fill.update(fill or {})
+        self.arrays = {field: np.full(1024, value) for field, value in self.fill.items()}
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.key_slots = np.zeros(0, dtype=np.int64)
+        self.free = np.zeros(0, dtype=np.int64)
+        self.allocated = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, field):
+        return self.arrays[field]
+
+    def _find(self, keys):
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    def lookup(self, keys):
+        """Slot of each key, allocating cleared slots for new ones"""
+        positions, found = self._find(keys)
+        if found.all():
+            return self.key_slots[positions]
+        new = np.unique(keys[~found])
+        reused = min(len(self.free), len(new))
+        slots = np.concatenate([
+            self.free[len(self.free) - reused:],
+            np.arange(self.allocated, self.allocated + len(new) - reused)
+        ])
+        self.free = self.free[:len(self.free) - reused]
+        self.allocated += len(new) - reused
+        while self.allocated > len(self.arrays["n"]):
+            for field, values in self.arrays.items():
+                self.arrays[field] = np.concatenate([values, np.full(len(values), self.fill[field])])
+        merged = np.concatenate([self.keys, new])
+        order = np.argsort(merged, kind="stable")
+        self.keys, self.key_slots = merged[order], np.concatenate([self.key_slots, slots])[order]
+        return self.key_slots[np.searchsorted(self.keys, keys)]
+
+    def release(self, keys):
+        positions, found = self._find(np.asarray(keys, dtype=np.int64))
+        positions = positions[found]
+        freed = self.key_slots[positions]
+        for field, value in self.fill.items():
+            self.arrays[field][freed] = value
+        self.free = np.concatenate([self.free, freed])
+        self.keys = np.delete(self.keys, positions)
+        self.key_slots = np.delete(self.key_slots, positions)
+
+
+class AnomalyDetector:
+    """Online amount and weekly-spend statistics per (user, merchant) and (user, category)"""
+
+    def __init__(self, bank=None, max_users=None):
+        self.bank = bank or bank_data
+        self.max_users = max_users or Config.ANOMALY_TRACKER_USERS
+        self.merchants = SlotTable(MERCHANT_FIELDS)
+        self.categories = SlotTable(CATEGORY_FIELDS, {"week": -1, "flagged": -1})
+        # Keys are user code * NAME_CODES + merchant or category code
+        self.user_codes = Codes()
+        self.name_codes = Codes()
+        # user_id -> {"version", "last_day", "merchants", "categories", "anomalies"}
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.flagged = 0
+        self.rebuilds = 0
+
+    def update(self, users, days, merchants, categories, amounts):
+        """
+        Score and absorb charges given as columns in day order, returning
+        the anomalies found as (row, record) pairs in row order
+        """
+        days = np.asarray(days, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=float)
+        # Refunds and other non-positive amounts count toward weekly totals but not amount statistics
+        charge = amounts > 0
+        log_amounts = np.log1p(np.maximum(amounts, 0))
+        user_keys = encode(self.user_codes, users) * NAME_CODES
+        merchant_slots = self.merchants.lookup(user_keys + encode(self.name_codes, merchants))
+        category_slots = self.categories.lookup(user_keys + encode(self.name_codes, categories))
+        alpha = Config.ANOMALY_ALPHA
+        z = Config.ANOMALY_Z
+
+        # Merchant amounts
+        merchant_score = np.zeros(len(days))
+        merchant_warm = np.zeros(len(days), dtype=bool)
+        expected = np.zeros(len(days))
+        m = self.merchants
+        for rows in rounds(merchant_slots):
+            s = merchant_slots[rows]
+            n, mean, var = m["n"][s], m["mean"][s], m["var"][s]
+            merchant_warm[rows] = n >= Config.ANOMALY_WARMUP
+            merchant_score[rows] = (log_amounts[rows] - mean) / np.sqrt(var + LOG_SPREAD_FLOOR ** 2)
+            expected[rows] = np.expm1(mean)
+            k = charge[rows]
+            n, mean, var = ewma_step(n[k], mean[k], var[k], log_amounts[rows][k], alpha)
+            m["n"][s[k]], m["mean"][s[k]], m["var"][s[k]] = n, mean, var
+
+        # Category amounts and weekly totals
+        category_score = np.zeros(len(days))
+        category_warm = np.zeros(len(days), dtype=bool)
+        spikes = []
+        c = self.categories
+        weeks = days // 7
+        for rows in rounds(category_slots):
+            s = category_slots[rows]
+            n, mean, var = c["n"][s], c["mean"][s], c["var"][s]
+            category_warm[rows] = n >= Config.ANOMALY_WARMUP
+            category_score[rows] = (log_amounts[rows] - mean) / np.sqrt(var + LOG_SPREAD_FLOOR ** 2)
+            expected[rows] = np.where(merchant_warm[rows], expected[rows], np.expm1(mean))
+            k = charge[rows]
+            n, mean, var = ewma_step(n[k], mean[k], var[k], log_amounts[rows][k], alpha)
+            c["n"][s[k]], c["mean"][s[k]], c["var"][s[k]] = n, mean, var
+
+            # A charge in a later week closes the open one, then folds in any empty weeks between
+            week, open_week, total = weeks[rows], c["week"][s], c["total"][s]
+            closing = np.flatnonzero((week > open_week) & (open_week >= 0))
+            if len(closing):
+                cs = s[closing]
+                count, week_mean, week_var = ewma_step(
+                    c["weeks"][cs], c["week_mean"][cs], c["week_var"][cs], total[closing], alpha
+                )
+                empty = np.minimum(week[closing] - open_week[closing] - 1, MAX_EMPTY_WEEKS)
+                for k in range(int(empty.max())):
+                    more = empty > k
+                    count[more], week_mean[more], week_var[more] = ewma_step(
+                        count[more], week_mean[more], week_var[more], 0.0, alpha
+                    )
+                c["weeks"][cs], c["week_mean"][cs], c["week_var"][cs] = count, week_mean, week_var
+            total = np.where(week > open_week, amounts[rows], total + amounts[rows])
+            c["week"][s], c["total"][s] = np.maximum(week, open_week), total
+
+            weeks_seen, week_mean = c["weeks"][s], c["week_mean"][s]
+            spread = np.sqrt(np.maximum(c["week_var"][s], (WEEKLY_SPREAD_FLOOR * week_mean) ** 2))
+            spiking = (
+                (weeks_seen >= Config.ANOMALY_WARMUP) & (c["flagged"][s] != week)
+                & (total > week_mean + z * spread) & (total - week_mean >= Config.ANOMALY_MIN_AMOUNT)
+            )
+            for i in np.flatnonzero(spiking):
+                row = int(rows[i])
+                spikes.append((row, {
+                    "type": "category spike",
+                    "category": categories[row],
+                    "week_of": (EPOCH + timedelta(days=int(week[i]) * 7)).isoformat(),
+                    "week_total": round(float(total[i]), 2),
+                    "typical_week": round(float(week_mean[i]), 2),
+                    "score": round(float((total[i] - week_mean[i]) / spread[i]), 1)
+                }))
+            c["flagged"][s[spiking]] = week[spiking]
+
+        # Unusually large charges, judged by the merchant once it has a history and by the category before
+        score = np.where(merchant_warm, merchant_score, category_score)
+        unusual = (
+            (merchant_warm | category_warm) & (score >= z)
+            & (amounts - expected >= Config.ANOMALY_MIN_AMOUNT)
+        )
+        found = [
+            (int(row), {
+                "type": "unusual amount",
+                "date": (EPOCH + timedelta(days=int(days[row]))).isoformat(),
+                "merchant": merchants[row],
+                "category": categories[row],
+                "amount": round(float(amounts[row]), 2),
+                "typical_amount": round(float(expected[row]), 2),
+                "compared_with": "merchant" if merchant_warm[row] else "category",
+                "score": round(float(score[row]), 1)
+            })
+            for row in np.flatnonzero(unusual)
+        ]
+        self.rows += len(days)
+        self.flagged += len(found) + len(spikes)
+        return sorted(found + spikes, key=lambda pair: pair[0])
+
+    def _forget(self, user_id):
+        held = self._users.pop(user_id, None)
+        if held is not None:
+            user_key = self.user_codes.codes[user_id] * NAME_CODES
+            self.merchants.release([user_key + self.name_codes.codes[name] for name in held["merchants"]])
+            self.categories.release([user_key + self.name_codes.codes[name] for name in held["categories"]])
+            self.name_codes.release(held["merchants"])
+            self.name_codes.release(held["categories"])
+            self.user_codes.release([user_id])
+
+    def _hold(self, user_id, version):
+        """A new, empty entry for a user (caller holds the lock)"""
+        self.user_codes.hold([user_id])
+        return {
+            "version": version, "last_day": -1, "merchants": set(), "categories": set(),
+            "anomalies": deque(maxlen=Config.ANOMALY_MAX_PER_USER)
+        }
+
+    def _absorb(self, user_id, held, days, merchants, categories, amounts):
+        """Run a user's new charges, in day order, through update (caller holds the lock)"""
+        for names, column in ((held["merchants"], merchants), (held["categories"], categories)):
+            added = set(column) - names
+            self.name_codes.hold(added)
+            names |= added
+        for _, record in self.update([user_id] * len(days), days, merchants, categories, amounts):
+            held["anomalies"].append(record)
+        if len(days):
+            held["last_day"] = max(held["last_day"], int(days[-1]))
+
+    def anomalies(self, user_id=None, days=None):
+        """A user's anomalies from the last `days` days, newest first, reading their history if it is not current"""
+        user_id = user_id or self.bank.default_user_id
+        days = days or Config.ANOMALY_LOOKBACK_DAYS
+        version = self.bank.get_data_version(user_id)
+        columns = None
+        while True:
+            with self._lock:
+                held = self._users.get(user_id)
+                stale = held is None or held["version"] != version
+                if stale and columns is not None:
+                    self._forget(user_id)
+                    held = self._hold(user_id, version)
+                    self._absorb(user_id, held, *columns)
+                    self._users[user_id] = held
+                    self.rebuilds += 1
+                    while len(self._users) > self.max_users:
+                        self._forget(next(iter(self._users)))
+                    stale = False
+                if not stale:
+                    self._users.move_to_end(user_id)
+                    cutoff = (date.today() - timedelta(days=days)).isoformat()
+                    recent = [a for a in held["anomalies"] if a.get("date", a.get("week_of")) >= cutoff]
+                    return recent[::-1]
+            # Read and sort the history outside the lock, so other users' queries and
+            # ingest are not held up; only absorbing it needs the lock
+            columns = day_order(*transaction_columns(
+                self.bank.get_transactions(days=Config.RECURRING_HISTORY_DAYS, user_id=user_id)
+            ))
+
+    def tracked(self, user_id):
+        with self._lock:
+            return user_id in self._users
+
+    def observe(self, user_id, days, merchants, categories, amounts, old_version, new_version):
+        """
+        Score charges just written for a user, if the detector has read exactly
+        the data before the write; otherwise forget the user so the next query reads it again
+        """
+        days, merchants, categories, amounts = day_order(days, list(merchants), list(categories), amounts)
+        with self._lock:
+            held = self._users.get(user_id)
+            if held is None:
+                return
+            if held["version"] != old_version or (len(days) and int(days[0]) < held["last_day"]):
+                # Back-dated charges would have changed the statistics they came before
+                self._forget(user_id)
+                return
+            self._absorb(user_id, held, days, merchants, categories, amounts)
+            held["version"] = new_version
+
+    def stats(self):
+        with self._lock:
+            return {
+                "anomaly_detector": {
+                    "users": len(self._users),
+                    "merchant_keys": len(self.merchants),
+                    "category_keys": len(self.categories),
+                    "rows": self.rows,
+                    "flagged": self.flagged,
+                    "rebuilds": self.rebuilds
+                }
+            }
+
+
+anomaly_detector = AnomalyDetector()
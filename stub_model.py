@@ -0,0 +1,69 @@
+import random
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from config import Config
+
+# Keywords the stub uses to answer routing prompts like the orchestrator would
+ROUTING_KEYWORDS = {
+    "SPENDING": ["spend", "transaction", "expense", "budget", "purchase", "grocer"],
+    "GOALS": ["goal", "saving", "target", "trip", "vacation", "emergency fund"],
+    "PORTFOLIO": ["invest", "net worth", "debt", "loan", "portfolio", "allocation"],
+    "PERKS": ["perk", "reward", "cashback", "benefit", "offer"],
+    "ADVISORS": ["advisor", "meeting", "appointment", "retirement planning"]
+}
+
+
+class StubUsage:
+    """Token counts like a Gemini response's usage_metadata, at about 4 characters a token"""
+
+    def __init__(self, prompt, text):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class StubResponse:
+    """Minimal stand-in for a Gemini response object"""
+
+    def __init__(self, text, prompt=""):
+        self.text = text
+        self.usage_metadata = StubUsage(prompt, text)
+
+
+class StubModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+    Sleeps for a configurable latency and fails at a configurable rate so that
+    timeouts, hedging and circuit breaking can be exercised without an API key.
+    """
+
+    def __init__(self, model_name, system_instruction=None, latency=None, jitter=None, failure_rate=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.latency = Config.STUB_MODEL_LATENCY if latency is None else latency
+        self.jitter = Config.STUB_MODEL_JITTER if jitter is None else jitter
+        self.failure_rate = Config.STUB_MODEL_FAILURE_RATE if failure_rate is None else failure_rate
+
+    def generate_content(self, prompt, request_options=None):
+        """Return a canned response after simulated latency"""
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if random.random() < self.failure_rate:
+            raise google_exceptions.ServiceUnavailable("Stub model failure")
+
+        if "SPECIALIST AGENTS" in self.system_instruction:
+            return StubResponse(self._route(prompt), self.system_instruction + prompt)
+
+        return StubResponse(
+            f"[{self.model_name} stub] Received {len(prompt)} characters of context.", self.system_instruction + prompt
+        )
+
+    def _route(self, prompt):
+        """Pick every specialist whose keywords appear, defaulting to SPENDING"""
+        text = prompt.lower()
+        matches = [
+            agent_name for agent_name, keywords in ROUTING_KEYWORDS.items()
+            if any(keyword in text for keyword in keywords)
+        ]
+        return ", ".join(matches) or "SPENDING"
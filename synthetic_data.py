@@ -0,0 +1,486 @@
+"""
+Seeded, vectorized synthetic banking data.
+
+Usage:
+    python synthetic_data.py --users 100000 --output data/synthetic
+    python synthetic_data.py --users 1000 --years 5 --seed 7 --end-date 2026-06-30 --output data/small
+    python synthetic_data.py --users 100000 --output data/bank --publish
+
+With --publish the output directory is a columnar_store root: the dataset is
+written as a new version there and then made the live one.
+
+Users are generated in fixed blocks, each drawn from its own seed stream
+(SeedSequence(seed, spawn_key=(stream, block))), so the same seed, user
+count and end date always produce the same dataset. Every block samples
+all of its users at once with NumPy:
+- discretionary purchases: a Poisson number per user, spread over the date
+  range, categories from a per-user Dirichlet preference, lognormal amounts
+  scaled by a per-user spend level
+- recurring bills and subscriptions on a fixed day of each month
+- daily holdings values per position, following shared market paths
+- goals, debts and active perks
+
+A first pass draws only the per-user parameters and row counts, so every
+output array is allocated at its final size up front. The second pass fills
+it one block at a time, which keeps memory bounded by the block size.
+
+Output directory layout:
+    meta.json                      dataset description; written last, so its presence marks a complete dataset
+    users.jsonl                    one line per user: profile, goals, debts, active perk IDs
+    user_ids.npy                   sorted fixed-width user IDs, row i is user i
+    user_offsets.npy               int64 (users + 1); user i's users.jsonl line is bytes offsets[i]:offsets[i + 1]
+    transactions/offsets.npy       int64 (users + 1); user i's rows are offsets[i]:offsets[i + 1], newest first
+    transactions/day.npy           int32 days since 1970-01-01
+    transactions/merchant.npy      uint16 index into meta["merchants"]
+    transactions/category.npy      uint8 index into meta["categories"]
+    transactions/amount_cents.npy  int32
+    holdings/day.npy               int32 trading days since 1970-01-01
+    holdings/values.npy            float32 (users, positions, days)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+DEFAULT_SEED = 42
+DEFAULT_YEARS = 3
+BLOCK_USERS = 1024
+EPOCH = date(1970, 1, 1)
+
+# Discretionary merchants per category with typical purchase size (lognormal mu, sigma)
+# and how often the category is used relative to the others
+CATEGORIES = {
+    "Groceries": (["Whole Foods", "Trader Joe's", "Safeway", "Costco"], np.log(65), 0.5, 0.24),
+    "Dining": (["Chipotle", "Starbucks", "Local Cafe", "Pizza Place", "Sushi Bar"], np.log(22), 0.6, 0.30),
+    "Transportation": (["Uber", "Gas Station", "Public Transit", "Parking Garage"], np.log(28), 0.6, 0.16),
+    "Entertainment": (["Movie Theater", "Concert Hall", "Bowling Alley", "Steam"], np.log(30), 0.7, 0.07),
+    "Utilities": ([], 0.0, 0.0, 0.0),
+    "Shopping": (["Amazon", "Target", "Best Buy", "Home Depot"], np.log(55), 0.9, 0.20),
+    "Travel": (["Delta Airlines", "Marriott", "Airbnb"], np.log(320), 0.7, 0.03)
+}
+
+# Monthly bills: merchant, category, base amount, relative month-to-month variation, share of users
+RECURRING = [
+    ("Netflix", "Entertainment", 15.49, 0.0, 0.6),
+    ("Spotify", "Entertainment", 10.99, 0.0, 0.5),
+    ("Electric Company", "Utilities", 95.0, 0.2, 0.95),
+    ("Water Utility", "Utilities", 40.0, 0.15, 0.9),
+    ("Internet Provider", "Utilities", 65.0, 0.0, 0.9),
+    ("City Gym", "Entertainment", 39.0, 0.0, 0.3)
+]
+
+# Annual drift, annual volatility and market beta per asset class
+ASSET_CLASSES = {
+    "Stocks": (0.09, 0.18, 0.9),
+    "Bonds": (0.03, 0.06, -0.2),
+    "Real Estate": (0.06, 0.14, 0.6),
+    "Cash": (0.02, 0.005, 0.0)
+}
+TARGET_ALLOCATION = np.array([5.5, 2.7, 1.1, 0.7])
+
+GOAL_TEMPLATES = [
+    ("Emergency Fund", 3000, 30000, 6, 24),
+    ("Vacation", 1500, 9000, 4, 18),
+    ("Down Payment", 20000, 120000, 24, 84),
+    ("New Car", 8000, 40000, 12, 48),
+    ("Home Renovation", 5000, 50000, 12, 60),
+    ("Wedding", 10000, 40000, 9, 36)
+]
+# Debt type, share of users, balance range, interest rate range, amortization months (0 = revolving)
+DEBT_TEMPLATES = [
+    ("Credit Card", 0.7, 500, 15000, 15.0, 27.0, 0),
+    ("Student Loan", 0.35, 5000, 80000, 3.5, 7.5, 120),
+    ("Auto Loan", 0.4, 5000, 40000, 3.0, 9.0, 60),
+    ("Mortgage", 0.25, 80000, 600000, 3.0, 7.0, 360)
+]
+
+CATEGORY_NAMES = list(CATEGORIES)
+MERCHANTS = [(m, c) for c, (names, *_) in CATEGORIES.items() for m in names]
+MERCHANTS += [(m, c) for m, c, *_ in RECURRING]
+POSITIONS = list(ASSET_CLASSES)
+
+
+def to_day(value):
+    """Days since 1970-01-01 for a date"""
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    """Date for days since 1970-01-01"""
+    return EPOCH + timedelta(days=int(day))
+
+
+def market_paths(rng, days, positions=POSITIONS):
+    """Correlated geometric Brownian motion growth paths, shaped (positions, days), starting at 1"""
+    market = rng.standard_normal(days - 1)
+    paths = np.empty((len(positions), days))
+    for p, position in enumerate(positions):
+        drift, volatility, beta = ASSET_CLASSES.get(position, (0.04, 0.1, 0.5))
+        shocks = beta * market + np.sqrt(1 - beta ** 2) * rng.standard_normal(days - 1)
+        daily = (drift - volatility ** 2 / 2) / 252 + volatility / np.sqrt(252) * shocks
+        paths[p] = np.exp(np.concatenate([[0.0], np.cumsum(daily)]))
+    return paths
+
+
+class SyntheticBank:
+    """Deterministic generator of per-user banking data"""
+
+    def __init__(self, seed=DEFAULT_SEED, years=DEFAULT_YEARS, end_date=None, perk_ids=()):
+        self.seed = seed
+        self.years = years
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=round(365.25 * years))
+        self.first_day = to_day(self.start_date)
+        self.days = to_day(self.end_date) - self.first_day + 1
+        self.perk_ids = list(perk_ids)
+
+        # First of every month in the range, for recurring bills
+        months = np.arange(
+            np.datetime64(self.start_date, "M"), np.datetime64(self.end_date, "M") + 1
+        )
+        self.month_starts = (months.astype("datetime64[D]") - np.datetime64(EPOCH)).astype(np.int64)
+
+        holding_days = np.arange(np.datetime64(self.start_date), np.datetime64(self.end_date) + 1)
+        holding_days = holding_days[np.is_busday(holding_days)]
+        self.holding_days = (holding_days - np.datetime64(EPOCH)).astype(np.int32)
+        self.paths = market_paths(self._rng(9, 0), len(self.holding_days))
+
+        self.category_weights = np.array([c[3] for c in CATEGORIES.values()])
+        self.category_mu = np.array([c[1] for c in CATEGORIES.values()])
+        self.category_sigma = np.array([c[2] for c in CATEGORIES.values()])
+        counts = np.array([len(c[0]) for c in CATEGORIES.values()])
+        self.category_first_merchant = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.category_merchants = counts
+        self.recurring_merchant = np.array(
+            [MERCHANTS.index((m, c)) for m, c, *_ in RECURRING], dtype=np.uint16
+        )
+        self.recurring_category = np.array([CATEGORY_NAMES.index(r[1]) for r in RECURRING], dtype=np.uint8)
+
+    def _rng(self, stream, block):
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(stream, block)))
+
+    def num_blocks(self, users):
+        return -(-users // BLOCK_USERS)
+
+    def block_size(self, users, block):
+        return min(BLOCK_USERS, users - block * BLOCK_USERS)
+
+    def user_params(self, block, n):
+        """Per-user spending parameters and transaction counts for one block"""
+        rng = self._rng(0, block)
+        params = {
+            "spend_scale": rng.lognormal(0.0, 0.4, n),
+            "preferences": rng.dirichlet(self.category_weights[self.category_weights > 0] * 20, n),
+            "has_bill": rng.random((n, len(RECURRING))) < np.array([r[4] for r in RECURRING]),
+            "bill_day": rng.integers(1, 29, (n, len(RECURRING))),
+            "bill_scale": rng.lognormal(0.0, 0.25, (n, len(RECURRING)))
+        }
+        daily_rate = rng.lognormal(np.log(1.3), 0.35, n)
+        params["discretionary"] = rng.poisson(daily_rate * self.days)
+
+        # Bill dates: the user's billing day in every month of the range
+        bill_days = self.month_starts[None, None, :] + params["bill_day"][:, :, None] - 1
+        params["bill_dates"] = bill_days
+        params["bill_valid"] = (
+            params["has_bill"][:, :, None]
+            & (bill_days >= self.first_day)
+            & (bill_days < self.first_day + self.days)
+        )
+        params["counts"] = params["discretionary"] + params["bill_valid"].sum(axis=(1, 2))
+        return params
+
+    def transactions(self, block, n):
+        """Transaction columns for one block, sorted by user and newest first, with per-user counts"""
+        params = self.user_params(block, n)
+        rng = self._rng(1, block)
+        kinds = len(RECURRING) + 1
+
+        # Sort only packed (user, days before the end, kind) keys; kind 0 is a discretionary
+        # purchase and k > 0 is bill k - 1. Everything else is drawn after sorting.
+        users = np.repeat(np.arange(n, dtype=np.int64), params["discretionary"])
+        days_back = rng.integers(0, self.days, users.size)
+        bill_user, bill_kind, bill_month = np.nonzero(params["bill_valid"])
+        bill_back = self.first_day + self.days - 1 - params["bill_dates"][bill_user, bill_kind, bill_month]
+        keys = np.sort(np.concatenate([
+            (users * self.days + days_back) * kinds,
+            (bill_user * self.days + bill_back) * kinds + bill_kind + 1
+        ]))
+        user, rest = np.divmod(keys, self.days * kinds)
+        back, kind = np.divmod(rest, kinds)
+        rows = keys.size
+        purchase = kind == 0
+
+        # Purchases: category from the user's preferences, merchant within the category, lognormal amount.
+        # Offsetting each user's cumulative weights by the user index turns the draw into one searchsorted.
+        active_categories = np.flatnonzero(self.category_weights > 0)
+        cumulative = np.cumsum(params["preferences"], axis=1)
+        cumulative[:, -1] = 1.0
+        bounds = (cumulative + np.arange(n)[:, None]).ravel()
+        purchase_user = user[purchase]
+        choice = np.searchsorted(bounds, purchase_user + rng.random(purchase_user.size), side="right")
+        categories = active_categories[np.minimum(choice - purchase_user * len(active_categories),
+                                                  len(active_categories) - 1)]
+        merchants = self.category_first_merchant[categories] + (
+            rng.random(categories.size) * self.category_merchants[categories]
+        ).astype(np.int64)
+        amounts = np.exp(
+            self.category_mu[categories] + self.category_sigma[categories] * rng.standard_normal(categories.size)
+        ) * params["spend_scale"][purchase_user]
+
+        # Bills: fixed merchant, per-user amount with optional month-to-month variation
+        bill = kind[~purchase] - 1
+        bill_user = user[~purchase]
+        variation = np.array([r[3] for r in RECURRING])[bill]
+        bill_amounts = (
+            np.array([r[2] for r in RECURRING])[bill]
+            * params["bill_scale"][bill_user, bill] ** (variation > 0)
+            * (1 + variation * rng.standard_normal(bill.size))
+        )
+
+        merchant = np.empty(rows, dtype=np.uint16)
+        category = np.empty(rows, dtype=np.uint8)
+        amount = np.empty(rows)
+        merchant[purchase], merchant[~purchase] = merchants, self.recurring_merchant[bill]
+        category[purchase], category[~purchase] = categories, self.recurring_category[bill]
+        amount[purchase], amount[~purchase] = amounts, bill_amounts
+        columns = {
+            "day": (self.first_day + self.days - 1 - back).astype(np.int32),
+            "merchant": merchant,
+            "category": category,
+            "amount_cents": np.maximum(np.round(amount * 100), 1).astype(np.int32)
+        }
+        return columns, params["counts"]
+
+    def holdings(self, block, n):
+        """Daily values per position, shaped (users, positions, days), ending at each user's balance"""
+        rng = self._rng(2, block)
+        total = rng.lognormal(np.log(40000), 1.0, n)
+        allocation = rng.dirichlet(TARGET_ALLOCATION * 3, n)
+        current = total[:, None] * allocation
+        growth = self.paths / self.paths[:, -1:]
+        return (current[:, :, None] * growth[None, :, :]).astype(np.float32)
+
+    def records(self, block, first_user, n, digits=7):
+        """Profile, goals, debts and active perks for one block of users"""
+        rng = self._rng(3, block)
+        end = np.datetime64(self.end_date, "D")
+
+        # Goals: a random ordering of the templates per user, keeping the first goal_counts
+        goal_counts = rng.integers(1, 5, n)
+        picks = np.argsort(rng.random((n, len(GOAL_TEMPLATES))), axis=1)[:, :4]
+        template = np.array([t[1:] for t in GOAL_TEMPLATES], dtype=np.float64)[picks]
+        low, high, min_months, max_months = np.moveaxis(template, -1, 0)
+        target = np.round(low + (high - low) * rng.random(picks.shape), -2)
+        months = np.floor(min_months + (max_months - min_months + 1) * rng.random(picks.shape)).astype(np.int64)
+        monthly = target / np.maximum(months, 1) * rng.uniform(0.4, 1.3, picks.shape)
+        current = np.round(target * rng.uniform(0.0, 0.8, picks.shape), 2)
+        target_date = np.datetime_as_string(end + 30 * months)
+        history = np.maximum(np.round(monthly[:, :, None] * rng.lognormal(0, 0.35, picks.shape + (6,)), -1), 0)
+
+        # Debts: each type held independently, balances log-uniform within the type's range
+        shares, lows, highs, rate_lows, rate_highs, terms = (
+            np.array(column, dtype=np.float64) for column in zip(*(t[1:] for t in DEBT_TEMPLATES))
+        )
+        has_debt = rng.random((n, len(DEBT_TEMPLATES))) < shares
+        balance = np.exp(np.log(lows) + (np.log(highs) - np.log(lows)) * rng.random(has_debt.shape))
+        rate = rate_lows + (rate_highs - rate_lows) * rng.random(has_debt.shape)
+        r = rate / 100 / 12
+        with np.errstate(divide="ignore", invalid="ignore"):
+            amortized = balance * r / (1 - (1 + r) ** -terms)
+        minimum = np.where(terms > 0, amortized, np.maximum(25.0, balance * 0.03))
+        due_date = np.datetime_as_string(end + rng.integers(1, 31, has_debt.shape))
+
+        has_perk = rng.random((n, len(self.perk_ids))) < 0.3
+        premium = rng.random(n) < 0.3
+
+        # Only assembling the JSON-ready dicts is left to Python, from plain lists
+        names = [t[0] for t in GOAL_TEMPLATES]
+        picks, target, current, target_date, history = (
+            picks.tolist(), target.tolist(), current.tolist(), target_date.tolist(), history.tolist()
+        )
+        has_debt, balance, rate, minimum, due_date = (
+            has_debt.tolist(), np.round(balance, 2).tolist(), np.round(rate, 1).tolist(),
+            np.round(minimum, 2).tolist(), due_date.tolist()
+        )
+        has_perk, premium, goal_counts = has_perk.tolist(), premium.tolist(), goal_counts.tolist()
+        records = []
+        for u in range(n):
+            user_number = first_user + u
+            records.append({
+                "user_profile": {
+                    "user_id": f"user_{user_number:0{digits}d}",
+                    "name": f"Customer {user_number}",
+                    "email": f"customer{user_number}@example.com",
+                    "account_type": "Premium Checking" if premium[u] else "Checking"
+                },
+                "goals": [
+                    {
+                        "id": f"goal_{g + 1}",
+                        "name": names[picks[u][g]],
+                        "target_amount": target[u][g],
+                        "current_amount": current[u][g],
+                        "target_date": target_date[u][g],
+                        "status": "active",
+                        "contribution_history": history[u][g]
+                    }
+                    for g in range(goal_counts[u])
+                ],
+                "debts": [
+                    {
+                        "type": DEBT_TEMPLATES[d][0],
+                        "balance": balance[u][d],
+                        "interest_rate": rate[u][d],
+                        "minimum_payment": minimum[u][d],
+                        "due_date": due_date[u][d]
+                    }
+                    for d in range(len(DEBT_TEMPLATES)) if has_debt[u][d]
+                ],
+                "active_perks": [p for p, held in zip(self.perk_ids, has_perk[u]) if held]
+            })
+        return records
+
+    def transaction_dicts(self, block=0, n=1):
+        """Transactions of the first user of a block as the dicts BankDataWrapper serves"""
+        columns, counts = self.transactions(block, n)
+        rows = []
+        for i in range(int(counts[0])):
+            merchant = MERCHANTS[columns["merchant"][i]][0]
+            rows.append({
+                "date": from_day(columns["day"][i]).strftime("%Y-%m-%d"),
+                "merchant": merchant,
+                "category": CATEGORY_NAMES[columns["category"][i]],
+                "amount": int(columns["amount_cents"][i]) / 100,
+                "description": f"Purchase at {merchant}"
+            })
+        return rows
+
+    def write(self, output, users, report=None):
+        """Write a dataset of `users` users to a directory, block by block; returns row counts"""
+        os.makedirs(os.path.join(output, "transactions"), exist_ok=True)
+        os.makedirs(os.path.join(output, "holdings"), exist_ok=True)
+        meta_path = os.path.join(output, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        blocks = self.num_blocks(users)
+        counts = np.concatenate([
+            self.user_params(b, self.block_size(users, b))["counts"] for b in range(blocks)
+        ])
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        total = int(offsets[-1])
+
+        def column(name, dtype, shape):
+            return np.lib.format.open_memmap(os.path.join(output, name), mode="w+", dtype=dtype, shape=shape)
+
+        np.save(os.path.join(output, "transactions", "offsets.npy"), offsets)
+        np.save(os.path.join(output, "holdings", "day.npy"), self.holding_days)
+        txn_columns = {
+            "day": column("transactions/day.npy", np.int32, (total,)),
+            "merchant": column("transactions/merchant.npy", np.uint16, (total,)),
+            "category": column("transactions/category.npy", np.uint8, (total,)),
+            "amount_cents": column("transactions/amount_cents.npy", np.int32, (total,))
+        }
+        values = column("holdings/values.npy", np.float32, (users, len(POSITIONS), len(self.holding_days)))
+        # Zero-padded IDs of one width sort in user order, so lookups can binary search them
+        digits = max(7, len(str(users - 1)))
+        user_ids = column("user_ids.npy", f"U{digits + 5}", (users,))
+        record_offsets = np.zeros(users + 1, dtype=np.int64)
+
+        with open(os.path.join(output, "users.jsonl"), "wb") as records:
+            for b in range(blocks):
+                n = self.block_size(users, b)
+                first = b * BLOCK_USERS
+                block_columns, _ = self.transactions(b, n)
+                start, end = offsets[first], offsets[first + n]
+                for name, data in block_columns.items():
+                    txn_columns[name][start:end] = data
+                values[first:first + n] = self.holdings(b, n)
+                lines = []
+                for u, record in enumerate(self.records(b, first, n, digits)):
+                    user_ids[first + u] = record["user_profile"]["user_id"]
+                    lines.append((json.dumps(record) + "\n").encode())
+                    record_offsets[first + u + 1] = len(lines[-1])
+                records.writelines(lines)
+                if report:
+                    report(first + n, int(end))
+
+        np.save(os.path.join(output, "user_offsets.npy"), np.cumsum(record_offsets))
+        for data in list(txn_columns.values()) + [values, user_ids]:
+            data.flush()
+        del txn_columns, values, user_ids
+
+        meta = {
+            "format": 1,
+            "seed": self.seed,
+            "users": users,
+            "start_date": self.start_date.isoformat(),
+            "end_date": self.end_date.isoformat(),
+            "categories": CATEGORY_NAMES,
+            "merchants": [list(m) for m in MERCHANTS],
+            "positions": POSITIONS,
+            "transactions": total,
+            "holding_days": len(self.holding_days)
+        }
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic banking dataset")
+    parser.add_argument("--users", type=int, default=100000, help="Number of users")
+    parser.add_argument("--years", type=float, default=DEFAULT_YEARS, help="Years of history")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed")
+    parser.add_argument("--end-date", help="Last day of history (YYYY-MM-DD, default: today)")
+    parser.add_argument("--output", required=True, help="Output directory")
+    parser.add_argument(
+        "--publish", action="store_true",
+        help="Treat --output as a columnar store root: write a new version and make it live"
+    )
+    args = parser.parse_args()
+
+    from bank_wrapper import bank_data
+    import columnar_store
+
+    generator = SyntheticBank(
+        seed=args.seed,
+        years=args.years,
+        end_date=date.fromisoformat(args.end_date) if args.end_date else None,
+        perk_ids=[p["id"] for p in bank_data.get_perk_catalogue()]
+    )
+    start = time.perf_counter()
+    last_report = [start]
+
+    def report(users_done, rows_done):
+        now = time.perf_counter()
+        if now - last_report[0] >= 2:
+            last_report[0] = now
+            print(f"  {users_done} users, {rows_done} transactions ({now - start:.1f}s)", file=sys.stderr)
+
+    output = args.output
+    if args.publish:
+        # Other writers of the root (ingests) wait until this version is live
+        with columnar_store.store_lock(args.output):
+            version = columnar_store.new_version(args.output)
+            output = os.path.join(args.output, version)
+            meta = generator.write(output, args.users, report)
+            columnar_store.publish(args.output, version)
+    else:
+        meta = generator.write(output, args.users, report)
+    elapsed = time.perf_counter() - start
+    size = sum(
+        os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(output) for f in files
+    )
+    print(
+        f"Wrote {meta['users']} users, {meta['transactions']} transactions and "
+        f"{meta['holding_days']} days of holdings to {output} in {elapsed:.1f}s "
+        f"({size / 1e6:.0f} MB, {size / 1e6 / elapsed:.0f} MB/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
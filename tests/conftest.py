@@ -0,0 +1,8 @@
+"""Run against the local stub model with no delay, importing modules from the repository root"""
+import os
+import sys
+
+os.environ.setdefault("USE_STUB_MODEL", "TRUE")
+os.environ.setdefault("STUB_MODEL_LATENCY", "0")
+os.environ.setdefault("STUB_MODEL_JITTER", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,132 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import advisors_agent
+import degraded_mode
+from advisor_index import AdvisorIndex
+from advisor_scheduling import AdvisorCalendar, SlotUnavailable, SqliteBookingBackend
+from llm_gateway import AdmissionRejected
+
+TOMORROW = date.today() + timedelta(days=1)
+TWO_PM = datetime.combine(TOMORROW, time(14)).isoformat(timespec="minutes")
+
+
+def open_days(calendar, advisor_id="advisor_1", days=3):
+    for offset in range(days):
+        day = date.today() + timedelta(days=offset)
+        calendar.add_availability(advisor_id, datetime.combine(day, time(9)), datetime.combine(day, time(17)))
+    return calendar
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    calendar = open_days(AdvisorCalendar(60))
+    monkeypatch.setattr(advisors_agent, "advisor_calendar", calendar)
+    return calendar
+
+
+def test_slot_is_booked_once():
+    calendar = open_days(AdvisorCalendar(60))
+    booking = calendar.book("advisor_1", TWO_PM, "alice")
+
+    assert calendar.book("advisor_1", TWO_PM, "alice") == booking
+    with pytest.raises(SlotUnavailable):
+        calendar.book("advisor_1", TWO_PM, "bob")
+    assert TWO_PM not in calendar.free_slots("advisor_1")
+
+    calendar.cancel(booking["booking_id"], "alice")
+    assert TWO_PM in calendar.free_slots("advisor_1")
+
+
+def test_bookings_are_shared_and_survive_restart(tmp_path):
+    path = str(tmp_path / "bookings.db")
+    first = open_days(AdvisorCalendar(60, SqliteBookingBackend(path)))
+    second = open_days(AdvisorCalendar(60, SqliteBookingBackend(path)))
+    booking = first.book("advisor_1", TWO_PM, "alice")
+
+    with pytest.raises(SlotUnavailable):
+        second.book("advisor_1", TWO_PM, "bob")
+    assert second.user_bookings("alice") == [booking]
+
+    restarted = open_days(AdvisorCalendar(60, SqliteBookingBackend(path)))
+    assert restarted.user_bookings("alice") == [booking]
+    assert TWO_PM not in restarted.free_slots("advisor_1")
+
+
+def test_named_advisor_prefers_the_longest_name():
+    index = AdvisorIndex([
+        {"id": "advisor_1", "name": "Sarah Johnson", "specialty": "Retirement Planning", "rating": 4.8},
+        {"id": "advisor_2", "name": "Sarah Lee", "specialty": "Tax Planning", "rating": 4.5},
+    ])
+
+    assert index.named("book with sarah lee tomorrow") == "advisor_2"
+    assert index.named("book with sarah tomorrow") == "advisor_1"
+    assert index.named("can advisor_2 see me") == "advisor_2"
+    assert index.named("book a tax advisor") is None
+
+
+def test_time_with_day():
+    start, after, until = advisors_agent._requested_time("book a meeting tomorrow at 2pm")
+    assert start == datetime.combine(TOMORROW, time(14))
+    assert after is None and until is None
+
+
+def test_day_without_time_is_limited_to_that_day():
+    start, after, until = advisors_agent._requested_time("book a meeting tomorrow")
+    assert start is None
+    assert after == datetime.combine(TOMORROW, time())
+    assert until == datetime.combine(TOMORROW + timedelta(days=1), time())
+
+
+def test_no_day_or_time():
+    assert advisors_agent._requested_time("book a meeting with sarah") == (None, None, None)
+
+
+@pytest.mark.parametrize("text", [
+    "book a meeting next week",
+    "book a meeting tomorrow afternoon",
+    "book a meeting on 11/25 at 2pm",
+    "book a meeting tomorrow at 2",
+    "book a meeting tomorrow or friday at 2pm",
+    "book a meeting tomorrow at 13pm",
+])
+def test_unclear_date_or_time_is_rejected(text):
+    with pytest.raises(advisors_agent.UnclearTime):
+        advisors_agent._requested_time(text)
+
+
+def test_books_the_requested_slot(calendar):
+    outcome, detail = advisors_agent.appointment_from_query("Book a meeting with Sarah tomorrow at 2pm", "alice")
+
+    assert outcome == "booked"
+    assert detail["booking"]["advisor_id"] == "advisor_1"
+    assert detail["booking"]["start"] == TWO_PM
+
+
+def test_unclear_request_books_nothing(calendar):
+    outcome, _ = advisors_agent.appointment_from_query("Book a meeting with Sarah tomorrow afternoon", "alice")
+
+    assert outcome == "rejected"
+    assert calendar.user_bookings("alice") == []
+
+
+def test_question_books_nothing(calendar):
+    assert advisors_agent.appointment_from_query("Can I book a meeting with Sarah tomorrow at 2pm?", "alice") is None
+    assert calendar.user_bookings("alice") == []
+
+
+def test_retry_after_overload_books_once(calendar, monkeypatch):
+    def overloaded(*args, **kwargs):
+        raise AdmissionRejected("Too many pending model calls")
+    monkeypatch.setattr(degraded_mode, "generate_content", overloaded)
+
+    query = "Book a meeting with Sarah tomorrow at 2pm"
+    for _ in range(3):
+        # A booked request answers from data instead of raising a retryable 429
+        answer = advisors_agent.advisors_agent.process_query(query, user_id="alice")
+        assert "Appointment booked" in answer
+    assert len(calendar.user_bookings("alice")) == 1
+
+    with pytest.raises(AdmissionRejected):
+        advisors_agent.advisors_agent.process_query("Who is the best advisor for retirement?", user_id="alice")
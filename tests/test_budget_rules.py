@@ -0,0 +1,79 @@
+import pytest
+
+import spending_agent
+from budget_rules import BudgetEngine, SqliteBudgetBackend, parse_rule
+from config import Config
+from similarity_cache import SimilarityCache
+
+USER = "user_123"
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = BudgetEngine()
+    monkeypatch.setattr(spending_agent, "budget_engine", engine)
+    return engine
+
+
+def test_same_rule_is_not_duplicated(engine):
+    first = engine.add_rule(USER, "Dining", 400)
+    version = engine.rules_version(USER)
+    again = engine.add_rule(USER, "dining", 400, "monthly")
+
+    assert again["rule_id"] == first["rule_id"]
+    assert len(engine.status(USER)) == 1
+    assert engine.rules_version(USER) == version
+
+
+def test_same_rule_with_new_limit_updates_it(engine):
+    first = engine.add_rule(USER, "Dining", 400)
+    version = engine.rules_version(USER)
+    updated = engine.add_rule(USER, "Dining", 300)
+
+    assert updated["rule_id"] == first["rule_id"]
+    assert [s["limit"] for s in engine.status(USER)] == [300]
+    assert engine.rules_version(USER) > version
+
+
+def test_other_period_is_another_rule(engine):
+    engine.add_rule(USER, "Dining", 400)
+    engine.add_rule(USER, "Dining", 100, "week")
+
+    assert sorted(s["period"] for s in engine.status(USER)) == ["month", "week"]
+
+
+def test_upserted_rule_persists_once(tmp_path):
+    path = str(tmp_path / "rules.db")
+    engine = BudgetEngine(backend=SqliteBudgetBackend(path))
+    engine.add_rule(USER, "Dining", 400)
+    engine.add_rule(USER, "Dining", 250)
+
+    restarted = BudgetEngine(backend=SqliteBudgetBackend(path))
+    assert [(s["category"], s["limit"]) for s in restarted.status(USER)] == [("Dining", 250)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Tell me when dining exceeds $400 this month", ("dining", 400.0, "month")),
+    ("Set a weekly budget of $150 for groceries", ("groceries", 150.0, "week")),
+    ("Alert me if my total spending goes over 2,000 dollars", ("total", 2000.0, "month")),
+    ("How much did I spend on dining?", None),
+])
+def test_parse_rule(query, expected):
+    assert parse_rule(query) == expected
+
+
+def test_new_rule_invalidates_cached_answers(engine, monkeypatch):
+    cache = SimilarityCache(
+        Config.SIMILARITY_CACHE_THRESHOLD, Config.SIMILARITY_CACHE_NUM_PERM, Config.SIMILARITY_CACHE_BANDS, 100, 3600
+    )
+    monkeypatch.setattr(spending_agent, "answer_cache", cache)
+    agent = spending_agent.spending_agent
+    query = "How am I doing against my budgets?"
+
+    agent.process_query(query, user_id=USER)
+    agent.process_query(query, user_id=USER)
+    assert cache.hits == 1
+
+    engine.add_rule(USER, "Dining", 400)
+    agent.process_query(query, user_id=USER)
+    assert cache.hits == 1
@@ -0,0 +1,94 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import columnar_store
+from bank_wrapper import BankDataWrapper
+from synthetic_data import SyntheticBank
+
+TODAY = columnar_store.to_day(date.today().isoformat())
+
+
+def make_root(path, users=20):
+    root = str(path / "store")
+    version = columnar_store.new_version(root)
+    SyntheticBank(seed=7, years=0.25, end_date=date.today()).write(f"{root}/{version}", users)
+    columnar_store.publish(root, version)
+    return root
+
+
+def rows(day, *amounts_cents):
+    n = len(amounts_cents)
+    return {"day": [day] * n, "merchant": [0] * n, "category": [0] * n, "amount_cents": list(amounts_cents)}
+
+
+def user_rows(dataset, index):
+    start, end = int(dataset.offsets[index]), int(dataset.offsets[index + 1])
+    return {name: np.asarray(column[start:end]) for name, column in dataset.columns.items()}
+
+
+@pytest.fixture
+def root(tmp_path):
+    return make_root(tmp_path)
+
+
+def test_append_publishes_a_new_version(root):
+    store = columnar_store.ColumnarStore(root)
+    old = store.dataset
+    user_id = old.user_ids[3]
+    before = user_rows(old, 3)
+
+    version = columnar_store.append_transactions(root, [user_id, user_id], rows(TODAY + 1, 1234, 5678))
+    new = store.refresh(force=True)
+
+    assert columnar_store.current_version(root) == version
+    assert new.version == old.version + 1
+    after = user_rows(new, 3)
+    assert len(after["day"]) == len(before["day"]) + 2
+    # Newest first, so the appended rows lead
+    assert sorted(after["amount_cents"][:2].tolist()) == [1234, 5678]
+    assert np.all(np.diff(after["day"]) <= 0)
+    # Other users' rows are untouched, and a reader of the old version still sees it whole
+    np.testing.assert_array_equal(user_rows(new, 4)["amount_cents"], user_rows(old, 4)["amount_cents"])
+    assert len(user_rows(old, 3)["day"]) == len(before["day"])
+
+
+def test_unknown_user_is_rejected(root):
+    with pytest.raises(KeyError):
+        columnar_store.append_transactions(root, ["nobody"], rows(TODAY, 100))
+    assert columnar_store.current_version(root) == "v000001"
+
+
+def test_only_appended_users_get_a_new_data_version(root):
+    store = columnar_store.ColumnarStore(root)
+    first, second = store.dataset.user_ids[1], store.dataset.user_ids[2]
+
+    columnar_store.append_transactions(root, [first], rows(TODAY, 100))
+    dataset = store.refresh(force=True)
+    assert (dataset.user_version(1), dataset.user_version(2)) == (2, 1)
+
+    columnar_store.append_transactions(root, [second], rows(TODAY, 100))
+    dataset = store.refresh(force=True)
+    assert (dataset.user_version(1), dataset.user_version(2), dataset.user_version(0)) == (2, 3, 1)
+
+
+def test_bank_data_version_is_per_user(root):
+    bank = BankDataWrapper(root)
+    dataset = bank.store.dataset
+    first, second = str(dataset.user_ids[1]), str(dataset.user_ids[2])
+    versions = bank.get_data_version(first), bank.get_data_version(second)
+
+    columnar_store.append_transactions(root, [first], rows(TODAY, 100))
+    bank.store.refresh(force=True)
+
+    assert bank.get_data_version(first) != versions[0]
+    assert bank.get_data_version(second) == versions[1]
+
+
+def test_old_versions_are_pruned(root):
+    user_id = columnar_store.ColumnarStore(root).dataset.user_ids[0]
+    for _ in range(4):
+        columnar_store.append_transactions(root, [user_id], rows(TODAY, 100), keep=2)
+
+    assert columnar_store.versions(root) == ["v000003", "v000004", "v000005"]
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+from multiprocessing import get_context
+
+import columnar_store
+from bank_wrapper import BankDataWrapper
+from ingest import ingest_stream
+from synthetic_data import SyntheticBank
+
+YESTERDAY = (date.today() - timedelta(days=1)).isoformat()
+
+
+def make_root(path, users=20):
+    root = str(path / "store")
+    version = columnar_store.new_version(root)
+    SyntheticBank(seed=7, years=0.25, end_date=date.today()).write(f"{root}/{version}", users)
+    columnar_store.publish(root, version)
+    return root
+
+
+def total_rows(root):
+    return int(columnar_store.ColumnarStore(root).dataset.offsets[-1])
+
+
+def test_csv_feed_is_published_to_the_store(tmp_path):
+    root = make_root(tmp_path)
+    bank = BankDataWrapper(root)
+    user_id = str(bank.store.dataset.user_ids[5])
+    before = total_rows(root)
+    feed = (
+        "user_id,date,merchant,amount\n"
+        f"{user_id},{YESTERDAY},Netflix,15.99\n"
+        f"{user_id},{YESTERDAY},SQ *LOCAL CAFE 1234,4.50\n"
+        f"{user_id},01/02/2026,Netflix,15.99\n"
+        f"nobody,{YESTERDAY},Netflix,15.99\n"
+    )
+
+    report = ingest_stream([feed.encode()], "csv", bank=bank)
+
+    assert report["accepted"] == 2
+    assert report["rows"] - report["accepted"] == 2
+    assert total_rows(root) == before + 2
+    assert columnar_store.current_version(root) == "v000002"
+    merchants = [t["merchant"] for t in bank.get_transactions(7, user_id)]
+    assert "Netflix" in merchants
+
+
+def _append_rows(root, index, count):
+    dataset = columnar_store.ColumnarStore(root).dataset
+    day = columnar_store.to_day(YESTERDAY)
+    for i in range(count):
+        columnar_store.append_transactions(
+            root, [dataset.user_ids[index]], {"day": [day], "merchant": [0], "category": [0], "amount_cents": [100 + i]}
+        )
+
+
+def test_concurrent_writers_in_other_processes_lose_no_rows(tmp_path):
+    root = make_root(tmp_path)
+    before = total_rows(root)
+    context = get_context("spawn")
+    writers = [context.Process(target=_append_rows, args=(root, index, 5)) for index in (1, 2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert [writer.exitcode for writer in writers] == [0, 0]
+    assert total_rows(root) == before + 10
+    assert columnar_store.current_version(root) == "v000011"
@@ -0,0 +1,52 @@
+import pytest
+
+import portfolio_agent
+from bank_wrapper import bank_data
+from config import Config
+from similarity_cache import SimilarityCache
+
+DEBTS = bank_data.get_debts(None)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SimilarityCache(
+        Config.SIMILARITY_CACHE_THRESHOLD, Config.SIMILARITY_CACHE_NUM_PERM, Config.SIMILARITY_CACHE_BANDS, 100, 3600
+    )
+    monkeypatch.setattr(portfolio_agent, "answer_cache", cache)
+    return cache
+
+
+def test_extra_payment_scenario():
+    scenario = portfolio_agent.debt_scenario_from_query("What if I pay an extra $300 a month on my debt?", DEBTS)
+    assert scenario == ([300.0], None)
+
+
+def test_payoff_order_scenario():
+    scenario = portfolio_agent.debt_scenario_from_query(
+        "Should I pay off the car loan first, then the student loan?", DEBTS
+    )
+    assert scenario == (None, ["Auto Loan", "Student Loan"])
+
+
+def test_plain_question_is_not_a_scenario():
+    assert portfolio_agent.debt_scenario_from_query("What is my net worth?", DEBTS) is None
+    assert portfolio_agent.debt_scenario_from_query("How much debt do I have?", DEBTS) is None
+
+
+def test_plain_question_is_cached(cache):
+    agent = portfolio_agent.portfolio_agent
+    agent.process_query("How is my portfolio allocated?")
+    agent.process_query("How is my portfolio allocated?")
+
+    assert cache.stats()["similarity_cache"]["entries"] == 1
+    assert cache.hits == 1
+
+
+def test_what_if_skips_the_cache(cache):
+    agent = portfolio_agent.portfolio_agent
+    agent.process_query("What if I pay an extra $200 a month on my debt?")
+    agent.process_query("What if I pay an extra $200 a month on my debt?")
+
+    assert cache.lookups == 0
+    assert cache.stats()["similarity_cache"]["entries"] == 0
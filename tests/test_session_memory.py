@@ -0,0 +1,55 @@
+import json
+
+from session_memory import SessionStore, SqliteSessionBackend
+
+
+def make_store(tmp_path, max_sessions=10):
+    backend = SqliteSessionBackend(str(tmp_path / "sessions.db"), flush_interval=3600)
+    return SessionStore(max_sessions, 3600, backend=backend)
+
+
+def test_session_is_only_visible_to_its_user(tmp_path):
+    store = make_store(tmp_path)
+    store.record_turn("alice", "s1", "what is my balance", "$100")
+
+    assert "$100" in store.render("alice", "s1")
+    assert store.render("mallory", "s1") == ""
+
+
+def test_session_survives_restart_and_stays_isolated(tmp_path):
+    store = make_store(tmp_path)
+    store.record_turn("alice", "s1", "what is my balance", "$100")
+    store.backend.flush()
+
+    restarted = make_store(tmp_path)
+    assert "$100" in restarted.render("alice", "s1")
+    assert restarted.render("bob", "s1") == ""
+
+
+def test_evicted_session_is_read_back_before_it_is_flushed(tmp_path):
+    store = make_store(tmp_path, max_sessions=1)
+    store.record_turn("alice", "s1", "first question", "first answer")
+    store.record_turn("alice", "s2", "second question", "second answer")
+
+    assert store.backend.flushes == 0
+    assert "first answer" in store.render("alice", "s1")
+
+
+def test_writes_are_batched_into_one_flush(tmp_path):
+    store = make_store(tmp_path)
+    for i in range(20):
+        store.record_turn("alice", f"s{i}", "question", "answer")
+        store.render("alice", f"s{i}")
+    store.backend.flush()
+
+    assert store.backend.flushes == 1
+    assert "answer" in make_store(tmp_path).render("alice", "s19")
+
+
+def test_stats_do_not_expose_session_ids(tmp_path):
+    store = make_store(tmp_path)
+    store.record_turn("alice", "secret-session", "question", "answer")
+
+    stats = json.dumps(store.stats())
+    assert "secret-session" not in stats
+    assert "alice" not in stats
@@ -0,0 +1,50 @@
+from config import Config
+from similarity_cache import SimilarityCache, numbers
+
+SCOPE = ("spending_specialist", "user_123", 1)
+
+
+def make_cache():
+    return SimilarityCache(
+        Config.SIMILARITY_CACHE_THRESHOLD,
+        Config.SIMILARITY_CACHE_NUM_PERM,
+        Config.SIMILARITY_CACHE_BANDS,
+        100,
+        3600
+    )
+
+
+def test_near_duplicate_query_hits():
+    cache = make_cache()
+    cache.store(SCOPE, "How much did I spend on dining this month?", "answer")
+
+    assert cache.lookup(SCOPE, "how much have I spent on restaurants this month") == "answer"
+
+
+def test_other_scope_misses():
+    cache = make_cache()
+    cache.store(SCOPE, "How much did I spend on dining this month?", "answer")
+
+    assert cache.lookup(("spending_specialist", "user_456", 1), "How much did I spend on dining this month?") is None
+    assert cache.lookup(("spending_specialist", "user_123", 2), "How much did I spend on dining this month?") is None
+
+
+def test_different_numbers_miss():
+    cache = make_cache()
+    cache.store(SCOPE, "What if I pay an extra $200 a month on my credit card?", "answer")
+
+    assert cache.lookup(SCOPE, "What if I pay an extra $500 a month on my credit card?") is None
+    assert cache.lookup(SCOPE, "What if I pay an extra $200 a month on my credit card") == "answer"
+
+
+def test_negation_and_direction_miss():
+    cache = make_cache()
+    cache.store(SCOPE, "Move $500 from savings to checking", "answer")
+    cache.store(SCOPE, "Which subscriptions do I use?", "used")
+
+    assert cache.lookup(SCOPE, "Move $500 from checking to savings") is None
+    assert cache.lookup(SCOPE, "Which subscriptions do I not use?") is None
+
+
+def test_numbers_are_canonical():
+    assert numbers("$1,000 in 12 months") == numbers("1000 dollars over 12.0 months")